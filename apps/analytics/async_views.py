@@ -0,0 +1,210 @@
+import asyncio
+from abc import ABCMeta, abstractmethod
+from typing import Any, Callable, Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.utils import timezone
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from apps.transactions.models import Currency
+from .cache import DataVersionKeyBit, LocalDateKeyBit
+from .serializers import (
+    DashboardQuerySerializer, MonthlySummarySerializer, SeriesQuerySerializer, TopSpendQuerySerializer
+)
+from .services.aggregates import TimeSeriesAggregate
+from .services.buckets import BucketAggregate
+from .services.currency import MissingExchangeRate
+from .services.rankings import SpendRanking
+
+
+def _isolated(func: Callable[[], Any]) -> Callable[[], Any]:
+    """
+    Ejecuta `func` en un hilo del pool y cierra al terminar la conexión que abrió ese
+    hilo (según CONN_MAX_AGE), ya que ningún fin de petición la cierra por él
+    """
+    def run():
+        try:
+            return func()
+        finally:
+            close_old_connections()
+    return run
+
+
+async def gather_queries(**queries: Callable[[], Any]) -> Dict[str, Any]:
+    """
+    Ejecuta consultas independientes a la vez, cada una en su hilo y con su propia
+    conexión (thread_sensitive=False), y devuelve sus resultados por nombre.
+    La latencia total es la de la consulta más lenta y no la suma de todas.
+    """
+    results = await asyncio.gather(*(
+        sync_to_async(_isolated(query), thread_sensitive=False)() for query in queries.values()
+    ))
+    return dict(zip(queries, results))
+
+
+class AsyncAnalyticsView(View, metaclass=ABCMeta):
+    """
+    Base de las variantes asíncronas de AnalyticsViewSet, para servir bajo ASGI.
+
+    DRF no ejecuta vistas asíncronas, así que la autenticación (la misma de la API),
+    la validación de parámetros y el formato de la respuesta se hacen aquí con las
+    piezas de DRF, y las consultas corren fuera del event loop con gather_queries.
+    Las respuestas se cachean con la misma versión de datos que las síncronas y con la
+    fecha local, porque sin año ni mes el tablero usa el mes actual.
+    Cada subclase implementa compute.
+    """
+    http_method_names = ['get']
+    query_serializer = None
+    renderer = JSONRenderer()
+
+    async def get(self, request, *args, **kwargs):
+        user = await sync_to_async(self._authenticate)(request)
+        if user is None:
+            return self._render({'detail': 'Las credenciales de autenticación no se proveyeron.'},
+                                status.HTTP_401_UNAUTHORIZED)
+
+        key = await sync_to_async(self._cache_key)(request, user)
+        cached = await sync_to_async(cache.get)(key)
+        if cached is not None:
+            return HttpResponse(cached, content_type='application/json')
+
+        params = self.query_serializer(data=request.GET)
+        # el campo de moneda valida contra la base
+        if not await sync_to_async(params.is_valid)():
+            return self._render(params.errors, status.HTTP_400_BAD_REQUEST)
+        try:
+            data = await self.compute(user, params.validated_data)
+        except MissingExchangeRate as exc:
+            return self._render({'currency': [str(exc)]}, status.HTTP_400_BAD_REQUEST)
+
+        response = self._render(data)
+        await sync_to_async(cache.set)(key, response.content, settings.ANALYTICS_CACHE_TIMEOUT)
+        return response
+
+    @abstractmethod
+    async def compute(self, user, query: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Los datos de la respuesta a partir de los parámetros validados
+        """
+
+    @staticmethod
+    def _authenticate(request):
+        drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+        try:
+            user = drf_request.user
+        except exceptions.APIException:
+            return None
+        return user if user.is_authenticated else None
+
+    def _cache_key(self, request, user) -> str:
+        version = DataVersionKeyBit().get_data(None, self, None, request, (), {})
+        today = LocalDateKeyBit().get_data(None, self, None, request, (), {})
+        return f'analytics:async:{type(self).__name__}:{user.pk}:{request.GET.urlencode()}:{version}:{today}'
+
+    def _render(self, data, status_code: int = status.HTTP_200_OK) -> HttpResponse:
+        return HttpResponse(self.renderer.render(data), content_type='application/json', status=status_code)
+
+    @staticmethod
+    def _currency_code(currency: Optional[Currency]) -> Optional[str]:
+        return currency.code if currency else None
+
+
+class AsyncSeriesView(AsyncAnalyticsView):
+    """
+    Variante asíncrona de /api/analytics/series/ (mismos parámetros)
+    """
+    query_serializer = SeriesQuerySerializer
+
+    async def compute(self, user, query):
+        engine = BucketAggregate(
+            user, query['granularity'], query['start'], query['end'],
+            dimensions=query['group_by'], metrics=query['metrics'], currency=query.get('currency'),
+            cumulative=query['cumulative'], rolling=query.get('rolling'),
+        )
+        results = await gather_queries(results=engine.run)
+        return {
+            'granularity': query['granularity'],
+            'start': query['start'],
+            'end': query['end'],
+            'group_by': query['group_by'],
+            'metrics': query['metrics'],
+            'currency': self._currency_code(query.get('currency')),
+            'cumulative': query['cumulative'],
+            'rolling': query.get('rolling'),
+            **results,
+        }
+
+
+class AsyncTopSpendView(AsyncAnalyticsView):
+    """
+    Variante asíncrona de /api/analytics/top-spend/ (mismos parámetros)
+    """
+    query_serializer = TopSpendQuerySerializer
+
+    async def compute(self, user, query):
+        ranking = SpendRanking(user, query['by'], query['start'], query['end'],
+                               limit=query['limit'], currency=query.get('currency'))
+        results = await gather_queries(ranking=ranking.run)
+        return {
+            'by': query['by'],
+            'start': query['start'],
+            'end': query['end'],
+            'currency': self._currency_code(query.get('currency')),
+            **results['ranking'],
+        }
+
+
+class AsyncDashboardView(AsyncAnalyticsView):
+    """
+    Tablero del mes en una petición: resumen del mes con su serie diaria, ingresos y
+    egresos de los últimos 12 meses, gasto por categoría del mes y ranking de gasto.
+    ?year=YYYY&month=M&currency=USD (por defecto el mes actual)
+
+    Las consultas son independientes y corren a la vez. Con el backend de NumPy el resumen
+    y los 12 meses salen de una sola lectura, en el mismo hilo.
+    """
+    query_serializer = DashboardQuerySerializer
+
+    async def compute(self, user, query):
+        today = timezone.localdate()
+        year, month = query.get('year', today.year), query.get('month', today.month)
+        currency = query.get('currency')
+        start, end = TimeSeriesAggregate.month_range(year, month)
+
+        engine = TimeSeriesAggregate.engine(user, *TimeSeriesAggregate.last_months_range(year, month), currency,
+                                            daily_from=start)
+
+        def summary():
+            return TimeSeriesAggregate.monthly_series(user, year, month, currency, engine=engine)
+
+        def trend():
+            return TimeSeriesAggregate.last_months(user, year, month, currency=currency, engine=engine)
+
+        queries = {
+            'categories': lambda: TimeSeriesAggregate.category_breakdown(user, year, month, currency),
+            'top_spend': SpendRanking(user, 'category', start, end, limit=5, currency=currency).run,
+        }
+        if engine is None:
+            queries.update(summary=summary, trend=trend)
+        else:
+            queries['series'] = lambda: {'summary': summary(), 'trend': trend()}
+        results = await gather_queries(**queries)
+        results.update(results.pop('series', {}))
+        return {
+            'year': year,
+            'month': month,
+            'currency': self._currency_code(currency),
+            # mismo formato que /api/analytics/monthly-summary/
+            'summary': MonthlySummarySerializer(results['summary']).data,
+            'trend': results['trend'],
+            'categories': results['categories'],
+            'top_spend': results['top_spend'],
+        }
@@ -0,0 +1,66 @@
+import time
+from typing import Iterable
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_extensions.key_constructor.bits import KeyBitBase
+
+from apps.transactions.rates import ExchangeRateIndex
+
+
+class DataVersion:
+    """
+    Versión de los datos de cada usuario, guardada en la caché.
+
+    Forma parte de la clave de las respuestas cacheadas de analíticas: toda escritura
+    de transacciones, cuentas, categorías, etiquetas o presupuestos la incrementa, así que
+    las respuestas pueden cachearse por mucho tiempo y dejan de usarse apenas cambian
+    los datos. Si la caché pierde la versión se reinicia con la hora actual en lugar de
+    0, para no volver a una versión que tenga respuestas viejas guardadas.
+    """
+    KEY = 'analytics:data-version:{user_id}'
+
+    @classmethod
+    def get(cls, user_id) -> int:
+        key = cls.KEY.format(user_id=user_id)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, time.time_ns(), timeout=None)
+            version = cache.get(key)
+        return version
+
+    @classmethod
+    def bump(cls, *user_ids) -> None:
+        """
+        Incrementa la versión de los usuarios al confirmarse la transacción actual,
+        para que nadie cachee con la versión nueva datos que aún no se ven
+        """
+        transaction.on_commit(lambda: cls._increment(user_ids))
+
+    @classmethod
+    def _increment(cls, user_ids: Iterable) -> None:
+        for user_id in set(user_ids):
+            key = cls.KEY.format(user_id=user_id)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), timeout=None)
+
+
+class DataVersionKeyBit(KeyBitBase):
+    """
+    Versión de los datos del usuario y de las tasas de cambio
+    """
+
+    def get_data(self, params, view_instance, view_method, request, args, kwargs):
+        return f'{DataVersion.get(request.user.pk)}:{cache.get(ExchangeRateIndex.VERSION_KEY)}'
+
+
+class LocalDateKeyBit(KeyBitBase):
+    """
+    Fecha local actual, para respuestas que dependen del día (proyecciones)
+    """
+
+    def get_data(self, params, view_instance, view_method, request, args, kwargs):
+        return timezone.localdate().isoformat()
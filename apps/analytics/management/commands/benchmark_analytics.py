@@ -0,0 +1,122 @@
+import random
+import statistics
+import time
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.analytics.models import TransactionRollup
+from apps.analytics.services.aggregates import TimeSeriesAggregate
+from apps.analytics.services.buckets import BucketAggregate
+from apps.analytics.services.vectorized import VectorizedSeries
+from apps.transactions.models import Category
+from apps.transactions.services import AccountService, TransactionService
+
+
+class Command(BaseCommand):
+    help = 'Compara los backends de analíticas (ORM y NumPy) sobre las series de un usuario'
+
+    BACKENDS = ('orm', 'numpy')
+    BATCH_SIZE = 10000
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Email del usuario a medir')
+        parser.add_argument('--generate', type=int, default=0,
+                            help='Crea un usuario de prueba con esta cantidad de transacciones aleatorias')
+        parser.add_argument('--years', type=int, default=5, help='Años que abarcan los datos generados')
+        parser.add_argument('--repeat', type=int, default=5, help='Repeticiones de cada medición')
+
+    def handle(self, *args, **options):
+        if options['generate']:
+            user = self._generate(options['generate'], options['years'])
+        elif options['user']:
+            user = User.objects.filter(email=options['user']).first()
+            if user is None:
+                raise CommandError(f'No existe el usuario {options["user"]}')
+        else:
+            raise CommandError('Indique --user o --generate')
+
+        span = TransactionRollup.objects.filter(user=user).aggregate(start=Min('period'), end=Max('period'))
+        if span['start'] is None:
+            raise CommandError('El usuario no tiene transacciones')
+        start, end = span['start'], span['end']
+        weeks = (end - start).days // 7 + 1
+        last_month = end.replace(day=1)
+
+        cases = {
+            'daily_series': lambda: TimeSeriesAggregate.daily_series(user, start, end),
+            'weekly_series': lambda: TimeSeriesAggregate.weekly_series(user, start, weeks),
+            'monthly_series': lambda: TimeSeriesAggregate.monthly_series(user, last_month.year, last_month.month),
+            'dashboard': lambda: self._dashboard(user, start, end),
+        }
+        self.stdout.write(f'{user.email}: {start} a {end}, '
+                          f'{TransactionRollup.objects.filter(user=user).count()} filas de resumen')
+        for name, case in cases.items():
+            timings = {backend: self._measure(backend, case, options['repeat']) for backend in self.BACKENDS}
+            self.stdout.write(f'{name:<16}' + ''.join(
+                f'{backend}: mediana {statistics.median(values):8.1f} ms, mínimo {min(values):8.1f} ms   '
+                for backend, values in timings.items()
+            ))
+
+    @staticmethod
+    def _dashboard(user, start, end):
+        """
+        Varias series del mismo rango en una petición: con NumPy salen de una sola lectura
+        """
+        if settings.ANALYTICS_BACKEND == 'numpy':
+            engine = VectorizedSeries(user, start, end)
+            return (engine.series('day', ['net']), engine.series('week', ['income', 'expense']),
+                    engine.series('month', cumulative=True), engine.totals('month', 'expense', 'category'))
+        return (
+            BucketAggregate(user, 'day', start, end, metrics=['net']).run(),
+            BucketAggregate(user, 'week', start, end, metrics=['income', 'expense']).run(),
+            BucketAggregate(user, 'month', start, end, cumulative=True).run(),
+            BucketAggregate(user, 'month', start, end, ['category'], metrics=['expense']).run(),
+        )
+
+    @staticmethod
+    def _measure(backend, case, repeat):
+        timings = []
+        with override_settings(ANALYTICS_BACKEND=backend):
+            for _ in range(repeat):
+                started = time.perf_counter()
+                case()
+                timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def _generate(self, rows, years):
+        """
+        Usuario nuevo con `rows` transacciones aleatorias en 3 cuentas y 12 categorías,
+        cargadas por lotes con el mismo servicio que la carga masiva
+        """
+        user = User.objects.create_user(email=f'benchmark-{int(time.time())}@example.com', password=None)
+        accounts = [AccountService.create_account(user, {'name': f'Cuenta {i}'}).id for i in range(3)]
+        categories = [
+            Category.objects.create(user=user, name=f'Categoría {i}',
+                                    category_type='INGRESO' if i < 2 else 'EGRESO').id
+            for i in range(12)
+        ]
+        first_day = timezone.localdate() - timedelta(days=365 * years)
+        tz = timezone.get_current_timezone()
+        randomizer = random.Random(rows)
+
+        for offset in range(0, rows, self.BATCH_SIZE):
+            batch = []
+            for _ in range(min(self.BATCH_SIZE, rows - offset)):
+                day = first_day + timedelta(days=randomizer.randrange(365 * years))
+                batch.append({
+                    'account': randomizer.choice(accounts),
+                    'category': randomizer.choice(categories),
+                    'amount': Decimal(randomizer.randrange(100, 500000)) / 100,
+                    'date': datetime.combine(day, dt_time(12), tzinfo=tz),
+                })
+            TransactionService.bulk_create_transactions(user, batch)
+            self.stdout.write(f'{offset + len(batch)} transacciones generadas', ending='\r')
+        self.stdout.write('')
+        return user
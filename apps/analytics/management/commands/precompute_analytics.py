@@ -0,0 +1,34 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.accounts.models import User
+from apps.analytics.services.snapshots import SnapshotService
+from core.parallel import run_in_process_pool
+
+
+class Command(BaseCommand):
+    help = ('Precalcula las analíticas del tablero de cada usuario (caché y AnalyticsSnapshot), '
+            'repartiendo los usuarios en procesos en paralelo')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Email del usuario a precalcular (por defecto todos)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Cantidad de procesos (por defecto uno por CPU)')
+        parser.add_argument('--chunk-size', type=int, default=50,
+                            help='Usuarios por tarea enviada a cada proceso')
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(email=options['user'])
+        user_ids = list(users.order_by('id').values_list('id', flat=True))
+
+        started = time.perf_counter()
+        total = run_in_process_pool(SnapshotService.refresh, user_ids, options['workers'], options['chunk_size'])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} usuarios precalculados en {elapsed:.1f} s ({total / max(elapsed, 1e-9):.1f} usuarios/s).'
+        ))
@@ -0,0 +1,26 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from apps.accounts.models import User
+from apps.analytics.services.rollups import RollupService
+from core.parallel import run_in_process_pool
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero el resumen de transacciones de analíticas, un usuario por tarea en paralelo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Email del usuario cuyo resumen se reconstruye (por defecto todos)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Cantidad de procesos (por defecto uno por CPU)')
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(email=options['user'])
+        user_ids = list(users.values_list('id', flat=True))
+
+        total = run_in_process_pool(RollupService.rebuild, user_ids, options['workers'], chunk_size=1)
+
+        self.stdout.write(self.style.SUCCESS(f'{total} filas de resumen reconstruidas para {len(user_ids)} usuarios.'))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-17 03:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('transactions', '0010_transaction_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('DAY', 'dia'), ('MONTH', 'mes')], max_length=5)),
+                ('period', models.DateField(help_text='Dia, o primer dia del mes')),
+                ('income', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('expense', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0, help_text='Cantidad de transacciones')),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='transactions.account')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='transactions.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumen de transacciones',
+                'verbose_name_plural': 'Resúmenes de transacciones',
+                'ordering': ['period'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'granularity', 'period', 'account', 'category'), name='unique_rollup_per_period')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('transactions', '0011_account_currency'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.TextField(blank=True)),
+                ('frequency', models.CharField(choices=[('WEEKLY', 'semanal'), ('MONTHLY', 'mensual'), ('YEARLY', 'anual')], max_length=7)),
+                ('amount', models.DecimalField(decimal_places=2, help_text='Monto promedio de la serie', max_digits=14)),
+                ('interval_days', models.PositiveIntegerField(help_text='Intervalo promedio entre apariciones')),
+                ('occurrences', models.PositiveIntegerField()),
+                ('first_date', models.DateField()),
+                ('last_date', models.DateField()),
+                ('next_date', models.DateField(help_text='Fecha esperada de la próxima aparición')),
+                ('detected_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_series', to='transactions.account')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_series', to='transactions.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_series', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Serie recurrente',
+                'verbose_name_plural': 'Series recurrentes',
+                'ordering': ['next_date'],
+                'indexes': [models.Index(fields=['user', 'next_date'], name='recurring_user_next_idx')],
+            },
+        ),
+    ]
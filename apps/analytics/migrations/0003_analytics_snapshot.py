@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:05
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_user_email'),
+        ('analytics', '0002_recurring_series'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsSnapshot',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='analytics_snapshot', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('data_version', models.BigIntegerField(help_text='Versión de datos del usuario al calcularse')),
+                ('month', models.DateField(help_text='Primer dia del mes calculado')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Snapshot de analíticas',
+                'verbose_name_plural': 'Snapshots de analíticas',
+            },
+        ),
+    ]
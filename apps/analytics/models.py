@@ -1,3 +1,104 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
-# Create your models here.
+
+class TransactionRollup(models.Model):
+    """
+    Resumen de transacciones por usuario, periodo (día o mes), cuenta y categoría.
+    Lo mantiene RollupService de forma incremental desde los servicios de transacciones
+    y las analíticas lo leen en lugar de recorrer las transacciones: las filas mensuales
+    para los meses completos del rango y las diarias para el resto.
+    """
+    DAY = 'DAY'
+    MONTH = 'MONTH'
+    GRANULARITY_CHOICES = [
+        (DAY, 'dia'),
+        (MONTH, 'mes'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='rollups')
+    granularity = models.CharField(max_length=5, choices=GRANULARITY_CHOICES)
+    period = models.DateField(help_text='Dia, o primer dia del mes')
+    account = models.ForeignKey('transactions.Account', on_delete=models.CASCADE, related_name='rollups')
+    category = models.ForeignKey('transactions.Category', on_delete=models.CASCADE, related_name='rollups')
+
+    income = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expense = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0, help_text='Cantidad de transacciones')
+
+    class Meta:
+        verbose_name = 'Resumen de transacciones'
+        verbose_name_plural = 'Resúmenes de transacciones'
+        ordering = ['period']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'granularity', 'period', 'account', 'category'],
+                name='unique_rollup_per_period'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.period} ({self.get_granularity_display()}): +{self.income} -{self.expense}"
+
+
+class RecurringSeries(models.Model):
+    """
+    Serie de transacciones recurrentes de un usuario (misma cuenta, categoría,
+    descripción y monto similar, con una periodicidad semanal, mensual o anual).
+    La recalcula RecurringSeriesService a partir del historial completo.
+    """
+    WEEKLY = 'WEEKLY'
+    MONTHLY = 'MONTHLY'
+    YEARLY = 'YEARLY'
+    FREQUENCY_CHOICES = [
+        (WEEKLY, 'semanal'),
+        (MONTHLY, 'mensual'),
+        (YEARLY, 'anual'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='recurring_series')
+    account = models.ForeignKey('transactions.Account', on_delete=models.CASCADE, related_name='recurring_series')
+    category = models.ForeignKey('transactions.Category', on_delete=models.CASCADE, related_name='recurring_series')
+    description = models.TextField(blank=True)
+    frequency = models.CharField(max_length=7, choices=FREQUENCY_CHOICES)
+
+    amount = models.DecimalField(max_digits=14, decimal_places=2, help_text='Monto promedio de la serie')
+    interval_days = models.PositiveIntegerField(help_text='Intervalo promedio entre apariciones')
+    occurrences = models.PositiveIntegerField()
+    first_date = models.DateField()
+    last_date = models.DateField()
+    next_date = models.DateField(help_text='Fecha esperada de la próxima aparición')
+    detected_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Serie recurrente'
+        verbose_name_plural = 'Series recurrentes'
+        ordering = ['next_date']
+        indexes = [
+            models.Index(fields=['user', 'next_date'], name='recurring_user_next_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.description or self.category_id} ({self.get_frequency_display()}): {self.amount}"
+
+
+class AnalyticsSnapshot(models.Model):
+    """
+    Analíticas precalculadas del tablero de un usuario (resumen del mes, últimos 12
+    meses y gasto por categoría), válidas mientras no cambie su versión de datos ni el
+    mes. Las calcula `manage.py precompute_analytics` (ver SnapshotService).
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                related_name='analytics_snapshot')
+    data_version = models.BigIntegerField(help_text='Versión de datos del usuario al calcularse')
+    month = models.DateField(help_text='Primer dia del mes calculado')
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Snapshot de analíticas'
+        verbose_name_plural = 'Snapshots de analíticas'
+
+    def __str__(self):
+        return f"{self.user_id} {self.month:%Y-%m} (v{self.data_version})"
@@ -1,5 +1,11 @@
 from rest_framework import serializers
 
+from apps.transactions.models import Currency
+from .models import RecurringSeries
+from .services.buckets import BucketAggregate
+from .services.distribution import AmountDistribution
+from .services.rankings import SpendRanking
+
 
 class DailyBalanceSerializer(serializers.Serializer):
     day = serializers.DateField()
@@ -10,8 +16,8 @@ class MonthlySummarySerializer(serializers.Serializer):
     year = serializers.IntegerField()
     month = serializers.IntegerField()
     balance = serializers.FloatField()
-    incomes = serializers.FloatField()
-    expenses = serializers.FloatField()
+    incomes = serializers.FloatField(source='ingresos')
+    expenses = serializers.FloatField(source='egresos')
     daily_series = DailyBalanceSerializer(many=True)
 
 
@@ -24,3 +30,145 @@ class WeeklyBalanceSerializer(serializers.Serializer):
 class WeeklySummarySerializer(serializers.Serializer):
     # many=True, así que no campos extra necesarios aquí
     pass
+
+
+class CommaSeparatedChoicesField(serializers.CharField):
+    """
+    Lista de valores separados por coma, cada uno dentro de `choices`
+    """
+
+    def __init__(self, choices, **kwargs):
+        self.choices = tuple(choices)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        values = [value.strip() for value in super().to_internal_value(data).split(',') if value.strip()]
+        invalid = [value for value in values if value not in self.choices]
+        if invalid:
+            raise serializers.ValidationError(
+                f'Valores inválidos: {", ".join(invalid)}. Opciones: {", ".join(self.choices)}'
+            )
+        return values
+
+
+class CurrencyQuerySerializer(serializers.Serializer):
+    """
+    Moneda destino opcional (por código) a la que se convierten los montos
+    """
+    currency = serializers.SlugRelatedField(slug_field='code', queryset=Currency.objects.all(), required=False)
+
+
+class CommaSeparatedDecimalsField(serializers.CharField):
+    """
+    Lista de números separados por coma, en orden creciente
+    """
+
+    def __init__(self, max_items: int = 50, **kwargs):
+        self.max_items = max_items
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        raw = [value.strip() for value in super().to_internal_value(data).split(',') if value.strip()]
+        values = [serializers.DecimalField(max_digits=14, decimal_places=2).to_internal_value(value) for value in raw]
+        if not values or len(values) > self.max_items:
+            raise serializers.ValidationError(f'Se requieren entre 1 y {self.max_items} valores.')
+        if values != sorted(set(values)):
+            raise serializers.ValidationError('Los valores deben ser crecientes y sin repetir.')
+        return values
+
+
+class DashboardQuerySerializer(CurrencyQuerySerializer):
+    """
+    Mes del tablero (por defecto el actual) y moneda destino
+    """
+    year = serializers.IntegerField(min_value=1, max_value=9999, required=False)
+    month = serializers.IntegerField(min_value=1, max_value=12, required=False)
+
+    def validate(self, attrs):
+        if ('year' in attrs) != ('month' in attrs):
+            raise serializers.ValidationError('`year` y `month` deben indicarse juntos.')
+        return attrs
+
+
+class SeriesQuerySerializer(CurrencyQuerySerializer):
+    """
+    Parámetros del motor de series: granularidad, rango de fechas (inclusive),
+    dimensiones de agrupación, métricas, moneda destino y, opcionalmente, saldo
+    acumulado y media móvil de N periodos
+    """
+    granularity = serializers.ChoiceField(choices=BucketAggregate.GRANULARITIES, default='month')
+    start = serializers.DateField()
+    end = serializers.DateField()
+    group_by = CommaSeparatedChoicesField(choices=BucketAggregate.DIMENSIONS, required=False, default=list)
+    metrics = CommaSeparatedChoicesField(choices=BucketAggregate.METRICS, required=False,
+                                         default=list(BucketAggregate.METRICS))
+    cumulative = serializers.BooleanField(default=False)
+    rolling = serializers.IntegerField(min_value=2, max_value=366, required=False)
+
+    def validate(self, attrs):
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({'end': '`end` debe ser posterior o igual a `start`.'})
+        if not attrs['metrics']:
+            raise serializers.ValidationError({'metrics': 'Se requiere al menos una métrica.'})
+        return attrs
+
+
+class TopSpendQuerySerializer(CurrencyQuerySerializer):
+    """
+    Parámetros del ranking de gasto: dimensión, rango de fechas (inclusive),
+    cantidad de posiciones y moneda destino
+    """
+    by = serializers.ChoiceField(choices=SpendRanking.DIMENSIONS, default='category')
+    start = serializers.DateField()
+    end = serializers.DateField()
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+    def validate(self, attrs):
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({'end': '`end` debe ser posterior o igual a `start`.'})
+        return attrs
+
+
+class ForecastQuerySerializer(serializers.Serializer):
+    """
+    Horizonte de la proyección de saldos, en días
+    """
+    days = serializers.IntegerField(min_value=1, max_value=365, default=90)
+
+
+class RecurringSeriesSerializer(serializers.ModelSerializer):
+    """
+    Serializer de solo lectura para RecurringSeries.
+    """
+    account_name = serializers.CharField(source='account.name', read_only=True)
+    category_name = serializers.CharField(source='category.name', read_only=True)
+
+    class Meta:
+        model = RecurringSeries
+        fields = ['id', 'account', 'account_name', 'category', 'category_name', 'description', 'frequency',
+                  'amount', 'interval_days', 'occurrences', 'first_date', 'last_date', 'next_date', 'detected_at']
+        read_only_fields = fields
+
+
+class RecurringSeriesQuerySerializer(serializers.Serializer):
+    """
+    Filtros opcionales de las series recurrentes
+    """
+    frequency = serializers.ChoiceField(choices=RecurringSeries.FREQUENCY_CHOICES, required=False)
+    account = serializers.UUIDField(required=False)
+
+
+class DistributionQuerySerializer(CurrencyQuerySerializer):
+    """
+    Parámetros de la distribución de montos: granularidad, rango de fechas (inclusive),
+    bordes del histograma y moneda destino
+    """
+    granularity = serializers.ChoiceField(choices=BucketAggregate.GRANULARITIES, default='month')
+    start = serializers.DateField()
+    end = serializers.DateField()
+    edges = CommaSeparatedDecimalsField(required=False, default=list(AmountDistribution.DEFAULT_EDGES))
+
+    def validate(self, attrs):
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({'end': '`end` debe ser posterior o igual a `start`.'})
+        return attrs
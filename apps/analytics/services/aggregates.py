@@ -1,109 +1,127 @@
 from datetime import date, timedelta
-from typing import Any, List, Dict
+from decimal import Decimal
+from typing import Any, List, Dict, Optional, Sequence, Tuple
 
-from django.db.models import Sum, F, Case, When, DecimalField, Value, QuerySet
-from django.db.models.functions import TruncDay
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 from apps.accounts.models import User
-from apps.transactions.models import Transaction
+from apps.transactions.models import Currency
+from .buckets import BucketAggregate
 
 
 class TimeSeriesAggregate:
     """
     Clase que provee metodos para obtener series temporales de balances,
-    ingresos o gratos por dia, semana o mes
+    ingresos o gratos por dia, semana o mes.
+    Todas son casos del motor genérico BucketAggregate: una consulta sobre el resumen
+    (TransactionRollup), con los montos convertidos a `currency` si se indica.
+    Con ANALYTICS_BACKEND = 'numpy' y sin moneda, las series se calculan con
+    VectorizedSeries sobre arreglos de NumPy; quien pida varias series del mismo usuario
+    puede crear una con `engine` y pasarla a cada una para leer una sola vez.
     """
+    BACKENDS = ('orm', 'numpy')
 
     @staticmethod
-    def _base_queryset(user: User, start_date: date, end_date: date) -> QuerySet[Transaction]:
-        """
-        Filtrado por usuario, rango de fechas y un monto anotado:
-        positivo para ingresos y negativo para egresos
-        """
-        query = Transaction.objects.filter(
-            user=user,
-            date__date__gte=start_date,
-            date__date__lte=end_date,
-        ).annotate(
-            signed_amount=Case(
-                When(category__category_type='INGRESO', then=F('amount')),
-                When(category__category_type='EGRESO', then=F('amount') * Value(-1)),
-                output_field=DecimalField(max_digits=12, decimal_places=2),
+    def engine(user: User, start_date: date, end_date: date, currency: Optional[Currency] = None,
+               daily_from: Optional[date] = None):
+        """
+        VectorizedSeries del rango para compartir entre series, o None si las series van
+        por el ORM (backend 'orm' o con moneda). Las series por día o semana solo pueden
+        pedirse desde `daily_from` (por defecto, todo el rango).
+        """
+        backend = settings.ANALYTICS_BACKEND
+        if backend not in TimeSeriesAggregate.BACKENDS:
+            raise ImproperlyConfigured(
+                f'ANALYTICS_BACKEND inválido: {backend!r}. Opciones: {", ".join(TimeSeriesAggregate.BACKENDS)}'
             )
-        )
-        return query
+        if backend != 'numpy' or currency is not None:
+            return None
+        # NumPy es opcional: solo se importa si se eligió este backend
+        from .vectorized import VectorizedSeries
+        return VectorizedSeries(user, start_date, end_date, daily_from)
 
     @staticmethod
-    def daily_series(user: User, start_date: date, end_date: date) -> List[Dict[str, Any]]:
+    def _rows(user: User, granularity: str, start_date: date, end_date: date, metrics: Sequence[str],
+              currency: Optional[Currency] = None, week_origin: Optional[date] = None,
+              engine=None) -> List[Dict[str, Any]]:
         """
-        Retorna una lista de balances para cada dia del rango proporcionado
+        `engine` (de TimeSeriesAggregate.engine, con la misma moneda) debe cubrir el rango
         """
-        query = TimeSeriesAggregate._base_queryset(user, start_date, end_date)
-        query = query.annotate(period=TruncDay('date'))
-        agg = query.values('period').annotate(
-            balance=Sum('signed_amount'),
-        ).order_by('period')
+        if engine is None:
+            # por mes o más, los meses completos salen de las filas mensuales del resumen
+            daily_from = start_date if granularity in ('day', 'week') else end_date + timedelta(days=1)
+            engine = TimeSeriesAggregate.engine(user, start_date, end_date, currency, daily_from)
+        if engine is not None:
+            return engine.window(start_date, end_date).series(granularity, metrics, week_origin)
+        return BucketAggregate(user, granularity, start_date, end_date, metrics=metrics, currency=currency,
+                               week_origin=week_origin).run()
 
-        # Asegurar que los dias sin transacciones aparezcan con 0
-        days = (end_date - start_date).days + 1
-        lookup = {
-            row['period'].date(): float(row['balance'] or 0) for row in agg
-        }
-        return [
-            {
-                'day': start_date + timedelta(days=i), 'balance': lookup.get(start_date + timedelta(day=i), 0.0)
-            } for i in range(days)
-        ]
+    @staticmethod
+    def daily_series(user: User, start_date: date, end_date: date,
+                     currency: Optional[Currency] = None) -> List[Dict[str, Any]]:
+        """
+        Retorna una lista de balances para cada dia del rango proporcionado
+        """
+        rows = TimeSeriesAggregate._rows(user, 'day', start_date, end_date, ['net'], currency)
+        return [{'day': row['period'], 'balance': row['net']} for row in rows]
 
     @staticmethod
-    def weekly_series(user, start_date: date, weeks: int) -> List[Dict[str, Any]]:
+    def weekly_series(user, start_date: date, weeks: int,
+                      currency: Optional[Currency] = None) -> List[Dict[str, Any]]:
         """
         Genera un resumen semanal de balance:
         - `week_start`: fecha de inicio de la semana (start_date + 7*i días)
         - `week_end`  : fecha de fin de la semana (6 días después)
         - `balance`   : suma de signed_amount en ese rango
         """
-        results: List[Dict[str, Any]] = []
-
-        for i in range(weeks):
-            week_start = start_date + timedelta(days=i * 7)
-            week_end = week_start + timedelta(days=6)
-
-            # Reutilizamos el método genérico para filtrar y anotar signed_amount
-            qs = TimeSeriesAggregate._base_queryset(user, week_start, week_end)
+        end_date = start_date + timedelta(days=weeks * 7 - 1)
 
-            # Agregación de balance en la semana
-            total = qs.aggregate(week_balance=Sum('signed_amount'))['week_balance'] or 0
-
-            results.append({
-                'week_start': week_start,
-                'week_end': week_end,
-                'balance': float(total),
-            })
-
-        return results
+        # Un solo GROUP BY con las semanas ancladas en start_date; las vacías aparecen con 0
+        rows = TimeSeriesAggregate._rows(user, 'week', start_date, end_date, ['net'], currency,
+                                         week_origin=start_date)
+        return [
+            {
+                'week_start': row['period'],
+                'week_end': row['period'] + timedelta(days=6),
+                'balance': row['net'],
+            } for row in rows
+        ]
 
     @staticmethod
-    def monthly_series(user, year: int, month: int) -> Dict[str, Any]:
+    def month_range(year: int, month: int) -> Tuple[date, date]:
         """
-        Balance total, ingresos y gastos del mes, y serie diaria interna.
+        Primer y último día del mes
         """
-        # Fecha inicio/fin del mes
         start_date = date(year, month, 1)
         # Para fin de mes usamos un truco:
         next_month = start_date.replace(day=28) + timedelta(days=4)
-        end_date = next_month - timedelta(days=next_month.day)
+        return start_date, next_month - timedelta(days=next_month.day)
 
-        # Serie diaria (reutiliza daily_series)
-        series = TimeSeriesAggregate.daily_series(user, start_date, end_date)
+    @staticmethod
+    def last_months_range(year: int, month: int, months: int = 12) -> Tuple[date, date]:
+        """
+        Primer día del primero y último día del último de los `months` meses que terminan en el indicado
+        """
+        first = year * 12 + month - months
+        _, end_date = TimeSeriesAggregate.month_range(year, month)
+        return date(first // 12, first % 12 + 1, 1), end_date
 
-        # Balance agregado del mes
-        qs = TimeSeriesAggregate._base_queryset(user, start_date, end_date)
-        total = qs.aggregate(balance=Sum('signed_amount'))['balance'] or 0
+    @staticmethod
+    def monthly_series(user, year: int, month: int, currency: Optional[Currency] = None,
+                       engine=None) -> Dict[str, Any]:
+        """
+        Balance total, ingresos y gastos del mes, y serie diaria interna.
+        """
+        start_date, end_date = TimeSeriesAggregate.month_range(year, month)
 
-        # Ingresos y egresos por separado
-        ingresos = qs.filter(signed_amount__gte=0).aggregate(Sum('signed_amount'))['signed_amount__sum'] or 0
-        egresos = - (qs.filter(signed_amount__lt=0).aggregate(Sum('signed_amount'))['signed_amount__sum'] or 0)
+        # Una sola consulta: ingresos y egresos por día; los totales del mes son su suma
+        rows = TimeSeriesAggregate._rows(user, 'day', start_date, end_date, ['income', 'expense'], currency,
+                                         engine=engine)
+        ingresos = sum(Decimal(str(row['income'])) for row in rows)
+        egresos = sum(Decimal(str(row['expense'])) for row in rows)
+        total = ingresos - egresos
+        series = [{'day': row['period'], 'balance': round(row['income'] - row['expense'], 2)} for row in rows]
 
         return {
             'year': year,
@@ -113,3 +131,26 @@ class TimeSeriesAggregate:
             'egresos': float(egresos),
             'daily_series': series,
         }
+
+    @staticmethod
+    def last_months(user, year: int, month: int, months: int = 12,
+                    currency: Optional[Currency] = None, engine=None) -> List[Dict[str, Any]]:
+        """
+        Ingresos, egresos y balance de cada uno de los `months` meses que terminan en el indicado
+        """
+        start_date, end_date = TimeSeriesAggregate.last_months_range(year, month, months)
+        return TimeSeriesAggregate._rows(user, 'month', start_date, end_date, ['income', 'expense', 'net'], currency,
+                                         engine=engine)
+
+    @staticmethod
+    def category_breakdown(user, year: int, month: int, currency: Optional[Currency] = None) -> List[Dict[str, Any]]:
+        """
+        Gasto del mes por categoría, de mayor a menor, sin las categorías sin gasto
+        """
+        start_date, end_date = TimeSeriesAggregate.month_range(year, month)
+        rows = BucketAggregate(user, 'month', start_date, end_date, ['category'], metrics=['expense'],
+                               currency=currency).run()
+        return sorted(
+            ({key: row[key] for key in ('category', 'category_name', 'expense')} for row in rows if row['expense']),
+            key=lambda row: -row['expense'],
+        )
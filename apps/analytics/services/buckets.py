@@ -0,0 +1,413 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.db import connection
+from django.db.models import Case, DateField, F, Func, Q, QuerySet, Sum, Value, When
+from django.db.models.functions import Cast, Trunc, TruncDate
+
+from apps.accounts.models import User
+from apps.analytics.models import TransactionRollup
+from apps.transactions.filters import day_bounds
+from apps.transactions.models import Category, Currency, Transaction
+from .currency import CurrencyConversion, MissingExchangeRate
+
+
+class AnchoredWeek(Func):
+    """
+    Inicio de la semana de 7 días, contada desde `origin`, que contiene una fecha.
+    En Postgres la resta de fechas es un entero de días y fecha + entero es una fecha.
+    """
+    output_field = DateField()
+
+    def __init__(self, expression, origin: date, **extra):
+        super().__init__(expression, Value(origin, output_field=DateField()), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        day_sql, day_params = compiler.compile(self.source_expressions[0])
+        origin_sql, origin_params = compiler.compile(self.source_expressions[1])
+        sql = f'({origin_sql} + (({day_sql} - {origin_sql}) / 7) * 7)'
+        return sql, [*origin_params, *day_params, *origin_params]
+
+
+class BucketAggregate:
+    """
+    Motor genérico de series temporales: agrupa por periodo (día, semana, mes, trimestre
+    o año) y opcionalmente por dimensiones, calculando las métricas pedidas en una
+    sola consulta.
+
+    Lee el resumen (TransactionRollup) salvo que se agrupe por etiqueta: el resumen no
+    distingue etiquetas, así que en ese caso se agregan las transacciones. Por mes,
+    trimestre o año usa las filas mensuales de los meses completos del rango y las
+    diarias solo para los meses parciales de los extremos; por día o semana, o al
+    convertir monedas (la cotización es la de cada día), usa las diarias. Una
+    transacción con varias etiquetas suma en cada una; las que no tienen etiqueta
+    aparecen con `tag` nulo.
+
+    Con `currency` los montos se convierten a esa moneda en la misma consulta
+    (ver CurrencyConversion); si falta alguna cotización se lanza MissingExchangeRate.
+    Con `week_origin` las semanas empiezan en esa fecha (y cada 7 días) en lugar del lunes.
+
+    `cumulative` agrega `cumulative_net`: el saldo acumulado al cierre de cada periodo,
+    partiendo del saldo de apertura (todo lo anterior al primer periodo, que la consulta
+    agrupa en un único periodo semilla). `rolling=N` agrega `rolling_<métrica>`: el
+    promedio de los últimos N periodos, leyendo también los N-1 anteriores al primero.
+    Ambos se calculan con funciones de ventana sobre la misma agregación, por dimensión;
+    en esos modos el primer periodo se cuenta completo aunque `start_date` no caiga en
+    su inicio.
+    """
+    GRANULARITIES = ('day', 'week', 'month', 'quarter', 'year')
+    METRICS = ('income', 'expense', 'net', 'count')
+    # dimensión -> columnas de salida (id y nombre legible) sobre el resumen
+    DIMENSIONS = {
+        'category': {'category': 'category_id', 'category_name': 'category__name'},
+        'category_type': {'category_type': 'category__category_type'},
+        'account': {'account': 'account_id', 'account_name': 'account__name'},
+        'tag': {'tag': 'tags__id', 'tag_name': 'tags__name'},
+    }
+
+    def __init__(self, user: User, granularity: str, start_date: date, end_date: date,
+                 dimensions: Sequence[str] = (), metrics: Sequence[str] = METRICS,
+                 currency: Optional[Currency] = None, week_origin: Optional[date] = None,
+                 cumulative: bool = False, rolling: Optional[int] = None):
+        if granularity not in self.GRANULARITIES:
+            raise ValueError(f'Granularidad inválida: {granularity}')
+        unknown = [name for name in (*dimensions, *metrics) if name not in self.DIMENSIONS and name not in self.METRICS]
+        if unknown:
+            raise ValueError(f'Dimensiones o métricas inválidas: {", ".join(unknown)}')
+        self.user = user
+        self.granularity = granularity
+        self.start_date = start_date
+        self.end_date = end_date
+        self.dimensions = list(dict.fromkeys(dimensions))
+        self.metrics = list(dict.fromkeys(metrics))
+        self.currency = currency
+        self.week_origin = week_origin
+        self.cumulative = cumulative
+        self.rolling = rolling
+
+    @property
+    def columns(self) -> Dict[str, str]:
+        columns = {}
+        for dimension in self.dimensions:
+            columns.update(self.DIMENSIONS[dimension])
+        return columns
+
+    @property
+    def uses_rollup(self) -> bool:
+        return 'tag' not in self.dimensions
+
+    @property
+    def windowed(self) -> bool:
+        return self.cumulative or bool(self.rolling)
+
+    @property
+    def output_metrics(self) -> List[str]:
+        names = list(self.metrics)
+        if self.cumulative:
+            names.append('cumulative_net')
+        if self.rolling:
+            names.extend(f'rolling_{name}' for name in self.metrics)
+        return names
+
+    @property
+    def first_period(self) -> date:
+        """
+        Inicio del periodo que contiene `start_date`
+        """
+        if self.granularity == 'week' and self.week_origin:
+            return self.start_date - timedelta(days=(self.start_date - self.week_origin).days % 7)
+        return self.truncate(self.start_date, self.granularity)
+
+    @property
+    def window_start(self) -> date:
+        """
+        Primer día que leen las ventanas: el inicio del periodo N-1 periodos antes del primero
+        """
+        start = self.first_period
+        for _ in range((self.rolling or 1) - 1):
+            start = self.previous_period(start, self.granularity)
+        return start
+
+    def source(self) -> Tuple[QuerySet, Func, Dict[str, Any], str]:
+        """
+        Filas de origen filtradas, expresión del periodo, montos por fila (ingreso, egreso
+        y cantidad) y ruta a la fecha de cada fila
+        """
+        # el acumulado lee todo el historial; la media móvil, desde el inicio de su ventana
+        first_day = None if self.cumulative else self.window_start if self.rolling else self.start_date
+        if self.uses_rollup:
+            base = TransactionRollup.objects.filter(self._rollup_rows(first_day), user=self.user)
+            amounts = {'income': F('income'), 'expense': F('expense'), 'count': F('count')}
+            return base, self._period('period'), amounts, 'period'
+
+        lower, upper = day_bounds(first_day or self.start_date, self.end_date)
+        base = Transaction.objects.filter(user=self.user, date__lt=upper).annotate(
+            local_date=TruncDate('date'),
+        )
+        if first_day:
+            base = base.filter(date__gte=lower)
+        income_type, expense_type = Category.TYPE_CHOICES[0][0], Category.TYPE_CHOICES[1][0]
+        amounts = {
+            'income': Case(When(category__category_type=income_type, then=F('amount')), default=Value(Decimal('0'))),
+            'expense': Case(When(category__category_type=expense_type, then=F('amount')), default=Value(Decimal('0'))),
+            'count': Value(1),
+        }
+        return base, self._period('local_date'), amounts, 'local_date'
+
+    def _rollup_rows(self, first_day: Optional[date]) -> Q:
+        """
+        Filas del resumen que cubren [first_day, end_date] una sola vez: las mensuales de
+        los meses completos y las diarias del resto
+        """
+        days = Q(granularity=TransactionRollup.DAY, period__lte=self.end_date)
+        if first_day:
+            days &= Q(period__gte=first_day)
+        if self.granularity in ('day', 'week') or self.currency:
+            return days
+        months_start, months_end = self.full_months(first_day, self.end_date)
+        months = Q(granularity=TransactionRollup.MONTH, period__lt=months_end)
+        outside = Q(period__gte=months_end)
+        if months_start:
+            months &= Q(period__gte=months_start)
+            outside |= Q(period__lt=months_start)
+        return months | (days & outside)
+
+    def _period(self, date_path: str) -> Func:
+        if self.granularity == 'week' and self.week_origin:
+            period = AnchoredWeek(F(date_path), self.week_origin)
+        else:
+            period = Trunc(date_path, self.granularity, output_field=DateField())
+        if not self.windowed:
+            return period
+        # Lo anterior a la ventana solo aporta al saldo de apertura: un único periodo semilla
+        seed = self.window_start - timedelta(days=1)
+        return Case(
+            When(**{f'{date_path}__lt': self.window_start}, then=Value(seed, output_field=DateField())),
+            default=period,
+            output_field=DateField(),
+        )
+
+    def queryset(self) -> QuerySet:
+        """
+        La consulta agrupada sin conversión: una fila por periodo y combinación de dimensiones
+        """
+        base, period, amounts, _ = self.source()
+        metrics = {
+            'income': Sum(amounts['income']),
+            'expense': Sum(amounts['expense']),
+            'net': Sum(amounts['income'] - amounts['expense']),
+            'count': Sum(amounts['count']),
+        }
+        paths = list(self.columns.values())
+        # Alias propios: income, expense y count también son columnas del resumen
+        return base.annotate(bucket=period).values('bucket', *paths).annotate(
+            **{f'metric_{name}': metrics[name] for name in self.metrics},
+        ).order_by('bucket', *paths)
+
+    def _aggregate_sql(self) -> Tuple[str, List[Any]]:
+        """
+        SQL de la agregación sin conversión con columnas con nombre: bucket, dimension_<i>,
+        metric_<métrica> (todas) y missing (siempre 0), como _converted_sql
+        """
+        base, period, amounts, _ = self.source()
+        dimensions = {f'dimension_{i}': F(path) for i, path in enumerate(self.columns.values())}
+        queryset = base.annotate(bucket=Cast(period, DateField()), **dimensions).values('bucket', *dimensions).annotate(
+            metric_income=Sum(amounts['income']),
+            metric_expense=Sum(amounts['expense']),
+            metric_net=Sum(amounts['income'] - amounts['expense']),
+            metric_count=Sum(amounts['count']),
+            missing=Value(0),
+        ).order_by()
+        return queryset.query.sql_with_params()
+
+    def _converted_sql(self) -> Tuple[str, List[Any]]:
+        """
+        La agregación convirtiendo los montos a `currency`. La subconsulta interna agrupa
+        primero por periodo, dimensiones, moneda y día, de modo que la cotización se busca
+        una vez por moneda y día (LATERAL) y no por fila; la consulta externa aplica el
+        factor y suma. `missing` cuenta los grupos sin cotización.
+        """
+        base, period, amounts, date_path = self.source()
+        dimensions = {f'dimension_{i}': path for i, path in enumerate(self.columns.values())}
+        inner = base.annotate(
+            bucket=period,
+            day=F(date_path),
+            currency=F('account__currency'),
+            **{alias: F(path) for alias, path in dimensions.items()},
+        ).values('bucket', 'day', 'currency', *dimensions).annotate(
+            value_income=Sum(amounts['income']),
+            value_expense=Sum(amounts['expense']),
+            value_count=Sum(amounts['count']),
+        ).order_by()
+        inner_sql, inner_params = inner.query.sql_with_params()
+        join_sql, join_params = CurrencyConversion(self.currency).lateral_join('q.currency', 'q.day')
+
+        group = ', '.join(str(i) for i in range(1, len(dimensions) + 2))
+        sql = f"""
+            SELECT q.bucket::date AS bucket, {''.join(f'q.{alias}, ' for alias in dimensions)}
+                   SUM(q.value_income * fx.rate) AS metric_income,
+                   SUM(q.value_expense * fx.rate) AS metric_expense,
+                   SUM((q.value_income - q.value_expense) * fx.rate) AS metric_net,
+                   SUM(q.value_count) AS metric_count,
+                   COUNT(*) FILTER (WHERE fx.rate IS NULL) AS missing
+            FROM ({inner_sql}) q
+            {join_sql}
+            GROUP BY {group}
+        """
+        return sql, [*inner_params, *join_params]
+
+    def converted_rows(self) -> List[Dict[str, Any]]:
+        """
+        La misma agregación convirtiendo los montos a `currency`, en una sola consulta
+        """
+        sql, params = self._converted_sql()
+        group = ', '.join(str(i) for i in range(1, len(self.columns) + 2))
+        return self._fetch(f'{sql} ORDER BY {group}', params)
+
+    def windowed_rows(self) -> List[Dict[str, Any]]:
+        """
+        La agregación (convertida o no) con el acumulado y las medias móviles calculados
+        con funciones de ventana por dimensión, en una sola consulta. Sin dimensiones, los
+        periodos vacíos se completan en la misma consulta para que las ventanas los vean.
+        """
+        inner_sql, params = self._converted_sql() if self.currency else self._aggregate_sql()
+        dimensions = [f'dimension_{i}' for i in range(len(self.columns))]
+        # sin dimensiones la lista de periodos se une a la agregación
+        bucket = 'q.bucket' if dimensions else 'p.bucket'
+        partition = f'PARTITION BY {", ".join(f"q.{alias}" for alias in dimensions)} ' if dimensions else ''
+        span = {'day': 'days', 'week': 'days', 'month': 'months', 'quarter': 'months', 'year': 'years'}
+        size = {'week': 7, 'quarter': 3}.get(self.granularity, 1)
+
+        columns = [*(f'q.{alias}' for alias in dimensions),
+                   *(f'COALESCE(q.metric_{name}, 0) AS metric_{name}' for name in self.metrics)]
+        if self.cumulative:
+            columns.append(f'SUM(COALESCE(q.metric_net, 0)) OVER ({partition}ORDER BY {bucket}) '
+                           f'AS metric_cumulative_net')
+        if self.rolling:
+            columns.extend(f'SUM(COALESCE(q.metric_{name}, 0)) OVER rolling / {self.rolling}.0 '
+                           f'AS metric_rolling_{name}' for name in self.metrics)
+        window = (f'WINDOW rolling AS ({partition}ORDER BY {bucket} RANGE BETWEEN '
+                  f"INTERVAL '{(self.rolling - 1) * size} {span[self.granularity]}' PRECEDING AND CURRENT ROW)"
+                  if self.rolling else '')
+        if dimensions:
+            source = 'q'
+        else:
+            source = '(SELECT unnest(%s::date[]) AS bucket UNION SELECT bucket FROM q) p LEFT JOIN q USING (bucket)'
+            params = [*params, self.periods()]
+
+        sql = f"""
+            WITH q AS ({inner_sql})
+            SELECT * FROM (
+                SELECT {bucket} AS bucket, {', '.join(columns)},
+                       MAX(COALESCE(q.missing, 0)) OVER () AS missing
+                FROM {source}
+                {window}
+            ) w
+            WHERE w.bucket >= %s
+            ORDER BY {', '.join(['w.bucket', *(f'w.{alias}' for alias in dimensions)])}
+        """
+        return self._fetch(sql, [*params, self.first_period])
+
+    def _fetch(self, sql: str, params: List[Any]) -> List[Dict[str, Any]]:
+        """
+        Ejecuta una consulta con columnas bucket, dimension_<i>, metric_<...> y missing,
+        y devuelve filas con las mismas claves que queryset()
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            names = [column.name for column in cursor.description]
+            records = cursor.fetchall()
+
+        paths = {f'dimension_{i}': path for i, path in enumerate(self.columns.values())}
+        wanted = {'bucket', *paths, *(f'metric_{name}' for name in self.output_metrics)}
+        rows = []
+        for record in records:
+            row = dict(zip(names, record))
+            if row['missing']:
+                raise MissingExchangeRate(f'Faltan cotizaciones hacia {self.currency.code} para algunos montos '
+                                          'o hay cuentas sin moneda asignada')
+            rows.append({paths.get(name, name): value for name, value in row.items() if name in wanted})
+        return rows
+
+    def run(self) -> List[Dict[str, Any]]:
+        """
+        Ejecuta la consulta. Sin dimensiones, los periodos sin transacciones
+        aparecen con métricas en 0.
+        """
+        if self.windowed:
+            return [self._clean(row) for row in self.windowed_rows()]
+        rows = self.converted_rows() if self.currency else self.queryset()
+        rows = [self._clean(row) for row in rows]
+        if self.dimensions:
+            return rows
+
+        lookup = {row['period']: row for row in rows}
+        empty = {name: 0 if name == 'count' else 0.0 for name in self.metrics}
+        return [lookup.get(period, {'period': period, **empty}) for period in self.periods()]
+
+    def periods(self) -> List[date]:
+        """
+        Inicio de cada periodo que toca el rango, en el mismo formato que date_trunc
+        """
+        current = self.first_period
+        periods = []
+        while current <= self.end_date:
+            periods.append(current)
+            current = self.next_period(current, self.granularity)
+        return periods
+
+    @staticmethod
+    def full_months(start_date: Optional[date], end_date: date) -> Tuple[Optional[date], date]:
+        """
+        Primer día del primer mes completo de [start_date, end_date] y del mes que sigue al
+        último completo; sin `start_date`, los meses completos van desde el inicio
+        """
+        months_end = BucketAggregate.truncate(end_date + timedelta(days=1), 'month')
+        if start_date is None:
+            return None, months_end
+        months_start = BucketAggregate.truncate(start_date, 'month')
+        if months_start != start_date:
+            months_start = BucketAggregate.next_period(months_start, 'month')
+        return months_start, max(months_start, months_end)
+
+    @staticmethod
+    def truncate(day: date, granularity: str) -> date:
+        if granularity == 'week':
+            return day - timedelta(days=day.weekday())
+        if granularity == 'month':
+            return day.replace(day=1)
+        if granularity == 'quarter':
+            return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+        if granularity == 'year':
+            return day.replace(month=1, day=1)
+        return day
+
+    @staticmethod
+    def next_period(day: date, granularity: str) -> date:
+        if granularity == 'day':
+            return day + timedelta(days=1)
+        if granularity == 'week':
+            return day + timedelta(days=7)
+        months = {'month': 1, 'quarter': 3, 'year': 12}[granularity]
+        month = day.month - 1 + months
+        return day.replace(year=day.year + month // 12, month=month % 12 + 1)
+
+    @staticmethod
+    def previous_period(day: date, granularity: str) -> date:
+        if granularity == 'day':
+            return day - timedelta(days=1)
+        if granularity == 'week':
+            return day - timedelta(days=7)
+        months = {'month': 1, 'quarter': 3, 'year': 12}[granularity]
+        month = day.month - 1 - months
+        return day.replace(year=day.year + month // 12, month=month % 12 + 1)
+
+    def _clean(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        row['period'] = row.pop('bucket')
+        for name, path in self.columns.items():
+            row[name] = row.pop(path)
+        for name in self.output_metrics:
+            value = row.pop(f'metric_{name}') or 0
+            row[name] = int(value) if name == 'count' else float(round(value, 2))
+        return row
@@ -0,0 +1,53 @@
+from typing import Any, List, Tuple
+
+from apps.transactions.models import Currency, ExchangeRate
+
+
+class CurrencyConversion:
+    """
+    Conversión de montos a una moneda destino dentro de la misma consulta de agregación.
+
+    Cada grupo (moneda, día) usa la última ExchangeRate de su moneda a la destino con
+    fecha menor o igual a ese día, buscada con un LEFT JOIN LATERAL ... LIMIT 1 sobre el
+    índice único (base, destino, fecha). Si no hay cotización directa se usa la inversa
+    de la cotización destino -> moneda. Las cuentas en la moneda destino no se
+    convierten. Si no hay ninguna cotización el factor es NULL, igual que para las
+    cuentas sin moneda: sus montos no se pueden convertir y no se suman como si
+    estuvieran en la destino.
+    """
+
+    def __init__(self, target: Currency):
+        self.target = target
+
+    def lateral_join(self, currency_column: str, date_column: str, alias: str = 'fx') -> Tuple[str, List[Any]]:
+        """
+        SQL del LEFT JOIN LATERAL que expone `<alias>.rate` para cada fila de la consulta
+        externa, con sus parámetros. `currency_column` y `date_column` son columnas
+        (ya calificadas) de esa consulta.
+        """
+        table = ExchangeRate._meta.db_table
+        sql = f"""
+            LEFT JOIN LATERAL (
+                SELECT CASE
+                    WHEN {currency_column} IS NULL THEN NULL
+                    WHEN {currency_column} = %s THEN 1
+                    ELSE COALESCE(
+                        (SELECT er.rate FROM {table} er
+                         WHERE er.base_currency_id = {currency_column} AND er.target_currency_id = %s
+                           AND er.date <= {date_column}
+                         ORDER BY er.date DESC LIMIT 1),
+                        1 / NULLIF((SELECT er.rate FROM {table} er
+                                    WHERE er.base_currency_id = %s AND er.target_currency_id = {currency_column}
+                                      AND er.date <= {date_column}
+                                    ORDER BY er.date DESC LIMIT 1), 0)
+                    )
+                END AS rate
+            ) {alias} ON TRUE
+        """
+        return sql, [self.target.pk, self.target.pk, self.target.pk]
+
+
+class MissingExchangeRate(Exception):
+    """
+    Hay montos sin cotización hacia la moneda destino en o antes de su fecha
+    """
@@ -0,0 +1,108 @@
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+from django.db import connection
+from django.db.models import DateField, F
+from django.db.models.functions import Cast, Trunc, TruncDate
+
+from apps.accounts.models import User
+from apps.transactions.filters import day_bounds
+from apps.transactions.models import Currency, Transaction
+from .buckets import BucketAggregate
+from .currency import CurrencyConversion, MissingExchangeRate
+
+
+class AmountDistribution:
+    """
+    Distribución de los montos de las transacciones por periodo y categoría: mediana,
+    percentiles 90 y 99, mínimo, máximo y un histograma con los bordes indicados.
+
+    Todo sale de una consulta agrupada: percentile_cont calcula los tres percentiles de
+    cada grupo de una vez y cada barra del histograma es un COUNT(*) FILTER sobre
+    width_bucket(monto, bordes). La barra i cuenta los montos en [edges[i-1], edges[i]);
+    la primera los menores a edges[0] y la última los mayores o iguales al último borde.
+    Con `currency` los montos se convierten antes de calcular, como en BucketAggregate.
+    """
+    PERCENTILES = (('median', 0.5), ('p90', 0.9), ('p99', 0.99))
+    DEFAULT_EDGES = tuple(Decimal(edge) for edge in ('10', '50', '100', '500', '1000', '5000'))
+
+    def __init__(self, user: User, granularity: str, start_date: date, end_date: date,
+                 edges: Sequence[Decimal], currency: Optional[Currency] = None):
+        if granularity not in BucketAggregate.GRANULARITIES:
+            raise ValueError(f'Granularidad inválida: {granularity}')
+        if list(edges) != sorted(set(edges)):
+            raise ValueError('Los bordes del histograma deben ser crecientes')
+        self.user = user
+        self.granularity = granularity
+        self.start_date = start_date
+        self.end_date = end_date
+        self.edges = list(edges)
+        self.currency = currency
+
+    def run(self) -> List[Dict[str, Any]]:
+        lower, upper = day_bounds(self.start_date, self.end_date)
+        inner = Transaction.objects.filter(user=self.user, date__gte=lower, date__lt=upper).annotate(
+            day=TruncDate('date'),
+        ).annotate(
+            bucket=Cast(Trunc('day', self.granularity, output_field=DateField()), DateField()),
+            currency=F('account__currency'),
+            category_name=F('category__name'),
+        ).values('bucket', 'category_id', 'category_name', 'day', 'currency', 'amount').order_by()
+        inner_sql, inner_params = inner.query.sql_with_params()
+        if self.currency:
+            join_sql, join_params = CurrencyConversion(self.currency).lateral_join('q.currency', 'q.day')
+        else:
+            join_sql, join_params = 'CROSS JOIN (SELECT 1 AS rate) fx', []
+
+        bins = ',\n'.join(
+            f'COUNT(*) FILTER (WHERE width_bucket(q.amount * fx.rate, %s::numeric[]) = {index})'
+            for index in range(len(self.edges) + 1)
+        )
+        sql = f"""
+            SELECT q.bucket, q.category_id, q.category_name,
+                   COUNT(*),
+                   COUNT(*) FILTER (WHERE fx.rate IS NULL),
+                   MIN(q.amount * fx.rate),
+                   MAX(q.amount * fx.rate),
+                   percentile_cont(%s::float8[]) WITHIN GROUP (ORDER BY q.amount * fx.rate),
+                   {bins}
+            FROM ({inner_sql}) q
+            {join_sql}
+            GROUP BY q.bucket, q.category_id, q.category_name
+            ORDER BY q.bucket, q.category_name
+        """
+        edges = [str(edge) for edge in self.edges]
+        params = [
+            [fraction for _, fraction in self.PERCENTILES],
+            *[edges] * (len(self.edges) + 1),
+            *inner_params,
+            *join_params,
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            records = cursor.fetchall()
+
+        results = []
+        for bucket, category, category_name, count, missing, minimum, maximum, percentiles, *bins in records:
+            if missing:
+                raise MissingExchangeRate(f'Faltan cotizaciones hacia {self.currency.code} para algunos montos '
+                                          'o hay cuentas sin moneda asignada')
+            results.append({
+                'period': bucket,
+                'category': category,
+                'category_name': category_name,
+                'count': count,
+                'min': float(round(minimum, 2)),
+                'max': float(round(maximum, 2)),
+                **{name: round(value, 2) for (name, _), value in zip(self.PERCENTILES, percentiles)},
+                'histogram': [
+                    {
+                        'min': float(self.edges[index - 1]) if index else None,
+                        'max': float(self.edges[index]) if index < len(self.edges) else None,
+                        'count': total,
+                    }
+                    for index, total in enumerate(bins)
+                ],
+            })
+        return results
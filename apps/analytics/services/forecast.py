@@ -0,0 +1,111 @@
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.analytics.models import RecurringSeries
+from apps.transactions.models import Account, Category
+from .recurring import RecurringSeriesService, advance
+
+
+class CashFlowForecast:
+    """
+    Proyección del saldo diario de cada cuenta para los próximos `days` días: parte
+    del saldo actual y suma las apariciones futuras de las series recurrentes vigentes
+    al día de hoy (ver RecurringSeriesService).
+
+    Las apariciones se acumulan en una matriz cuenta x día con np.add.at y el saldo
+    de cada día sale de un cumsum por fila, sin recorrer días ni transacciones en Python.
+    Los saldos quedan en la moneda de cada cuenta.
+    """
+    # un mes calendario dura al menos 28 días
+    MIN_MONTH_DAYS = 28
+
+    def __init__(self, user: User, days: int, today: Optional[date] = None):
+        self.user = user
+        self.days = days
+        self.today = today or timezone.localdate()
+
+    def _occurrences(self, series: List[RecurringSeries],
+                     accounts: Dict[Any, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Apariciones futuras de cada serie entre mañana (día 1) y el día `days`: arreglos
+        de cuenta (posición en `accounts`), día y centavos con signo. Las atrasadas (entre
+        la última y hoy) no se proyectan.
+        """
+        today = np.datetime64(self.today, 'D')
+        last = np.array([item.last_date for item in series], dtype='datetime64[D]')
+        interval = np.array([item.interval_days for item in series], dtype=np.int64)
+        months = np.array([RecurringSeriesService.CALENDAR_MONTHS.get(item.frequency, 0) for item in series],
+                          dtype=np.int64)
+        # candidatas: la k-ésima aparición después de la última, con k = 1, 2, ... hasta
+        # pasar el horizonte
+        step = np.where(months > 0, self.MIN_MONTH_DAYS * months, np.maximum(interval, 1))
+        total = np.maximum((self.days - (last - today).astype(np.int64)) // step, 0)
+        pattern = np.repeat(np.arange(len(series)), total)
+        k = np.arange(len(pattern)) - np.repeat(np.cumsum(total) - total, total) + 1
+        day = (advance(last[pattern], k, interval[pattern], months[pattern]) - today).astype(np.int64)
+
+        account = np.array([accounts[item.account_id] for item in series], dtype=np.int64)
+        cents = np.array([int(item.amount * 100) for item in series], dtype=np.int64)
+        keep = (day >= 1) & (day <= self.days)
+        return account[pattern][keep], day[keep], cents[pattern][keep]
+
+    def run(self) -> Dict[str, Any]:
+        accounts = list(Account.objects.filter(user=self.user).order_by('id').values_list(
+            'id', 'name', 'currency__code', 'balance__balance'
+        ))
+        categories = {
+            pk: (name, 1 if category_type == Category.TYPE_CHOICES[0][0] else -1)
+            for pk, name, category_type in Category.objects.filter(user=self.user).values_list(
+                'id', 'name', 'category_type'
+            )
+        }
+        series = RecurringSeriesService.detect(self.user.pk, today=self.today)
+        for item in series:
+            item.amount *= categories[item.category_id][1]
+
+        positions = {pk: position for position, (pk, *_) in enumerate(accounts)}
+        flows = np.zeros((len(accounts), self.days), dtype=np.int64)
+        account, day, cents = self._occurrences(series, positions)
+        np.add.at(flows, (account, day - 1), cents)
+        current = np.array([round((balance or 0) * 100) for *_, balance in accounts], dtype=np.int64)
+        balances = current[:, None] + np.cumsum(flows, axis=1)
+
+        dates = [self.today + timedelta(days=offset) for offset in range(1, self.days + 1)]
+        names = {pk: name for pk, name, *_ in accounts}
+        return {
+            'start': dates[0],
+            'end': dates[-1],
+            'accounts': [
+                {
+                    'account': pk,
+                    'name': name,
+                    'currency': currency,
+                    'current_balance': float(balance or 0),
+                    'series': [
+                        {'date': day, 'balance': round(int(value) / 100, 2)}
+                        for day, value in zip(dates, balances[position])
+                    ],
+                }
+                for position, (pk, name, currency, balance) in enumerate(accounts)
+            ],
+            'recurring': [
+                {
+                    'account': item.account_id,
+                    'account_name': names[item.account_id],
+                    'category': item.category_id,
+                    'category_name': categories[item.category_id][0],
+                    'description': item.description,
+                    'frequency': item.frequency,
+                    'amount': float(item.amount),
+                    'interval_days': item.interval_days,
+                    'occurrences': item.occurrences,
+                    'last_date': item.last_date,
+                    'next_date': item.next_date,
+                }
+                for item in series
+            ],
+        }
@@ -0,0 +1,118 @@
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+from django.db import connection
+from django.db.models import F, Sum
+
+from apps.accounts.models import User
+from apps.transactions.models import Currency
+from .buckets import BucketAggregate
+from .currency import CurrencyConversion, MissingExchangeRate
+
+
+class SpendRanking:
+    """
+    Las N categorías, cuentas o etiquetas con más gasto en un rango, con su parte del
+    total, su posición y la posición que tenían en el periodo anterior de igual largo.
+
+    Todo sale de una consulta: la subconsulta agrupa el gasto por dimensión, moneda y día
+    (del resumen diario, o de las transacciones si se agrupa por etiqueta), la conversión
+    de moneda se aplica como en BucketAggregate y RANK() / SUM() OVER () calculan las
+    posiciones y el total antes de recortar a las N primeras.
+    """
+    DIMENSIONS = ('category', 'account', 'tag')
+
+    def __init__(self, user: User, dimension: str, start_date: date, end_date: date,
+                 limit: int = 10, currency: Optional[Currency] = None):
+        if dimension not in self.DIMENSIONS:
+            raise ValueError(f'Dimensión inválida: {dimension}')
+        self.user = user
+        self.dimension = dimension
+        self.start_date = start_date
+        self.end_date = end_date
+        self.limit = limit
+        self.currency = currency
+
+    @property
+    def previous_end(self) -> date:
+        return self.start_date - timedelta(days=1)
+
+    @property
+    def previous_start(self) -> date:
+        return self.start_date - (self.end_date - self.start_date) - timedelta(days=1)
+
+    def run(self) -> Dict[str, Any]:
+        engine = BucketAggregate(self.user, 'day', self.previous_start, self.end_date, [self.dimension],
+                                 metrics=['expense'], currency=self.currency)
+        base, _, amounts, date_path = engine.source()
+        dimensions = {f'dimension_{i}': path for i, path in enumerate(engine.columns.values())}
+        inner = base.annotate(
+            day=F(date_path),
+            currency=F('account__currency'),
+            **{alias: F(path) for alias, path in dimensions.items()},
+        ).values('day', 'currency', *dimensions).annotate(
+            value_expense=Sum(amounts['expense']),
+        ).order_by()
+        inner_sql, inner_params = inner.query.sql_with_params()
+        if self.currency:
+            join_sql, join_params = CurrencyConversion(self.currency).lateral_join('q.currency', 'q.day')
+        else:
+            join_sql, join_params = 'CROSS JOIN (SELECT 1 AS rate) fx', []
+
+        columns = ', '.join(dimensions)
+        qualified = ', '.join(f'q.{alias}' for alias in dimensions)
+        sql = f"""
+            WITH spend AS (
+                SELECT {qualified},
+                       SUM(q.value_expense * fx.rate) FILTER (WHERE q.day >= %s) AS spent,
+                       SUM(q.value_expense * fx.rate) FILTER (WHERE q.day < %s) AS previous_spent,
+                       COUNT(*) FILTER (WHERE fx.rate IS NULL AND q.value_expense <> 0) AS missing
+                FROM ({inner_sql}) q
+                {join_sql}
+                GROUP BY {qualified}
+            ), ranked AS (
+                SELECT spend.*,
+                       CASE WHEN spent > 0 THEN
+                           RANK() OVER (PARTITION BY spent > 0 ORDER BY spent DESC) END AS position,
+                       CASE WHEN previous_spent > 0 THEN
+                           RANK() OVER (PARTITION BY previous_spent > 0 ORDER BY previous_spent DESC)
+                       END AS previous_position,
+                       SUM(spent) OVER () AS total,
+                       SUM(missing) OVER () AS total_missing
+                FROM spend
+            )
+            SELECT {columns}, spent, previous_spent, position, previous_position, total, total_missing
+            FROM ranked
+            WHERE position <= %s OR total_missing > 0
+            ORDER BY position, {columns}
+        """
+        params = [self.start_date, self.start_date, *inner_params, *join_params, self.limit]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            records = cursor.fetchall()
+
+        names = list(engine.columns)
+        total = 0.0
+        results: List[Dict[str, Any]] = []
+        for record in records:
+            spent, previous_spent, position, previous_position, all_spent, missing = record[len(names):]
+            if missing:
+                raise MissingExchangeRate(f'Faltan cotizaciones hacia {self.currency.code} para algunos montos '
+                                          'o hay cuentas sin moneda asignada')
+            total = float(round(all_spent, 2))
+            results.append({
+                **dict(zip(names, record[:len(names)])),
+                'rank': position,
+                'previous_rank': previous_position,
+                # positivo: subió en el ranking; None si no gastó en el periodo anterior
+                'rank_change': previous_position - position if previous_position else None,
+                'spent': float(round(spent, 2)),
+                'previous_spent': float(round(previous_spent or 0, 2)),
+                'share': round(float(spent / all_spent), 4),
+            })
+        return {
+            'previous_start': self.previous_start,
+            'previous_end': self.previous_end,
+            'total': total,
+            'results': results,
+        }
@@ -0,0 +1,175 @@
+import re
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.analytics.models import RecurringSeries
+from apps.transactions.models import Transaction
+
+
+def add_months(days: np.ndarray, months) -> np.ndarray:
+    """
+    Suma meses calendario a fechas datetime64[D], manteniendo el día del mes o usando el
+    último día si el mes de destino es más corto (31 de enero + 1 = 28 o 29 de febrero)
+    """
+    month = days.astype('datetime64[M]')
+    day_of_month = (days - month.astype('datetime64[D]')).astype(np.int64)
+    target = month + months
+    start = target.astype('datetime64[D]')
+    length = ((target + 1).astype('datetime64[D]') - start).astype(np.int64)
+    return start + np.minimum(day_of_month, length - 1)
+
+
+def advance(last: np.ndarray, steps: np.ndarray, interval: np.ndarray, months: np.ndarray) -> np.ndarray:
+    """
+    Fecha de la aparición número `steps` después de `last`: `steps * months` meses
+    calendario después donde months > 0 y `steps * interval` días después en el resto
+    """
+    return np.where(months > 0, add_months(last, steps * months), last + steps * interval)
+
+
+class RecurringSeriesService:
+    """
+    Detecta las series recurrentes del historial de un usuario y las guarda en
+    RecurringSeries, reemplazando las detectadas antes. CashFlowForecast proyecta las
+    mismas series, detectadas al día de la proyección.
+
+    Una serie son transacciones de la misma cuenta y categoría, con la misma descripción
+    normalizada (minúsculas, sin números ni signos: "Netflix 03/25" y "NETFLIX 04/25"
+    coinciden) y montos que no difieren en más de AMOUNT_TOLERANCE del anterior, cuyos
+    intervalos caen todos en la banda de una de las FREQUENCIES. Las mensuales y anuales
+    avanzan por mes calendario (mismo día del mes, o el último si el mes es más corto),
+    así que su próxima fecha no se corre; las semanales, de a `interval_days` días.
+
+    Sin comparar filas de a pares: cuentas, categorías y descripciones se convierten en
+    códigos con un diccionario, un lexsort por (cuenta, categoría, descripción, monto)
+    deja contiguos los candidatos y corta los grupos donde el monto salta, y un segundo
+    lexsort por (grupo, día) da los intervalos, cuyo mínimo, máximo y promedio por grupo
+    salen de operaciones de NumPy.
+    """
+    AMOUNT_TOLERANCE = 0.1
+    # (frecuencia, intervalo mínimo, intervalo máximo, apariciones mínimas)
+    FREQUENCIES = (
+        (RecurringSeries.WEEKLY, 6, 8, 4),
+        (RecurringSeries.MONTHLY, 26, 35, 3),
+        (RecurringSeries.YEARLY, 355, 375, 2),
+    )
+    # meses calendario entre apariciones; las demás frecuencias avanzan en días
+    CALENDAR_MONTHS = {RecurringSeries.MONTHLY: 1, RecurringSeries.YEARLY: 12}
+    # las fechas van como días desde 1970-01-01 y los montos en centavos
+    HISTORY_SQL = """
+        SELECT t.account_id, t.category_id, (t.amount * 100)::bigint,
+               (t.date AT TIME ZONE %(tz)s)::date - DATE '1970-01-01', t.description
+        FROM {transaction} t
+        WHERE t.user_id = %(user)s AND (%(until)s IS NULL OR t.date < %(until)s)
+    """
+    EPOCH = date(1970, 1, 1)
+    _NOISE = re.compile(r'[\W\d_]+')
+
+    @staticmethod
+    def normalize(description: str) -> str:
+        return RecurringSeriesService._NOISE.sub(' ', description.lower()).strip()
+
+    @staticmethod
+    def _codes(values: Iterable) -> Tuple[np.ndarray, List]:
+        """
+        Un código entero por valor distinto y la lista de valores en orden de código
+        """
+        codes: Dict[Any, int] = {}
+        array = np.array([codes.setdefault(value, len(codes)) for value in values], dtype=np.int64)
+        return array, list(codes)
+
+    @staticmethod
+    def detect(user_id, today: Optional[date] = None) -> List[RecurringSeries]:
+        """
+        Las series recurrentes del usuario, sin guardar. Con `today` solo cuenta el
+        historial hasta ese día inclusive y descarta las series que dejaron de aparecer:
+        las que tienen la próxima aparición atrasada en más de un intervalo.
+        """
+        until = None
+        if today is not None:
+            until = datetime.combine(today + timedelta(days=1), time.min, tzinfo=timezone.get_default_timezone())
+        sql = RecurringSeriesService.HISTORY_SQL.format(transaction=Transaction._meta.db_table)
+        params = {'user': user_id, 'tz': timezone.get_default_timezone_name(), 'until': until}
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            records = cursor.fetchall()
+        if not records:
+            return []
+
+        accounts, account_ids = RecurringSeriesService._codes(record[0] for record in records)
+        categories, category_ids = RecurringSeriesService._codes(record[1] for record in records)
+        text, _ = RecurringSeriesService._codes(RecurringSeriesService.normalize(record[4]) for record in records)
+        cents, day = np.array([record[2:4] for record in records], dtype=np.int64).T
+        descriptions = [record[4] for record in records]
+
+        # grupos de candidatos: misma clave y montos contiguos dentro de la tolerancia
+        order = np.lexsort((cents, text, categories, accounts))
+        account, category, cents, day, text = (
+            column[order] for column in (accounts, categories, cents, day, text)
+        )
+        same_key = (account[1:] == account[:-1]) & (category[1:] == category[:-1]) & (text[1:] == text[:-1])
+        close = cents[1:] <= cents[:-1] * (1 + RecurringSeriesService.AMOUNT_TOLERANCE)
+        group = np.cumsum(np.r_[True, ~(same_key & close)]) - 1
+        groups = int(group[-1]) + 1
+
+        # intervalos entre apariciones consecutivas de cada grupo
+        by_day = np.lexsort((day, group))
+        group, day, cents, order = group[by_day], day[by_day], cents[by_day], order[by_day]
+        account, category = account[by_day], category[by_day]
+        same = group[1:] == group[:-1]
+        gaps, gap_group = np.diff(day)[same], group[1:][same]
+        count = np.bincount(group, minlength=groups)
+        min_gap = np.full(groups, np.iinfo(np.int64).max)
+        max_gap = np.zeros(groups, dtype=np.int64)
+        np.minimum.at(min_gap, gap_group, gaps)
+        np.maximum.at(max_gap, gap_group, gaps)
+        mean_gap = np.bincount(gap_group, weights=gaps, minlength=groups) / np.maximum(count - 1, 1)
+        mean_cents = np.bincount(group, weights=cents, minlength=groups) / count
+        first = np.flatnonzero(np.r_[True, ~same])
+        last = np.r_[first[1:] - 1, len(day) - 1]
+
+        series = []
+        for frequency, low, high, minimum in RecurringSeriesService.FREQUENCIES:
+            matched = np.flatnonzero((count >= minimum) & (min_gap >= low) & (max_gap <= high))
+            for position in matched:
+                interval = int(np.rint(mean_gap[position]))
+                last_day = np.datetime64(RecurringSeriesService.EPOCH, 'D') + day[last[position]]
+                months = RecurringSeriesService.CALENDAR_MONTHS.get(frequency, 0)
+                after_next = advance(np.array([last_day]), np.array([1, 2]), interval, months)
+                if today is not None and after_next[1] < np.datetime64(today, 'D'):
+                    continue
+                series.append(RecurringSeries(
+                    user_id=user_id,
+                    account_id=account_ids[account[first[position]]],
+                    category_id=category_ids[category[first[position]]],
+                    # la descripción original de la aparición más reciente
+                    description=descriptions[order[last[position]]],
+                    frequency=frequency,
+                    amount=Decimal(int(np.rint(mean_cents[position]))) / 100,
+                    interval_days=interval,
+                    occurrences=int(count[position]),
+                    first_date=RecurringSeriesService.EPOCH + timedelta(days=int(day[first[position]])),
+                    last_date=last_day.item(),
+                    next_date=after_next[0].item(),
+                ))
+        return series
+
+    @staticmethod
+    def refresh(user_ids: Iterable) -> int:
+        """
+        Vuelve a detectar las series de los usuarios y reemplaza las guardadas.
+        Devuelve la cantidad de series guardadas.
+        """
+        total = 0
+        for user_id in user_ids:
+            series = RecurringSeriesService.detect(user_id)
+            with transaction.atomic():
+                RecurringSeries.objects.filter(user_id=user_id).delete()
+                RecurringSeries.objects.bulk_create(series)
+            total += len(series)
+        return total
@@ -0,0 +1,104 @@
+from typing import Iterable, Optional
+
+from django.db import connection, transaction
+from django.db.models import F, QuerySet
+from django.utils import timezone
+
+from apps.analytics.models import TransactionRollup
+from apps.transactions.models import AccountBalance, Category, Transaction
+
+
+class RollupService:
+    """
+    Mantiene TransactionRollup: sumas de ingresos, egresos y cantidad de transacciones
+    por usuario, día o mes, cuenta y categoría.
+    Cada cambio se aplica con un único INSERT ... SELECT ... ON CONFLICT que agrupa las
+    transacciones afectadas y suma (o resta) su contribución a las filas del resumen.
+    Las filas mensuales son las que leen las series por mes, trimestre o año (y el saldo
+    de apertura) para los meses completos; las diarias, el resto (ver BucketAggregate).
+    """
+    UPSERT_SQL = """
+        INSERT INTO {rollup} AS r (user_id, granularity, period, account_id, category_id, income, expense, count)
+        SELECT t.user_id,
+               g.granularity,
+               date_trunc(g.unit, t.date AT TIME ZONE %s)::date,
+               t.account_id,
+               t.category_id,
+               %s * COALESCE(SUM(t.amount) FILTER (WHERE c.category_type = %s), 0),
+               %s * COALESCE(SUM(t.amount) FILTER (WHERE c.category_type = %s), 0),
+               %s * COUNT(*)
+        FROM {transaction} t
+        JOIN {category} c ON c.id = t.category_id
+        CROSS JOIN (VALUES (%s, 'day'), (%s, 'month')) AS g (granularity, unit)
+        WHERE t.id IN ({ids})
+        GROUP BY 1, 2, 3, 4, 5
+        ON CONFLICT (user_id, granularity, period, account_id, category_id) DO UPDATE SET
+            income = r.income + EXCLUDED.income,
+            expense = r.expense + EXCLUDED.expense,
+            count = r.count + EXCLUDED.count
+        RETURNING r.id, r.count
+    """
+
+    @staticmethod
+    def add(queryset: QuerySet[Transaction], sign: int = 1) -> None:
+        """
+        Suma (sign=1) o resta (sign=-1) la contribución de las transacciones de `queryset`.
+        Para restar debe llamarse antes de modificar o eliminar las filas; las filas del
+        resumen que quedan sin transacciones se eliminan.
+        """
+        ids_sql, ids_params = queryset.order_by().values('id').query.sql_with_params()
+        sql = RollupService.UPSERT_SQL.format(
+            rollup=TransactionRollup._meta.db_table,
+            transaction=Transaction._meta.db_table,
+            category=Category._meta.db_table,
+            ids=ids_sql,
+        )
+        income_type, expense_type = Category.TYPE_CHOICES[0][0], Category.TYPE_CHOICES[1][0]
+        params = [
+            timezone.get_default_timezone_name(),
+            sign, income_type,
+            sign, expense_type,
+            sign,
+            TransactionRollup.DAY, TransactionRollup.MONTH,
+            *ids_params,
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            empty = [pk for pk, count in cursor.fetchall() if count == 0]
+        if empty:
+            TransactionRollup.objects.filter(id__in=empty).delete()
+
+    @staticmethod
+    def subtract(queryset: QuerySet[Transaction]) -> None:
+        RollupService.add(queryset, sign=-1)
+
+    @staticmethod
+    def swap_category_type(category: Category) -> None:
+        """
+        Intercambia ingresos y egresos de una categoría cuyo tipo cambió
+        """
+        TransactionRollup.objects.filter(category=category).update(income=F('expense'), expense=F('income'))
+
+    @staticmethod
+    def rebuild(user_ids: Optional[Iterable] = None) -> int:
+        """
+        Recalcula desde cero el resumen de los usuarios indicados (por defecto todos)
+        en una sola transacción. Retorna la cantidad de filas del resumen resultantes.
+        """
+        rollups = TransactionRollup.objects.all()
+        transactions = Transaction.objects.all()
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            rollups = rollups.filter(user_id__in=user_ids)
+            transactions = transactions.filter(user_id__in=user_ids)
+
+        with transaction.atomic():
+            # Igual que al reconciliar saldos: las escrituras concurrentes esperan en el
+            # bloqueo del saldo de la cuenta y aplican su cambio sobre el resumen reconstruido
+            balances = AccountBalance.objects.all()
+            if user_ids is not None:
+                balances = balances.filter(account__user_id__in=user_ids)
+            list(balances.select_for_update().values_list('pk', flat=True))
+            rollups.delete()
+            RollupService.add(transactions)
+            return rollups.count()
@@ -0,0 +1,87 @@
+from typing import Any, Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.analytics.cache import DataVersion
+from apps.analytics.models import AnalyticsSnapshot
+from .aggregates import TimeSeriesAggregate
+
+
+class SnapshotService:
+    """
+    Analíticas del tablero precalculadas por usuario: resumen del mes actual, últimos
+    12 meses y gasto por categoría del mes.
+
+    Se guardan en la caché y en AnalyticsSnapshot bajo la versión de datos del usuario
+    leída antes de calcular: si los datos cambian mientras tanto, el snapshot queda con
+    una versión vieja y no se usa. La caché es la lectura rápida; la tabla sobrevive a
+    reinicios o desalojos de la caché.
+    """
+    CACHE_KEY = 'analytics:snapshot:{user_id}:{version}:{month}'
+
+    @staticmethod
+    def _cache_key(user_id, version: int, month) -> str:
+        return SnapshotService.CACHE_KEY.format(user_id=user_id, version=version, month=month.isoformat())
+
+    @staticmethod
+    def compute(user: User) -> Dict[str, Any]:
+        today = timezone.localdate()
+        # el mes actual está dentro de los últimos 12: con NumPy ambas series salen de una
+        # lectura, diaria solo para el mes actual
+        engine = TimeSeriesAggregate.engine(user, *TimeSeriesAggregate.last_months_range(today.year, today.month),
+                                            daily_from=today.replace(day=1))
+        return {
+            'summary': TimeSeriesAggregate.monthly_series(user, today.year, today.month, engine=engine),
+            'last_months': TimeSeriesAggregate.last_months(user, today.year, today.month, engine=engine),
+            'categories': TimeSeriesAggregate.category_breakdown(user, today.year, today.month),
+        }
+
+    @staticmethod
+    def store(user: User) -> Dict[str, Any]:
+        """
+        Calcula y guarda el snapshot del usuario
+        """
+        version = DataVersion.get(user.pk)
+        month = timezone.localdate().replace(day=1)
+        data = SnapshotService.compute(user)
+        AnalyticsSnapshot.objects.update_or_create(
+            user=user, defaults={'data_version': version, 'month': month, 'data': data}
+        )
+        cache.set(SnapshotService._cache_key(user.pk, version, month), data, settings.ANALYTICS_CACHE_TIMEOUT)
+        return data
+
+    @staticmethod
+    def refresh(user_ids: Iterable) -> int:
+        """
+        Recalcula los snapshots de los usuarios. Devuelve la cantidad calculada.
+        """
+        total = 0
+        for user in User.objects.filter(id__in=list(user_ids)):
+            SnapshotService.store(user)
+            total += 1
+        return total
+
+    @staticmethod
+    def get(user: User) -> Optional[Dict[str, Any]]:
+        """
+        El snapshot vigente del usuario (de la caché o, si no está, de la tabla), o None
+        si no hay uno de la versión de datos y el mes actuales
+        """
+        version = DataVersion.get(user.pk)
+        month = timezone.localdate().replace(day=1)
+        key = SnapshotService._cache_key(user.pk, version, month)
+        data = cache.get(key)
+        if data is None:
+            data = AnalyticsSnapshot.objects.filter(user=user, data_version=version, month=month) \
+                .values_list('data', flat=True).first()
+            if data is not None:
+                cache.set(key, data, settings.ANALYTICS_CACHE_TIMEOUT)
+        return data
+
+    @staticmethod
+    def get_or_store(user: User) -> Dict[str, Any]:
+        data = SnapshotService.get(user)
+        return SnapshotService.store(user) if data is None else data
@@ -0,0 +1,204 @@
+from datetime import date, timedelta
+from functools import cached_property
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.db import connection
+from django.db.models import BigIntegerField, F, Q, Sum
+from django.db.models.functions import Cast
+
+from apps.accounts.models import User
+from apps.analytics.models import TransactionRollup
+from apps.transactions.models import Account, Category
+from .buckets import BucketAggregate
+
+
+class VectorizedSeries:
+    """
+    Backend vectorizado de series temporales (ANALYTICS_BACKEND = 'numpy').
+
+    Lee una sola vez las filas del resumen del rango (día, ingreso y egreso en
+    centavos, cantidad, categoría y cuenta) en arreglos de NumPy tipados, y de ahí
+    calcula cualquier cantidad de series del mismo rango sin volver a la base: cada
+    fila cae en su periodo con searchsorted sobre los inicios de periodo de
+    BucketAggregate.periods() y los totales salen de bincount (por periodo o por periodo
+    y dimensión) y cumsum. Los resultados tienen el mismo formato que BucketAggregate.run().
+
+    Los meses completos anteriores a `daily_from` llegan como una fila mensual cada uno
+    (con el día de inicio del mes) y sirven para series por mes, trimestre o año; el
+    resto, como filas diarias. Por defecto todo el rango es diario.
+
+    No convierte monedas: con `currency` TimeSeriesAggregate usa siempre el ORM.
+    `window` da una vista de un subrango sobre los mismos arreglos, para que varias
+    series de una petición (el mes y los últimos 12 meses) compartan una sola lectura.
+    """
+    DIMENSIONS = ('category', 'account')
+    # categoría y cuenta llegan como códigos densos (orden por id) unidos por hash contra
+    # las pocas filas del usuario, sin ordenar las filas del resumen
+    ARRAYS_SQL = """
+        WITH categories AS (
+            SELECT id, ROW_NUMBER() OVER (ORDER BY id) - 1 AS code FROM {category} WHERE user_id = %(user)s
+        ), accounts AS (
+            SELECT id, ROW_NUMBER() OVER (ORDER BY id) - 1 AS code FROM {account} WHERE user_id = %(user)s
+        )
+        SELECT r.period - %(start)s::date, (r.income * 100)::bigint, (r.expense * 100)::bigint, r.count,
+               c.code, a.code
+        FROM {rollup} r
+        JOIN categories c ON c.id = r.category_id
+        JOIN accounts a ON a.id = r.account_id
+        WHERE r.user_id = %(user)s AND (
+            (r.granularity = %(month)s AND r.period >= %(months_start)s AND r.period < %(months_end)s)
+            OR (r.granularity = %(day)s AND r.period >= %(start)s AND r.period <= %(end)s
+                AND (r.period < %(months_start)s OR r.period >= %(months_end)s))
+        )
+    """
+
+    def __init__(self, user: User, start_date: date, end_date: date, daily_from: Optional[date] = None):
+        self.user = user
+        self.start_date = start_date
+        self.end_date = end_date
+        # meses leídos de las filas mensuales: [inicio, fin)
+        months_start, months_end = BucketAggregate.full_months(start_date, end_date)
+        months_end = min(months_end, BucketAggregate.truncate(daily_from or start_date, 'month'))
+        self._months: Tuple[date, date] = (months_start, max(months_start, months_end))
+        self._buckets: Dict[Tuple[str, Optional[date]], Tuple[List[date], np.ndarray]] = {}
+        self._labels: Dict[str, List[Any]] = {}
+        # (serie que contiene a esta ventana, día de inicio de la ventana en ella)
+        self._parent: Optional[Tuple['VectorizedSeries', int]] = None
+
+    @cached_property
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Las columnas del rango como enteros: día (desde `start_date`), centavos, cantidad y
+        categoría y cuenta como códigos (ver `labels`). Todo llega como enteros de la base
+        para armar los arreglos de una vez, sin convertir fila por fila.
+        """
+        sql = self.ARRAYS_SQL.format(
+            category=Category._meta.db_table,
+            account=Account._meta.db_table,
+            rollup=TransactionRollup._meta.db_table,
+        )
+        params = {'user': self.user.pk, 'day': TransactionRollup.DAY, 'month': TransactionRollup.MONTH,
+                  'start': self.start_date, 'end': self.end_date,
+                  'months_start': self._months[0], 'months_end': self._months[1]}
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            table = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 6)
+
+        arrays = dict(zip(('day', 'income', 'expense', 'count', 'category', 'account'), table.T))
+        arrays['net'] = arrays['income'] - arrays['expense']
+        return arrays
+
+    def labels(self, dimension: str) -> List[Any]:
+        """
+        Id de cada código de la dimensión (el código es la posición)
+        """
+        if dimension not in self._labels:
+            model = {'category': Category, 'account': Account}[dimension]
+            self._labels[dimension] = list(
+                model.objects.filter(user=self.user).order_by('id').values_list('id', flat=True)
+            )
+        return self._labels[dimension]
+
+    def window(self, start_date: date, end_date: date) -> 'VectorizedSeries':
+        """
+        Las filas de [start_date, end_date], que debe estar dentro del rango, sin volver
+        a leer: la ventana filtra los arreglos ya leídos y comparte los ids de las dimensiones
+        """
+        if start_date < self.start_date or end_date > self.end_date:
+            raise ValueError('La ventana debe estar dentro del rango de la serie')
+        if self._splits_month(start_date) or self._splits_month(end_date + timedelta(days=1)):
+            raise ValueError('La ventana no puede cortar un mes leído de las filas mensuales')
+        if (start_date, end_date) == (self.start_date, self.end_date):
+            return self
+        offset = (start_date - self.start_date).days
+        day = self.arrays['day']
+        keep = (day >= offset) & (day <= (end_date - self.start_date).days)
+
+        window = VectorizedSeries(self.user, start_date, end_date)
+        arrays = {name: values[keep] for name, values in self.arrays.items()}
+        arrays['day'] = arrays['day'] - offset
+        window.__dict__['arrays'] = arrays
+        window._labels = self._labels
+        months_start = max(self._months[0], start_date)
+        window._months = (months_start, max(months_start, min(self._months[1], end_date + timedelta(days=1))))
+        window._parent = (self, offset)
+        return window
+
+    @cached_property
+    def opening_balance(self) -> int:
+        """
+        Saldo en centavos de todo lo anterior a `start_date` (una consulta, solo si se pide;
+        una ventana lo deriva del saldo de apertura de su serie)
+        """
+        if self._parent is not None:
+            parent, offset = self._parent
+            before = parent.arrays['day'] < offset
+            return parent.opening_balance + int(parent.arrays['net'][before].sum())
+        month_start = BucketAggregate.truncate(self.start_date, 'month')
+        total = TransactionRollup.objects.filter(
+            Q(granularity=TransactionRollup.MONTH, period__lt=month_start)
+            | Q(granularity=TransactionRollup.DAY, period__gte=month_start, period__lt=self.start_date),
+            user=self.user,
+        ).aggregate(
+            net=Sum(Cast((F('income') - F('expense')) * 100, BigIntegerField()))
+        )['net']
+        return total or 0
+
+    def _splits_month(self, day: date) -> bool:
+        """
+        Si `day` cae después del primer día de un mes leído de las filas mensuales
+        """
+        months_start, months_end = self._months
+        return months_start < day < months_end and day.day != 1
+
+    def buckets(self, granularity: str, week_origin: Optional[date] = None) -> Tuple[List[date], np.ndarray]:
+        """
+        Inicio de cada periodo del rango y el índice de periodo de cada fila
+        """
+        key = (granularity, week_origin)
+        if granularity in ('day', 'week') and self._months[0] < self._months[1]:
+            raise ValueError('Las series por día o semana necesitan filas diarias en todo el rango')
+        if key not in self._buckets:
+            periods = BucketAggregate(self.user, granularity, self.start_date, self.end_date,
+                                      week_origin=week_origin).periods()
+            starts = np.array([(period - self.start_date).days for period in periods], dtype=np.int64)
+            self._buckets[key] = periods, np.searchsorted(starts, self.arrays['day'], side='right') - 1
+        return self._buckets[key]
+
+    def totals(self, granularity: str, metric: str, dimension: Optional[str] = None,
+               week_origin: Optional[date] = None) -> np.ndarray:
+        """
+        Suma de la métrica (en centavos, o cantidad) por periodo; con `dimension`, una
+        matriz periodo x código de la dimensión (ver `labels`)
+        """
+        periods, index = self.buckets(granularity, week_origin)
+        weights = self.arrays[metric]
+        # bincount suma en float64, exacto para enteros por debajo de 2**53 centavos
+        if dimension is None:
+            return np.rint(np.bincount(index, weights=weights, minlength=len(periods))).astype(np.int64)
+        groups = len(self.labels(dimension))
+        combined = index * groups + self.arrays[dimension]
+        flat = np.bincount(combined, weights=weights, minlength=len(periods) * groups)
+        return np.rint(flat).astype(np.int64).reshape(len(periods), groups)
+
+    def series(self, granularity: str, metrics: Sequence[str] = BucketAggregate.METRICS,
+               week_origin: Optional[date] = None, cumulative: bool = False) -> List[Dict[str, Any]]:
+        """
+        Lo mismo que BucketAggregate(...).run() sin dimensiones ni moneda; con `cumulative`
+        agrega `cumulative_net` partiendo del saldo de apertura
+        """
+        periods, _ = self.buckets(granularity, week_origin)
+        columns = {name: self.totals(granularity, name, week_origin=week_origin) for name in metrics}
+        if cumulative:
+            net = columns['net'] if 'net' in columns else self.totals(granularity, 'net', week_origin=week_origin)
+            columns['cumulative_net'] = self.opening_balance + np.cumsum(net)
+
+        rows = []
+        for position, period in enumerate(periods):
+            row = {'period': period}
+            for name, values in columns.items():
+                value = int(values[position])
+                row[name] = value if name == 'count' else round(value / 100, 2)
+            rows.append(row)
+        return rows
@@ -1,3 +1,691 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.accounts.models import User
+from apps.transactions.models import Account, Category, Currency, ExchangeRate, Transaction
+from apps.transactions.services import AccountService, CategoryService, TransactionService
+from .models import AnalyticsSnapshot, RecurringSeries, TransactionRollup
+from .services.aggregates import TimeSeriesAggregate
+from .services.buckets import BucketAggregate
+from .services.forecast import CashFlowForecast
+from .services.recurring import RecurringSeriesService, add_months
+from .services.rollups import RollupService
+from .services.snapshots import SnapshotService
+from .services.vectorized import VectorizedSeries
+
+
+class AnalyticsTestCase(TestCase):
+    """
+    Usuario con dos cuentas, una categoría de ingreso y una de egreso, compartido por
+    las pruebas de cada clase
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='rollups@example.com', password='secret')
+        cls.account = AccountService.create_account(cls.user, {'name': 'Banco'})
+        cls.other_account = AccountService.create_account(cls.user, {'name': 'Caja'})
+        cls.income = Category.objects.create(user=cls.user, name='Sueldo', category_type='INGRESO')
+        cls.expense = Category.objects.create(user=cls.user, name='Comida', category_type='EGRESO')
+
+    def setUp(self):
+        # el usuario se comparte entre pruebas y la versión de datos solo cambia al confirmar
+        cache.clear()
+
+    def _create(self, amount: str, day: int, category=None, month: int = 3):
+        return TransactionService.create_transaction(self.user, {
+            'account': self.account,
+            'category': category or self.income,
+            'amount': Decimal(amount),
+            'date': datetime(2025, month, day, 12, tzinfo=dt_timezone.utc),
+        })
+
+
+class TransactionRollupTests(AnalyticsTestCase):
+    """
+    El resumen mantenido de forma incremental coincide con el reconstruido desde cero
+    y las series temporales se calculan solo con sus filas.
+    """
+
+    def _snapshot(self):
+        return sorted(
+            TransactionRollup.objects.values_list(
+                'granularity', 'period', 'account_id', 'category_id', 'income', 'expense', 'count'
+            )
+        )
+
+    def assertMatchesRebuild(self):
+        incremental = self._snapshot()
+        RollupService.rebuild()
+        self.assertEqual(incremental, self._snapshot())
+        # las filas mensuales suman lo mismo que las diarias de su mes: las series leen unas u otras
+        totals = {TransactionRollup.DAY: {}, TransactionRollup.MONTH: {}}
+        for granularity, period, account, category, income, expense, count in incremental:
+            key = (period.replace(day=1), account, category)
+            previous = totals[granularity].get(key, (0, 0, 0))
+            totals[granularity][key] = (previous[0] + income, previous[1] + expense, previous[2] + count)
+        self.assertEqual(totals[TransactionRollup.DAY], totals[TransactionRollup.MONTH])
+
+    def test_single_writes_match_rebuild(self):
+        salary = self._create('1000.00', 1)
+        food = self._create('30.00', 1, self.expense)
+        self._create('20.00', 15, self.expense)
+        self.assertMatchesRebuild()
+
+        TransactionService.update_transaction(food, {'amount': Decimal('45.00'), 'account': self.other_account})
+        TransactionService.update_transaction(salary, {'date': datetime(2025, 4, 2, tzinfo=dt_timezone.utc)})
+        self.assertMatchesRebuild()
+
+        TransactionService.delete_transaction(food)
+        self.assertMatchesRebuild()
+        self.assertFalse(TransactionRollup.objects.filter(account=self.other_account).exists())
+
+    def test_bulk_writes_match_rebuild(self):
+        TransactionService.bulk_create_transactions(self.user, [
+            {'account': self.account.id, 'category': self.expense.id, 'amount': Decimal('5.00'),
+             'date': datetime(2025, 3, day % 28 + 1, tzinfo=dt_timezone.utc)}
+            for day in range(100)
+        ])
+        self.assertMatchesRebuild()
+
+        selected = Transaction.objects.filter(user=self.user, date__day__lte=10)
+        TransactionService.bulk_update_transactions(selected, {'account': self.other_account})
+        self.assertMatchesRebuild()
+
+        TransactionService.bulk_delete_transactions(Transaction.objects.filter(user=self.user, date__day__gt=20))
+        self.assertMatchesRebuild()
+
+    def test_category_type_change_swaps_rollup(self):
+        self._create('50.00', 3)
+        CategoryService.update_category(self.income, {'category_type': 'EGRESO'})
+        self.assertMatchesRebuild()
+        self.assertEqual(TimeSeriesAggregate.monthly_series(self.user, 2025, 3)['egresos'], 50.0)
+
+    def test_monthly_series_reads_rollup(self):
+        self._create('1000.00', 1)
+        self._create('30.00', 1, self.expense)
+        self._create('20.00', 15, self.expense)
+        self._create('999.00', 1, month=4)
+
+        # serie diaria y totales del mes en una sola consulta sobre el resumen
+        with self.assertNumQueries(1):
+            summary = TimeSeriesAggregate.monthly_series(self.user, 2025, 3)
+        self.assertEqual(summary['ingresos'], 1000.0)
+        self.assertEqual(summary['egresos'], 50.0)
+        self.assertEqual(summary['balance'], 950.0)
+        self.assertEqual(len(summary['daily_series']), 31)
+        self.assertEqual(summary['daily_series'][0]['balance'], 970.0)
+        self.assertEqual(summary['daily_series'][14]['balance'], -20.0)
+
+    def test_monthly_summary_endpoint(self):
+        self._create('1000.00', 1)
+        self._create('30.00', 2, self.expense)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get('/api/analytics/monthly-summary/', {'year': 2025, 'month': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['incomes'], 1000.0)
+        self.assertEqual(response.data['expenses'], 30.0)
+        self.assertEqual(response.data['balance'], 970.0)
+        self.assertEqual(len(response.data['daily_series']), 31)
+
+        response = client.get('/api/analytics/monthly-summary/', {'year': 2025, 'month': 13})
+        self.assertEqual(response.status_code, 400)
+
+    def test_weekly_series_is_one_grouped_query(self):
+        self._create('100.00', 3)
+        self._create('10.00', 9, self.expense)
+        self._create('7.00', 25, self.expense)
+
+        for weeks in (4, 260):
+            with self.assertNumQueries(1):
+                series = TimeSeriesAggregate.weekly_series(self.user, date(2025, 3, 3), weeks)
+            self.assertEqual(len(series), weeks)
+        self.assertEqual(series[0]['balance'], 90.0)
+        self.assertEqual(series[0]['week_end'], date(2025, 3, 9))
+        self.assertEqual(series[1]['balance'], 0.0)
+        self.assertEqual(series[3]['balance'], -7.0)
+
+    def test_series_endpoint_is_one_query_per_call(self):
+        self._create('1000.00', 1)
+        self._create('30.00', 2, self.expense)
+        self._create('20.00', 1, self.expense, month=5)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        params = {'granularity': 'quarter', 'start': '2025-01-01', 'end': '2025-12-31'}
+
+        with self.assertNumQueries(1):
+            response = client.get('/api/analytics/series/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['period'] for row in response.data['results']],
+                         [date(2025, 1, 1), date(2025, 4, 1), date(2025, 7, 1), date(2025, 10, 1)])
+        self.assertEqual(response.data['results'][0]['net'], 970.0)
+        self.assertEqual(response.data['results'][1]['count'], 1)
+
+        response = client.get('/api/analytics/series/', {**params, 'group_by': 'category_type',
+                                                          'metrics': 'expense'})
+        self.assertEqual(
+            [(row['category_type'], row['expense']) for row in response.data['results']],
+            [('EGRESO', 30.0), ('INGRESO', 0.0), ('EGRESO', 20.0)]
+        )
+
+        response = client.get('/api/analytics/series/', {**params, 'group_by': 'tag'})
+        self.assertEqual(response.data['results'][0]['tag'], None)
+        self.assertEqual(response.data['results'][0]['count'], 2)
+
+        response = client.get('/api/analytics/series/', {**params, 'group_by': 'colour'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_series_cumulative_and_rolling_windows(self):
+        self._create('100.00', 10, month=1)
+        self._create('30.00', 3, self.expense, month=2)
+        self._create('20.00', 1, self.expense)
+        self._create('50.00', 5)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with self.assertNumQueries(1):
+            response = client.get('/api/analytics/series/', {
+                'start': '2025-02-01', 'end': '2025-04-30', 'metrics': 'net',
+                'cumulative': 'true', 'rolling': 2,
+            })
+        self.assertEqual(response.status_code, 200)
+        # el acumulado parte del saldo de enero y la media móvil de febrero lo incluye
+        self.assertEqual(
+            [(row['period'], row['net'], row['cumulative_net'], row['rolling_net'])
+             for row in response.data['results']],
+            [(date(2025, 2, 1), -30.0, 70.0, 35.0),
+             (date(2025, 3, 1), 30.0, 100.0, 0.0),
+             (date(2025, 4, 1), 0.0, 100.0, 15.0)]
+        )
+
+        rows = BucketAggregate(self.user, 'day', date(2025, 3, 1), date(2025, 3, 5), ['category'],
+                               metrics=['expense'], cumulative=True).run()
+        self.assertEqual([(row['category_name'], row['cumulative_net']) for row in rows],
+                         [('Comida', -50.0), ('Sueldo', 150.0)])
+
+    def test_numpy_backend_matches_orm(self):
+        self._create('1000.00', 1)
+        self._create('30.10', 1, self.expense)
+        self._create('20.05', 15, self.expense)
+        self._create('999.00', 2, month=4)
+
+        def series():
+            return (
+                TimeSeriesAggregate.daily_series(self.user, date(2025, 2, 20), date(2025, 4, 10)),
+                TimeSeriesAggregate.weekly_series(self.user, date(2025, 2, 27), 8),
+                TimeSeriesAggregate.monthly_series(self.user, 2025, 3),
+            )
+
+        expected = series()
+        with override_settings(ANALYTICS_BACKEND='numpy'):
+            self.assertEqual(series(), expected)
+
+        # una sola lectura alimenta todas las series derivadas (más el saldo de apertura
+        # y los ids de las categorías)
+        engine = VectorizedSeries(self.user, date(2025, 3, 1), date(2025, 4, 30))
+        with self.assertNumQueries(3):
+            months = engine.series('month', cumulative=True)
+            by_category = engine.totals('day', 'expense', dimension='category')
+            weeks = engine.series('week', ['net'])
+        self.assertEqual([row['cumulative_net'] for row in months], [949.85, 1948.85])
+        self.assertEqual(by_category.sum(), 5015)
+        self.assertEqual(sum(row['net'] for row in weeks), 1948.85)
+
+        # una ventana del rango reutiliza la lectura y da lo mismo que una serie propia
+        window = engine.window(date(2025, 4, 1), date(2025, 4, 30))
+        with self.assertNumQueries(0):
+            days = window.series('day', cumulative=True)
+        self.assertEqual(days, VectorizedSeries(self.user, date(2025, 4, 1), date(2025, 4, 30))
+                         .series('day', cumulative=True))
+        with self.assertRaises(ValueError):
+            engine.window(date(2025, 2, 1), date(2025, 3, 31))
+
+    def test_month_series_read_monthly_rollup_rows(self):
+        self._create('1000.00', 20, month=1)
+        self._create('30.00', 5, self.expense, month=2)
+        self._create('20.00', 10, self.expense)
+        self._create('50.00', 25)
+        self._create('70.00', 2, month=4)
+
+        def series():
+            return (
+                *(TimeSeriesAggregate._rows(self.user, granularity, date(2025, 1, 15), date(2025, 4, 10),
+                                            ['income', 'expense', 'count']) for granularity in ('month', 'quarter')),
+                TimeSeriesAggregate.last_months(self.user, 2025, 4, months=3),
+            )
+
+        expected = series()
+        cumulative = BucketAggregate(self.user, 'month', date(2025, 2, 1), date(2025, 4, 30), metrics=['net'],
+                                     cumulative=True).run()
+        # sin las filas diarias de los meses completos las series dan lo mismo: solo los
+        # meses parciales de los extremos se leen por día
+        TransactionRollup.objects.filter(granularity=TransactionRollup.DAY,
+                                         period__range=(date(2025, 2, 1), date(2025, 3, 31))).delete()
+        self.assertEqual(series(), expected)
+        self.assertEqual(BucketAggregate(self.user, 'month', date(2025, 2, 1), date(2025, 4, 30), metrics=['net'],
+                                         cumulative=True).run(), cumulative)
+        with override_settings(ANALYTICS_BACKEND='numpy'):
+            self.assertEqual(series(), expected)
+
+        engine = VectorizedSeries(self.user, date(2025, 1, 1), date(2025, 4, 30), daily_from=date(2025, 4, 1))
+        self.assertEqual([row['cumulative_net'] for row in engine.series('month', ['net'], cumulative=True)],
+                         [1000.0, *(row['cumulative_net'] for row in cumulative)])
+        self.assertEqual(sum(row['income'] for row in engine.window(date(2025, 4, 1), date(2025, 4, 30))
+                             .series('day', ['income'])), 70.0)
+        with self.assertRaises(ValueError):
+            engine.series('week')
+        with self.assertRaises(ValueError):
+            engine.window(date(2025, 2, 10), date(2025, 4, 30))
+
+    def test_snapshot_series_share_one_numpy_read(self):
+        for category, amount, days_ago in ((self.expense, '45.00', 0), (self.income, '1000.00', 40)):
+            TransactionService.create_transaction(self.user, {
+                'account': self.account, 'category': category, 'amount': Decimal(amount),
+                'date': timezone.now() - timedelta(days=days_ago),
+            })
+        expected = SnapshotService.compute(self.user)
+        with override_settings(ANALYTICS_BACKEND='numpy'):
+            # los arreglos del último año (el mes y los 12 meses) y el gasto por categoría
+            with self.assertNumQueries(2):
+                self.assertEqual(SnapshotService.compute(self.user), expected)
+
+    def test_unknown_backend_is_rejected(self):
+        with override_settings(ANALYTICS_BACKEND='pandas'):
+            with self.assertRaises(ImproperlyConfigured):
+                TimeSeriesAggregate.monthly_series(self.user, 2025, 3)
+
+    def test_top_spend_ranks_against_previous_period(self):
+        leisure = Category.objects.create(user=self.user, name='Ocio', category_type='EGRESO')
+        self._create('50.00', 5, self.expense)
+        self._create('30.00', 6, leisure)
+        self._create('100.00', 20, leisure)
+        self._create('10.00', 21, self.expense)
+        self._create('999.00', 20)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with self.assertNumQueries(1):
+            response = client.get('/api/analytics/top-spend/', {'start': '2025-03-16', 'end': '2025-03-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['previous_start'], date(2025, 2, 28))
+        self.assertEqual(response.data['total'], 110.0)
+        self.assertEqual(
+            [(row['category_name'], row['rank'], row['rank_change'], row['share'])
+             for row in response.data['results']],
+            [('Ocio', 1, 1, 0.9091), ('Comida', 2, -1, 0.0909)]
+        )
+
+        response = client.get('/api/analytics/top-spend/', {'by': 'account', 'start': '2025-03-16',
+                                                             'end': '2025-03-31', 'limit': 1})
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['previous_spent'], 80.0)
+
+    def test_cached_responses_follow_data_version(self):
+        self._create('1000.00', 1)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        params = {'year': 2025, 'month': 3}
+
+        client.get('/api/analytics/monthly-summary/', params)
+        with self.assertNumQueries(0):
+            response = client.get('/api/analytics/monthly-summary/', params)
+        self.assertEqual(response.json()['incomes'], 1000.0)
+
+        # cualquier escritura del usuario invalida sus respuestas cacheadas
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create('30.00', 2, self.expense)
+        response = client.get('/api/analytics/monthly-summary/', params)
+        self.assertEqual(response.json()['expenses'], 30.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CategoryService.update_category(self.expense, {'category_type': 'INGRESO'})
+        response = client.get('/api/analytics/monthly-summary/', params)
+        self.assertEqual(response.json()['incomes'], 1030.0)
+
+
+class CashFlowForecastTests(AnalyticsTestCase):
+    """
+    Proyección de saldos a partir de los movimientos recurrentes
+    """
+
+    def test_forecast_projects_recurring_movements(self):
+        rent = Category.objects.create(user=self.user, name='Alquiler', category_type='EGRESO')
+        for month in range(1, 6):
+            self._create('1000.00', 1, month=month)
+            self._create('400.00', 5, rent, month=month)
+        # gastos sueltos o de monto variable no son recurrentes
+        self._create('25.00', 3, self.expense, month=4)
+        self._create('40.00', 17, self.expense, month=4)
+        self._create('60.00', 2, self.expense, month=5)
+
+        with self.assertNumQueries(3):
+            forecast = CashFlowForecast(self.user, 60, today=date(2025, 5, 10)).run()
+        self.assertEqual(
+            sorted((row['category_name'], row['amount'], row['interval_days'], row['next_date'])
+                   for row in forecast['recurring']),
+            [('Alquiler', -400.0, 30, date(2025, 6, 5)), ('Sueldo', 1000.0, 30, date(2025, 6, 1))]
+        )
+        series = {row['account']: row for row in forecast['accounts']}[self.account.id]
+        balances = {point['date']: point['balance'] for point in series['series']}
+        self.assertEqual(series['current_balance'], 2875.0)
+        # la serie sigue vigente hasta que su próxima aparición se atrasa más de un intervalo
+        self.assertEqual(len(CashFlowForecast(self.user, 60, today=date(2025, 7, 1)).run()['recurring']), 2)
+        self.assertEqual(CashFlowForecast(self.user, 60, today=date(2025, 7, 10)).run()['recurring'], [])
+        # los movimientos mensuales caen el mismo día de cada mes
+        self.assertEqual(balances[date(2025, 5, 31)], 2875.0)
+        self.assertEqual(balances[date(2025, 6, 1)], 3875.0)
+        self.assertEqual(balances[date(2025, 6, 4)], 3875.0)
+        self.assertEqual(balances[date(2025, 6, 5)], 3475.0)
+        self.assertEqual(balances[date(2025, 7, 1)], 4475.0)
+        self.assertEqual(balances[date(2025, 7, 9)], 4075.0)
+        # fin de mes: el 31 pasa al último día de los meses más cortos
+        self.assertEqual(
+            add_months(np.array(['2025-01-31', '2024-01-31'], dtype='datetime64[D]'), 1).tolist(),
+            [date(2025, 2, 28), date(2024, 2, 29)]
+        )
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        client.get('/api/analytics/forecast/', {'days': 30})
+        with self.assertNumQueries(0):
+            response = client.get('/api/analytics/forecast/', {'days': 30})
+        self.assertEqual(len(response.json()['accounts'][0]['series']), 30)
+        self.assertEqual(client.get('/api/analytics/forecast/', {'days': 0}).status_code, 400)
+
+
+class RecurringSeriesTests(AnalyticsTestCase):
+    """
+    Detección por lotes de series recurrentes
+    """
+
+    def test_recurring_series_detection(self):
+        def create(description, amount, day, category=self.expense):
+            TransactionService.create_transaction(self.user, {
+                'account': self.account, 'category': category, 'description': description,
+                'amount': Decimal(amount), 'date': datetime.combine(day, datetime.min.time(), dt_timezone.utc),
+            })
+
+        for month, amount in enumerate(['15.99', '15.99', '16.49', '16.49'], start=1):
+            create(f'NETFLIX {month:02}/25', amount, date(2025, month, 3))
+        for week, amount in enumerate(['52.10', '48.90', '50.00', '51.30', '49.75']):
+            create('Supermercado', amount, date(2025, 3, 1) + (date(2025, 3, 8) - date(2025, 3, 1)) * week)
+        # mismo texto pero montos muy distintos o sin periodicidad: no son series
+        create('Supermercado', '400.00', date(2025, 4, 20))
+        create('Regalo', '80.00', date(2025, 2, 14))
+        create('Regalo', '80.00', date(2025, 3, 1))
+        create('Regalo', '80.00', date(2025, 5, 30))
+
+        call_command('detect_recurring', workers=1, stdout=StringIO())
+        series = {row.frequency: row for row in RecurringSeries.objects.filter(user=self.user)}
+        self.assertEqual(set(series), {RecurringSeries.MONTHLY, RecurringSeries.WEEKLY})
+        monthly = series[RecurringSeries.MONTHLY]
+        self.assertEqual((monthly.description, monthly.amount, monthly.occurrences, monthly.next_date),
+                         ('NETFLIX 04/25', Decimal('16.24'), 4, date(2025, 5, 3)))
+        self.assertEqual((series[RecurringSeries.WEEKLY].occurrences, series[RecurringSeries.WEEKLY].interval_days),
+                         (5, 7))
+
+        # volver a detectar reemplaza las series guardadas
+        self.assertEqual(RecurringSeriesService.refresh([self.user.id]), 2)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/recurring-series/', {'frequency': 'MONTHLY'})
+        self.assertEqual([row['category_name'] for row in response.data], ['Comida'])
+        response = client.get('/api/recurring-series/', {'account': str(self.account.id)})
+        self.assertEqual(len(response.data), 2)
+        for params in ({'account': 'abc'}, {'frequency': 'DAILY'}):
+            self.assertEqual(client.get('/api/recurring-series/', params).status_code, 400)
+
+
+class AnalyticsSnapshotTests(AnalyticsTestCase):
+    """
+    Snapshots precalculados del tablero
+    """
+
+    def test_precomputed_snapshot_follows_data_version(self):
+        today = timezone.localdate()
+        TransactionService.create_transaction(self.user, {
+            'account': self.account, 'category': self.expense, 'amount': Decimal('45.00'), 'date': timezone.now(),
+        })
+        output = StringIO()
+        call_command('precompute_analytics', workers=1, stdout=output)
+        self.assertIn('usuarios/s', output.getvalue())
+        snapshot = AnalyticsSnapshot.objects.get(user=self.user)
+        self.assertEqual(snapshot.month, today.replace(day=1))
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.assertNumQueries(0):
+            response = client.get('/api/analytics/overview/')
+        self.assertEqual(response.data['summary']['expenses'], 45.0)
+        self.assertEqual(len(response.data['last_months']), 12)
+        self.assertEqual([row['category_name'] for row in response.data['categories']], ['Comida'])
+
+        # sin la entrada de la caché se lee de la tabla
+        cache.delete(SnapshotService._cache_key(self.user.pk, snapshot.data_version, snapshot.month))
+        with self.assertNumQueries(1):
+            response = client.get('/api/analytics/overview/')
+        self.assertEqual(response.data['summary']['expenses'], 45.0)
+
+        # con datos nuevos el snapshot deja de valer y se recalcula
+        with self.captureOnCommitCallbacks(execute=True):
+            TransactionService.create_transaction(self.user, {
+                'account': self.account, 'category': self.expense, 'amount': Decimal('5.00'),
+                'date': timezone.now(),
+            })
+        self.assertIsNone(SnapshotService.get(self.user))
+        self.assertEqual(client.get('/api/analytics/overview/').data['summary']['expenses'], 50.0)
+
+
+class AmountDistributionTests(AnalyticsTestCase):
+    """
+    Percentiles e histograma de montos por periodo y categoría
+    """
+
+    def test_amount_distribution_is_one_grouped_query(self):
+        for amount, day in (('5.00', 2), ('20.00', 3), ('60.00', 4), ('100.00', 5), ('1000.00', 6)):
+            self._create(amount, day, self.expense)
+        self._create('1000.00', 1)
+        self._create('70.00', 2, self.expense, month=4)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with self.assertNumQueries(1):
+            response = client.get('/api/analytics/distribution/', {
+                'start': '2025-03-01', 'end': '2025-04-30', 'edges': '10,100,1000',
+            })
+        self.assertEqual(response.status_code, 200)
+        rows = {(row['period'], row['category_name']): row for row in response.data['results']}
+        self.assertEqual(set(rows), {(date(2025, 3, 1), 'Comida'), (date(2025, 3, 1), 'Sueldo'),
+                                     (date(2025, 4, 1), 'Comida')})
+        march = rows[(date(2025, 3, 1), 'Comida')]
+        self.assertEqual((march['count'], march['median'], march['p90'], march['p99']), (5, 60.0, 640.0, 964.0))
+        self.assertEqual([bucket['count'] for bucket in march['histogram']], [1, 2, 1, 1])
+        self.assertEqual((march['histogram'][0]['min'], march['histogram'][-1]['max']), (None, None))
+
+        response = client.get('/api/analytics/distribution/', {
+            'start': '2025-03-01', 'end': '2025-04-30', 'edges': '100,10',
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class CurrencyConversionTests(TestCase):
+    """
+    Conversión a la moneda pedida con la última cotización en o antes de cada fecha
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='fx@example.com', password='secret')
+        cls.usd = Currency.objects.create(code='USD', name='Dolar', symbol='$')
+        cls.eur = Currency.objects.create(code='EUR', name='Euro', symbol='E')
+        cls.pyg = Currency.objects.create(code='PYG', name='Guarani', symbol='G')
+        cls.euros = AccountService.create_account(cls.user, {'name': 'Euros', 'currency': cls.eur})
+        cls.dollars = AccountService.create_account(cls.user, {'name': 'Dolares', 'currency': cls.usd})
+        cls.income = Category.objects.create(user=cls.user, name='Sueldo', category_type='INGRESO')
+        ExchangeRate.objects.create(base_currency=cls.eur, target_currency=cls.usd, rate=2, date=date(2025, 1, 1))
+        ExchangeRate.objects.create(base_currency=cls.eur, target_currency=cls.usd, rate=3, date=date(2025, 2, 10))
+        for account in (cls.euros, cls.dollars):
+            for day in (date(2025, 2, 5), date(2025, 2, 15)):
+                TransactionService.create_transaction(cls.user, {
+                    'account': account,
+                    'category': cls.income,
+                    'amount': Decimal('10.00'),
+                    'date': datetime(day.year, day.month, day.day, 12, tzinfo=dt_timezone.utc),
+                })
+
+    def setUp(self):
+        # el usuario se comparte entre pruebas y la versión de datos solo cambia al confirmar
+        cache.clear()
+
+    def test_account_balance_carries_currency(self):
+        self.assertEqual(self.euros.balance.currency, self.eur)
+
+    def test_converts_with_as_of_and_inverse_rates(self):
+        with self.assertNumQueries(1):
+            rows = BucketAggregate(self.user, 'month', date(2025, 2, 1), date(2025, 2, 28),
+                                   metrics=['income'], currency=self.usd).run()
+        # 10 EUR a 2 y 10 EUR a 3, más 20 USD sin convertir
+        self.assertEqual(rows[0]['income'], 70.0)
+
+        rows = BucketAggregate(self.user, 'month', date(2025, 2, 1), date(2025, 2, 28), ['account'],
+                               metrics=['income'], currency=self.eur).run()
+        converted = {row['account_name']: row['income'] for row in rows}
+        # la cotización USD -> EUR sale de la inversa de EUR -> USD
+        self.assertEqual(converted, {'Dolares': round(10 / 2 + 10 / 3, 2), 'Euros': 20.0})
+
+    def test_missing_rate_is_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/analytics/monthly-summary/', {'year': 2025, 'month': 2, 'currency': 'PYG'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('currency', response.data)
+
+        response = client.get('/api/analytics/monthly-summary/', {'year': 2025, 'month': 2, 'currency': 'USD'})
+        self.assertEqual(response.data['incomes'], 70.0)
+
+    def test_accounts_without_currency_are_not_converted_as_target(self):
+        cash = AccountService.create_account(self.user, {'name': 'Efectivo'})
+        TransactionService.create_transaction(self.user, {
+            'account': cash, 'category': self.income, 'amount': Decimal('10.00'),
+            'date': datetime(2025, 2, 20, 12, tzinfo=dt_timezone.utc),
+        })
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/analytics/monthly-summary/', {'year': 2025, 'month': 2, 'currency': 'USD'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cuentas sin moneda', response.data['currency'][0])
+
+
+class AsyncAnalyticsTests(TransactionTestCase):
+    """
+    Las variantes asíncronas devuelven lo mismo que las síncronas. Las consultas corren
+    en otros hilos con sus propias conexiones, así que los datos deben estar confirmados.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='async@example.com', password='secret')
+        account = AccountService.create_account(self.user, {'name': 'Banco'})
+        income = Category.objects.create(user=self.user, name='Sueldo', category_type='INGRESO')
+        expense = Category.objects.create(user=self.user, name='Comida', category_type='EGRESO')
+        for category, amount, day in ((income, '1000.00', 1), (expense, '80.00', 2), (expense, '20.00', 9)):
+            TransactionService.create_transaction(self.user, {
+                'account': account, 'category': category, 'amount': Decimal(amount),
+                'date': datetime(2025, 3, day, 12, tzinfo=dt_timezone.utc),
+            })
+        self.headers = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+    async def test_dashboard_gathers_independent_queries(self):
+        response = await self.async_client.get('/api/analytics-async/dashboard/', {'year': 2025, 'month': 3},
+                                               headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['summary']['incomes'], data['summary']['expenses']), (1000.0, 100.0))
+        self.assertEqual(len(data['trend']), 12)
+        self.assertEqual(data['trend'][-1]['expense'], 100.0)
+        self.assertEqual([row['spent'] for row in data['top_spend']['results']], [100.0])
+
+        self.assertEqual((await self.async_client.get('/api/analytics-async/dashboard/')).status_code, 401)
+        response = await self.async_client.get('/api/analytics-async/dashboard/', {'year': 2025}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    async def test_dashboard_cache_follows_local_date_and_data_version(self):
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2025, 3, 20)):
+            march = (await self.async_client.get('/api/analytics-async/dashboard/', headers=self.headers)).json()
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2025, 4, 2)):
+            april = (await self.async_client.get('/api/analytics-async/dashboard/', headers=self.headers)).json()
+        self.assertEqual((march['month'], april['month']), (3, 4))
+
+        account = await Account.objects.aget(user=self.user)
+        expense = await Category.objects.aget(user=self.user, name='Comida')
+        await sync_to_async(TransactionService.create_transaction)(self.user, {
+            'account': account, 'category': expense, 'amount': Decimal('50.00'),
+            'date': datetime(2025, 3, 10, 12, tzinfo=dt_timezone.utc),
+        })
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2025, 3, 20)):
+            march = (await self.async_client.get('/api/analytics-async/dashboard/', headers=self.headers)).json()
+        self.assertEqual(march['summary']['expenses'], 150.0)
+
+    async def test_async_series_matches_sync(self):
+        params = {'granularity': 'week', 'start': '2025-03-01', 'end': '2025-03-31', 'metrics': 'expense'}
+        response = await self.async_client.get('/api/analytics-async/series/', params, headers=self.headers)
+        sync_client = APIClient()
+        sync_client.force_authenticate(self.user)
+        expected = await sync_to_async(sync_client.get)('/api/analytics/series/', params)
+        self.assertEqual(response.json(), expected.json())
+
+
+class ParallelCommandTests(TransactionTestCase):
+    """
+    Los comandos reparten los usuarios en procesos hijos, que leen los datos confirmados
+    con sus propias conexiones
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.users = []
+        for index in range(3):
+            user = User.objects.create_user(email=f'parallel{index}@example.com', password='secret')
+            account = AccountService.create_account(user, {'name': 'Banco'})
+            income = Category.objects.create(user=user, name='Sueldo', category_type='INGRESO')
+            for month in range(1, 4):
+                TransactionService.create_transaction(user, {
+                    'account': account, 'category': income, 'amount': Decimal('100.00') * (index + 1),
+                    'date': datetime(2025, month, 1, 12, tzinfo=dt_timezone.utc),
+                })
+            self.users.append(user)
+
+    def _rollups(self):
+        return sorted(TransactionRollup.objects.values_list('granularity', 'period', 'account_id', 'income', 'count'))
+
+    def test_commands_run_in_worker_processes(self):
+        expected = self._rollups()
+        TransactionRollup.objects.all().delete()
+        call_command('rebuild_rollups', workers=2, stdout=StringIO())
+        self.assertEqual(self._rollups(), expected)
+
+        call_command('detect_recurring', workers=2, chunk_size=1, stdout=StringIO())
+        self.assertEqual(
+            sorted(RecurringSeries.objects.values_list('user__email', 'frequency', 'amount')),
+            [(user.email, RecurringSeries.MONTHLY, Decimal('100.00') * (index + 1))
+             for index, user in enumerate(self.users)]
+        )
+
+        output = StringIO()
+        call_command('precompute_analytics', workers=2, chunk_size=2, stdout=output)
+        self.assertIn('3 usuarios precalculados', output.getvalue())
+        self.assertEqual(AnalyticsSnapshot.objects.count(), 3)
@@ -1,11 +1,17 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from .views import AnalyticsViewSet
+from .async_views import AsyncDashboardView, AsyncSeriesView, AsyncTopSpendView
+from .views import AnalyticsViewSet, RecurringSeriesViewSet
 
 router = DefaultRouter()
 router.register(f'analytics'
                 f'', AnalyticsViewSet, basename='analytics')
+router.register(r'recurring-series', RecurringSeriesViewSet, basename='recurring-series')
 urlpatterns = [
     path('api/', include(router.urls)),
+    # Variantes asíncronas (ASGI): las consultas independientes corren a la vez
+    path('api/analytics-async/dashboard/', AsyncDashboardView.as_view(), name='analytics-async-dashboard'),
+    path('api/analytics-async/series/', AsyncSeriesView.as_view(), name='analytics-async-series'),
+    path('api/analytics-async/top-spend/', AsyncTopSpendView.as_view(), name='analytics-async-top-spend'),
 ]
@@ -1,5 +1,7 @@
 from datetime import date
+from typing import Optional
 
+from django.conf import settings
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -11,29 +13,71 @@ from rest_framework_extensions.key_constructor.bits import (
 )
 from rest_framework_extensions.key_constructor.constructors import KeyConstructor
 
+from apps.transactions.models import Currency
+from apps.transactions.views import IsOwnerMixin
+from .cache import DataVersionKeyBit, LocalDateKeyBit
+from .models import RecurringSeries
 from .serializers import (
     DailyBalanceSerializer,
-    MonthlySummarySerializer, WeeklySummarySerializer
+    MonthlySummarySerializer, WeeklySummarySerializer,
+    SeriesQuerySerializer, CurrencyQuerySerializer, TopSpendQuerySerializer,
+    ForecastQuerySerializer, RecurringSeriesSerializer, RecurringSeriesQuerySerializer, DistributionQuerySerializer
 )
 from .services.aggregates import TimeSeriesAggregate
+from .services.buckets import BucketAggregate
+from .services.currency import MissingExchangeRate
+from .services.distribution import AmountDistribution
+from .services.forecast import CashFlowForecast
+from .services.rankings import SpendRanking
+from .services.snapshots import SnapshotService
 
 
 class AnalyticsCacheKeyConstructor(KeyConstructor):
     unique_method_id = UniqueMethodIdKeyBit()
     user = UserKeyBit()
     query_params = QueryParamsKeyBit()
+    data_version = DataVersionKeyBit()
+
+
+class DailyAnalyticsCacheKeyConstructor(AnalyticsCacheKeyConstructor):
+    today = LocalDateKeyBit()
+
+
+def cache_analytics(view_method=None, key_func=AnalyticsCacheKeyConstructor):
+    """
+    Cachea la respuesta mientras no cambien los datos del usuario (ver DataVersion).
+    Los errores no se cachean.
+    """
+    decorator = cache_response(
+        key_func=key_func(),
+        timeout=settings.ANALYTICS_CACHE_TIMEOUT,
+        cache_errors=False,
+    )
+    return decorator(view_method) if view_method else decorator
 
 
 class AnalyticsViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = None
 
+    def handle_exception(self, exc):
+        if isinstance(exc, MissingExchangeRate):
+            return Response({'currency': [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+        return super().handle_exception(exc)
+
+    @staticmethod
+    def _currency(request) -> Optional[Currency]:
+        params = CurrencyQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data.get('currency')
+
+    @cache_analytics
     @action(detail=False, methods=['get'], url_path='daily-series')
     def daily_series(self, request):
         try:
-            start = request.query_params.get('start')
-            end = request.query_params.get('end')
-        except KeyError:
+            start = date.fromisoformat(request.query_params.get('start'))
+            end = date.fromisoformat(request.query_params.get('end'))
+        except (TypeError, ValueError):
             return Response(
                 {
                     'detail': 'Parámetros `start` son `end` obligatorios.'
@@ -41,17 +85,17 @@ class AnalyticsViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        data = TimeSeriesAggregate.daily_series(request.user, date.fromisoformat(start), date.fromisoformat(end))
+        data = TimeSeriesAggregate.daily_series(request.user, start, end, self._currency(request))
         serializer = DailyBalanceSerializer(data, many=True)
         return Response(serializer.data)
 
-    @cache_response(key_func=AnalyticsCacheKeyConstructor(), timeout=3600)
+    @cache_analytics
     @action(detail=False, methods=['get'], url_path='weekly-summary')
     def weekly_summary(self, request):
         try:
             start = date.fromisoformat(request.query_params.get('start'))
             weeks = int(request.query_params.get('weeks'))
-        except (ValueError, KeyError):
+        except (TypeError, ValueError, KeyError):
             return Response(
                 {
                     'detail': '`start` (YYYY-MM-DD) y `weeks` (int) son obligatorios.'
@@ -59,14 +103,139 @@ class AnalyticsViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        data = TimeSeriesAggregate.weekly_series(request.user, start, weeks)
+        data = TimeSeriesAggregate.weekly_series(request.user, start, weeks, self._currency(request))
         serializer = WeeklySummarySerializer(data, many=True)
         return Response(serializer.data)
 
-    @action(detail=True, methods=['get'], url_path='monthly-summary')
+    @cache_analytics
+    @action(detail=False, methods=['get'], url_path='monthly-summary')
     def monthly_summary(self, request):
-        year = int(request.query_params.get('year'))
-        month = int(request.query_params.get('month'))
-        data = TimeSeriesAggregate.monthly_series(request.user, year, month)
-        serializer = MonthlySummarySerializer(data=data)
+        try:
+            year = int(request.query_params.get('year'))
+            month = int(request.query_params.get('month'))
+            date(year, month, 1)
+        except (TypeError, ValueError):
+            return Response(
+                {
+                    'detail': '`year` y `month` (1-12) son obligatorios.'
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        data = TimeSeriesAggregate.monthly_series(request.user, year, month, self._currency(request))
+        serializer = MonthlySummarySerializer(data)
         return Response(serializer.data)
+
+    @cache_analytics
+    @action(detail=False, methods=['get'], url_path='series')
+    def series(self, request):
+        """
+        Serie temporal genérica en una sola consulta:
+        ?granularity=day|week|month|quarter|year&start=YYYY-MM-DD&end=YYYY-MM-DD
+        &group_by=category,category_type,account,tag&metrics=income,expense,net,count&currency=USD
+        &cumulative=true&rolling=N
+        """
+        params = SeriesQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+
+        engine = BucketAggregate(
+            request.user, query['granularity'], query['start'], query['end'],
+            dimensions=query['group_by'], metrics=query['metrics'], currency=query.get('currency'),
+            cumulative=query['cumulative'], rolling=query.get('rolling'),
+        )
+        return Response({
+            'granularity': query['granularity'],
+            'start': query['start'],
+            'end': query['end'],
+            'group_by': query['group_by'],
+            'metrics': query['metrics'],
+            'currency': query['currency'].code if query.get('currency') else None,
+            'cumulative': query['cumulative'],
+            'rolling': query.get('rolling'),
+            'results': engine.run(),
+        })
+
+    @cache_analytics
+    @action(detail=False, methods=['get'], url_path='top-spend')
+    def top_spend(self, request):
+        """
+        Las N categorías, cuentas o etiquetas con más gasto en el rango, con su parte
+        del total y su posición frente al periodo anterior de igual largo:
+        ?by=category|account|tag&start=YYYY-MM-DD&end=YYYY-MM-DD&limit=10&currency=USD
+        """
+        params = TopSpendQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+
+        ranking = SpendRanking(request.user, query['by'], query['start'], query['end'],
+                               limit=query['limit'], currency=query.get('currency'))
+        return Response({
+            'by': query['by'],
+            'start': query['start'],
+            'end': query['end'],
+            'currency': query['currency'].code if query.get('currency') else None,
+            **ranking.run(),
+        })
+
+    @cache_analytics
+    @action(detail=False, methods=['get'], url_path='distribution')
+    def distribution(self, request):
+        """
+        Mediana, p90, p99 e histograma de los montos por periodo y categoría:
+        ?granularity=day|week|month|quarter|year&start=YYYY-MM-DD&end=YYYY-MM-DD
+        &edges=10,50,100,500&currency=USD
+        """
+        params = DistributionQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+
+        engine = AmountDistribution(request.user, query['granularity'], query['start'], query['end'],
+                                    query['edges'], currency=query.get('currency'))
+        return Response({
+            'granularity': query['granularity'],
+            'start': query['start'],
+            'end': query['end'],
+            'edges': query['edges'],
+            'currency': query['currency'].code if query.get('currency') else None,
+            'results': engine.run(),
+        })
+
+    @cache_analytics(key_func=DailyAnalyticsCacheKeyConstructor)
+    @action(detail=False, methods=['get'], url_path='forecast')
+    def forecast(self, request):
+        """
+        Saldo diario proyectado de cada cuenta para los próximos N días a partir del
+        saldo actual y de los movimientos recurrentes detectados: ?days=90
+        """
+        params = ForecastQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        days = params.validated_data['days']
+
+        return Response({'days': days, **CashFlowForecast(request.user, days).run()})
+
+    @action(detail=False, methods=['get'], url_path='overview')
+    def overview(self, request):
+        """
+        Resumen del mes actual, últimos 12 meses y gasto por categoría del mes, desde el
+        snapshot precalculado (`manage.py precompute_analytics`); si no hay uno vigente
+        se calcula y se guarda
+        """
+        data = SnapshotService.get_or_store(request.user)
+        return Response({**data, 'summary': MonthlySummarySerializer(data['summary']).data})
+
+
+class RecurringSeriesViewSet(IsOwnerMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Series recurrentes detectadas del usuario (ver `manage.py detect_recurring`).
+    Filtros opcionales: ?frequency=WEEKLY|MONTHLY|YEARLY&account=<id>
+    """
+    queryset = RecurringSeries.objects.none()  # se ignora en favor de get_queryset()
+    serializer_class = RecurringSeriesSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    queryset_select_related = ('account', 'category')
+
+    def get_queryset(self):
+        params = RecurringSeriesQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return super().get_queryset().filter(**params.validated_data)
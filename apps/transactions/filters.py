@@ -0,0 +1,126 @@
+import uuid
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, List, Tuple
+
+from django.db.models import Count, QuerySet
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Category, Transaction
+
+
+def day_bounds(start_date: date, end_date: date) -> Tuple[datetime, datetime]:
+    """
+    Convierte un rango de días inclusivo en el rango semiabierto de timestamps
+    [start 00:00, end + 1 día 00:00) en la zona horaria actual.
+    Filtrar `date` contra timestamps (y no con `date__date`) permite usar los índices sobre `date`.
+    """
+    tz = timezone.get_current_timezone()
+    start = datetime.combine(start_date, time.min, tzinfo=tz)
+    end = datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=tz)
+    return start, end
+
+
+class TransactionFilterBackend(BaseFilterBackend):
+    """
+    Filtros de transacciones por query params:
+        - start, end: rango de fechas (YYYY-MM-DD, ambos inclusive)
+        - account, category: uno o varios ids separados por coma
+        - category_type: INGRESO o EGRESO
+        - tags: ids de etiquetas separados por coma; tags_mode=any (por defecto) o all
+        - amount_min, amount_max: rango de montos (inclusive)
+    Cada combinación habitual tiene su índice compuesto en Transaction.Meta.indexes.
+    """
+    TAGS_MODES = ('any', 'all')
+
+    def filter_queryset(self, request, queryset: QuerySet[Transaction], view) -> QuerySet[Transaction]:
+        return self.apply(queryset, request.query_params, request.user)
+
+    @classmethod
+    def apply(cls, queryset: QuerySet[Transaction], params, user) -> QuerySet[Transaction]:
+        """
+        Aplica los filtros de `params` (QueryDict o dict) sobre `queryset`.
+        """
+        errors: Dict[str, List[str]] = {}
+
+        def parse(name: str, parser: Callable[[str], Any]) -> Any:
+            raw = params.get(name)
+            if raw in (None, ''):
+                return None
+            try:
+                return parser(raw)
+            except (ValueError, TypeError, InvalidOperation):
+                errors[name] = [f'Valor inválido: {raw}']
+                return None
+
+        start = parse('start', date.fromisoformat)
+        end = parse('end', date.fromisoformat)
+        accounts = parse('account', cls._uuid_list)
+        categories = parse('category', cls._uuid_list)
+        category_type = params.get('category_type')
+        tags = parse('tags', cls._int_list)
+        tags_mode = params.get('tags_mode', 'any')
+        amount_min = parse('amount_min', Decimal)
+        amount_max = parse('amount_max', Decimal)
+
+        if category_type and category_type not in dict(Category.TYPE_CHOICES):
+            errors['category_type'] = [f'Debe ser uno de: {", ".join(dict(Category.TYPE_CHOICES))}']
+        if tags_mode not in cls.TAGS_MODES:
+            errors['tags_mode'] = [f'Debe ser uno de: {", ".join(cls.TAGS_MODES)}']
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        if start:
+            queryset = queryset.filter(date__gte=day_bounds(start, start)[0])
+        if end:
+            queryset = queryset.filter(date__lt=day_bounds(end, end)[1])
+        if accounts:
+            queryset = queryset.filter(account_id__in=accounts)
+        if categories:
+            queryset = queryset.filter(category_id__in=categories)
+        if category_type:
+            # Subconsulta sobre categorías: el filtro queda sobre category_id y usa su índice
+            queryset = queryset.filter(
+                category_id__in=Category.objects.filter(user=user, category_type=category_type).values('id')
+            )
+        if tags:
+            links = Transaction.tags.through.objects.filter(tag_id__in=tags)
+            if tags_mode == 'all':
+                links = links.values('transaction_id').annotate(
+                    matched=Count('tag_id', distinct=True)
+                ).filter(matched=len(set(tags)))
+            queryset = queryset.filter(id__in=links.values('transaction_id'))
+        if amount_min is not None:
+            queryset = queryset.filter(amount__gte=amount_min)
+        if amount_max is not None:
+            queryset = queryset.filter(amount__lte=amount_max)
+        return queryset
+
+    @staticmethod
+    def _uuid_list(raw: str) -> List[uuid.UUID]:
+        return [uuid.UUID(value) for value in raw.split(',') if value]
+
+    @staticmethod
+    def _int_list(raw: str) -> List[int]:
+        return [int(value) for value in raw.split(',') if value]
+
+    def get_schema_operation_parameters(self, view) -> List[Dict[str, Any]]:
+        def parameter(name: str, description: str, schema_type: str = 'string', fmt: str | None = None):
+            schema = {'type': schema_type}
+            if fmt:
+                schema['format'] = fmt
+            return {'name': name, 'required': False, 'in': 'query', 'description': description, 'schema': schema}
+
+        return [
+            parameter('start', 'Fecha inicial inclusive (YYYY-MM-DD)', fmt='date'),
+            parameter('end', 'Fecha final inclusive (YYYY-MM-DD)', fmt='date'),
+            parameter('account', 'Ids de cuentas separados por coma'),
+            parameter('category', 'Ids de categorías separados por coma'),
+            parameter('category_type', 'INGRESO o EGRESO'),
+            parameter('tags', 'Ids de etiquetas separados por coma'),
+            parameter('tags_mode', '`any` (alguna etiqueta) o `all` (todas)'),
+            parameter('amount_min', 'Monto mínimo inclusive', 'number'),
+            parameter('amount_max', 'Monto máximo inclusive', 'number'),
+        ]
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.transactions.models import Account, AccountBalance
+from apps.transactions.services import AccountBalanceService
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero los saldos materializados de las cuentas a partir de sus transacciones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Email del usuario cuyas cuentas se reconcilian (por defecto todas)')
+
+    def handle(self, *args, **options):
+        accounts = Account.objects.all()
+        if options['user']:
+            accounts = accounts.filter(user__email=options['user'])
+
+        with transaction.atomic():
+            # Bloquear los saldos hace que las escrituras concurrentes esperen y apliquen su
+            # delta sobre el valor reconstruido, en lugar de perderse
+            list(AccountBalance.objects.filter(account__in=accounts).select_for_update().values_list('pk', flat=True))
+            total = AccountBalanceService.rebuild(accounts)
+
+        self.stdout.write(self.style.SUCCESS(f'{total} saldos reconciliados.'))
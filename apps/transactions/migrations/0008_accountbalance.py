@@ -0,0 +1,56 @@
+# Generated by Django 5.2.1 on 2026-10-17 03:20
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Case, F, Max, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+
+def backfill_balances(apps, schema_editor):
+    """
+    Saldo inicial de las cuentas existentes a partir de sus transacciones, con una
+    consulta agrupada y una inserción por lotes (como AccountBalanceService.rebuild)
+    """
+    Account = apps.get_model('transactions', 'Account')
+    AccountBalance = apps.get_model('transactions', 'AccountBalance')
+    db_alias = schema_editor.connection.alias
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    signed = Case(
+        When(transactions__category__category_type='INGRESO', then=F('transactions__amount')),
+        default=F('transactions__amount') * Value(-1),
+        output_field=amount,
+    )
+    totals = Account.objects.using(db_alias).annotate(
+        total=Coalesce(Sum(signed), Value(Decimal('0')), output_field=amount),
+        last_tx=Max('transactions__date'),
+    ).values_list('id', 'total', 'last_tx')
+    AccountBalance.objects.using(db_alias).bulk_create(
+        [AccountBalance(account_id=pk, balance=total, last_tx_at=last_tx) for pk, total, last_tx in totals],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0007_transaction_user_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountBalance',
+            fields=[
+                ('account', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance', serialize=False, to='transactions.account')),
+                ('balance', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('last_tx_at', models.DateTimeField(blank=True, help_text='Fecha de la transacción más reciente', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('currency', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='account_balances', to='transactions.currency')),
+            ],
+            options={
+                'verbose_name': 'Saldo de cuenta',
+                'verbose_name_plural': 'Saldos de cuentas',
+            },
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
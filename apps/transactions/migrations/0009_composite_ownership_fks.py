@@ -0,0 +1,53 @@
+# Generated by Django 5.2.1 on 2026-10-17 03:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0008_accountbalance'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='budget',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='category',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='tag',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='account',
+            constraint=models.UniqueConstraint(fields=('user', 'id'), name='unique_account_id_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='category',
+            constraint=models.UniqueConstraint(fields=('user', 'id'), name='unique_category_id_per_user'),
+        ),
+        # Django no crea FK compuestas: la base de datos garantiza que la cuenta y la
+        # categoría de cada transacción pertenezcan al mismo usuario que la transacción.
+        migrations.RunSQL(
+            sql="""
+                ALTER TABLE transactions_transaction
+                    ADD CONSTRAINT transaction_account_owner_fk
+                    FOREIGN KEY (user_id, account_id)
+                    REFERENCES transactions_account (user_id, id);
+                ALTER TABLE transactions_transaction
+                    ADD CONSTRAINT transaction_category_owner_fk
+                    FOREIGN KEY (user_id, category_id)
+                    REFERENCES transactions_category (user_id, id);
+            """,
+            reverse_sql="""
+                ALTER TABLE transactions_transaction DROP CONSTRAINT transaction_account_owner_fk;
+                ALTER TABLE transactions_transaction DROP CONSTRAINT transaction_category_owner_fk;
+            """,
+        ),
+    ]
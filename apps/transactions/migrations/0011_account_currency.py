@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-17 03:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0010_transaction_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='currency',
+            field=models.ForeignKey(blank=True, help_text='Moneda de los montos de la cuenta; vacía si no se convierte', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='accounts', to='transactions.currency'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0011_account_currency'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='account',
+            name='currency',
+            field=models.ForeignKey(blank=True, help_text='Moneda de los montos de la cuenta; sin ella no se convierten', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='accounts', to='transactions.currency'),
+        ),
+        migrations.AddConstraint(
+            model_name='exchangerate',
+            constraint=models.CheckConstraint(condition=models.Q(('rate__gt', 0)), name='exchange_rate_positive'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def backfill_currency(apps, schema_editor):
+    """
+    Asigna la moneda DEFAULT_CURRENCY a las cuentas existentes sin moneda (y a sus
+    saldos), para que sus montos se puedan convertir. Sin la opción no hace nada.
+    """
+    if not settings.DEFAULT_CURRENCY:
+        return
+    Currency = apps.get_model('transactions', 'Currency')
+    Account = apps.get_model('transactions', 'Account')
+    AccountBalance = apps.get_model('transactions', 'AccountBalance')
+    db_alias = schema_editor.connection.alias
+    currency = Currency.objects.using(db_alias).filter(code=settings.DEFAULT_CURRENCY).first()
+    if currency is None:
+        raise ValueError(f'DEFAULT_CURRENCY: no existe la moneda {settings.DEFAULT_CURRENCY}')
+    Account.objects.using(db_alias).filter(currency__isnull=True).update(currency=currency)
+    AccountBalance.objects.using(db_alias).filter(currency__isnull=True).update(currency=currency)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0012_exchange_rate_positive'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_currency, migrations.RunPython.noop),
+    ]
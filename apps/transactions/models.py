@@ -35,6 +35,9 @@ class Account(AutoStripMixin, models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='accounts')
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
+    currency = models.ForeignKey('Currency', null=True, blank=True, on_delete=models.PROTECT,
+                                 related_name='accounts',
+                                 help_text='Moneda de los montos de la cuenta; sin ella no se convierten')
 
     # timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -48,7 +51,12 @@ class Account(AutoStripMixin, models.Model):
             models.UniqueConstraint(
                 fields=['user', 'name'],
                 name='unique_account_name'
-            )
+            ),
+            # Destino de la FK compuesta (user_id, account_id) de Transaction
+            models.UniqueConstraint(
+                fields=['user', 'id'],
+                name='unique_account_id_per_user'
+            ),
         ]
 
     def __str__(self):
@@ -83,13 +91,17 @@ class Category(AutoStripMixin, models.Model):
     class Meta:
         verbose_name = 'Categoria'
         verbose_name_plural = 'Categorias'
-        unique_together = [('user', 'name', 'category_type')]
         ordering = ['name', 'category_type']
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'name', 'category_type'],
                 name='unique_category_per_user'
-            )
+            ),
+            # Destino de la FK compuesta (user_id, category_id) de Transaction
+            models.UniqueConstraint(
+                fields=['user', 'id'],
+                name='unique_category_id_per_user'
+            ),
         ]
 
     def __str__(self):
@@ -112,7 +124,6 @@ class Tag(AutoStripMixin, models.Model):
     class Meta:
         verbose_name = 'Etiqueta'
         verbose_name_plural = 'Etiquetas'
-        unique_together = [('user', 'name')]
         ordering = ['name']
         constraints = [
             models.UniqueConstraint(
@@ -158,6 +169,16 @@ class Transaction(AutoStripMixin, models.Model):
         verbose_name = 'Transacción'
         verbose_name_plural = 'Transacciones'
         ordering = ['-date', '-created_at']
+        indexes = [
+            # Soporta la paginación por cursor: cada página es un rango de este índice
+            models.Index(fields=['user', '-date', '-created_at', '-id'], name='transaction_user_date_idx'),
+            # Filtros por cuenta o categoría con rango de fechas, en el mismo orden que el listado
+            models.Index(fields=['user', 'account', '-date', '-created_at', '-id'], name='transaction_user_account_idx'),
+            models.Index(fields=['user', 'category', '-date', '-created_at', '-id'],
+                         name='transaction_user_category_idx'),
+            # Filtros por rango de montos
+            models.Index(fields=['user', 'amount'], name='transaction_user_amount_idx'),
+        ]
 
     def __str__(self):
         # Mostramos un resumen de la transacción
@@ -166,18 +187,23 @@ class Transaction(AutoStripMixin, models.Model):
         return f"{tipo} {sign} {self.amount} en {self.account.name} el {self.date.date()}"
 
     def clean(self):
-        # Validar que account y category pertenezcan al usuario
-        if self.account_id and self.account.user != self.user:
+        # Validar que account y category pertenezcan al usuario, comparando ids para no cargar usuarios
+        if self.account_id and self.account.user_id != self.user_id:
             raise ValidationError({'account': 'La cuenta debe pertenecer al usuario.'})
 
-        if self.category_id and self.category.user != self.user:
+        if self.category_id and self.category.user_id != self.user_id:
             raise ValidationError({'category': 'La categoría debe pertenecer al usuario.'})
 
         super().clean()
 
-    def save(self, *args, **kwargs):
-        # Asegurar las validaciones antes de llamar a save
-        self.full_clean()
+    def save(self, *args, clean=True, **kwargs):
+        """
+        Por defecto valida antes de guardar. Los servicios que reciben datos ya validados
+        por el serializer usan clean=False: la pertenencia de cuenta y categoría la garantizan
+        además las FK compuestas (user_id, account_id) y (user_id, category_id) en la base de datos.
+        """
+        if clean:
+            self.full_clean()
         super().save(*args, **kwargs)
 
     @property
@@ -231,7 +257,9 @@ class ExchangeRate(AutoStripMixin, models.Model):
             models.UniqueConstraint(
                 fields=['base_currency', 'target_currency', 'date'],
                 name='unique_exchange_rate_per_date'
-            )
+            ),
+            # la conversión divide por la cotización cuando usa la inversa
+            models.CheckConstraint(condition=models.Q(rate__gt=0), name='exchange_rate_positive'),
         ]
 
     def __str__(self):
@@ -255,7 +283,6 @@ class Budget(AutoStripMixin, models.Model):
     class Meta:
         verbose_name = 'Presupuesto'
         verbose_name_plural = 'Presupuestos'
-        unique_together = [('user', 'currency', 'tags', 'month')]
         ordering = ['-month']
         constraints = [
             models.UniqueConstraint(
@@ -265,12 +292,35 @@ class Budget(AutoStripMixin, models.Model):
         ]
 
     def __str__(self):
-        tag_part = f" Para {self.tag.name}" if self.tag else ""
+        tag_part = f" Para {self.tags.name}" if self.tags_id else ""
         return f"{self.user.first_name} - {self.amount} {self.currency.code} en {self.month.strftime('%B %Y')}{tag_part}"
 
     def clean(self):
         if self.month and self.month.day != 1:
             raise ValidationError({"month": "Debe ser el primer dia del mes"})
 
-        if self.tag and self.tag.user != self.user:
-            raise ValidationError({"tag": "La etiqueta debe pertenecer al usuario."})
+        if self.tags_id and self.tags.user_id != self.user_id:
+            raise ValidationError({"tags": "La etiqueta debe pertenecer al usuario."})
+
+
+class AccountBalance(models.Model):
+    """
+    Saldo materializado de una cuenta.
+    Lo mantiene TransactionService en la misma transacción de base de datos que cada
+    alta, edición o baja de transacciones; `reconcile_balances` lo reconstruye desde cero.
+    """
+    account = models.OneToOneField(Account, on_delete=models.CASCADE, primary_key=True, related_name='balance')
+    currency = models.ForeignKey(Currency, null=True, blank=True, on_delete=models.PROTECT,
+                                 related_name='account_balances')
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'))
+    last_tx_at = models.DateTimeField(null=True, blank=True, help_text='Fecha de la transacción más reciente')
+
+    # timestamps
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Saldo de cuenta'
+        verbose_name_plural = 'Saldos de cuentas'
+
+    def __str__(self):
+        return f"{self.account.name}: {self.balance}"
@@ -0,0 +1,131 @@
+import uuid
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, _reverse_ordering
+
+
+class TransactionCursorPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) para transacciones.
+
+    El cursor guarda la posición completa (date, created_at, id) de la última fila
+    entregada, de modo que cada página es un rango del índice
+    (user, -date, -created_at, -id) y nunca se usa OFFSET: el costo es el mismo
+    en la primera página y en la página diez mil.
+    """
+    ordering = ('-date', '-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    position_separator = '|'
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None) -> Optional[List[Any]]:
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (reverse, current_position) = (False, None)
+        else:
+            (_, reverse, current_position) = self.cursor
+
+        # La paginación por cursor siempre impone el orden
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        # Buscar directamente la posición del cursor en el índice
+        if current_position is not None:
+            queryset = queryset.filter(self._seek_filter(self._decode_position(current_position), reverse))
+
+        # Se pide un elemento extra para saber si existe una página siguiente
+        results = list(queryset[:self.page_size + 1])
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(self.page[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+
+            self.has_next = current_position is not None
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.has_next:
+            return None
+        # La posición es única, así que el marcador es siempre el último elemento de la página
+        position = self._get_position_from_instance(self.page[-1], self.ordering) if self.page \
+            else self.next_position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self) -> Optional[str]:
+        if not self.has_previous:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering) if self.page \
+            else self.previous_position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def _get_position_from_instance(self, instance: Any, ordering: Tuple[str, ...]) -> str:
+        values = []
+        for order in ordering:
+            field_name = order.lstrip('-')
+            attr = instance[field_name] if isinstance(instance, dict) else getattr(instance, field_name)
+            values.append(attr.isoformat() if isinstance(attr, datetime) else str(attr))
+        return self.position_separator.join(values)
+
+    def _decode_position(self, position: str) -> Tuple[datetime, datetime, uuid.UUID]:
+        try:
+            date_value, created_at, pk = position.split(self.position_separator)
+            return datetime.fromisoformat(date_value), datetime.fromisoformat(created_at), uuid.UUID(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _seek_filter(self, values: Tuple[Any, ...], reverse: bool) -> Q:
+        """
+        Construye la comparación de tuplas (date, created_at, id) < posición
+        (o > según la dirección) expandida lexicográficamente. La cota sobre el
+        primer campo permite que Postgres la use como condición del índice.
+        """
+        lookups = []
+        for order in self.ordering:
+            # (cursor invertido) XOR (orden descendente)
+            lookups.append('lt' if reverse != order.startswith('-') else 'gt')
+        names = [order.lstrip('-') for order in self.ordering]
+
+        seek = Q()
+        for i, name in enumerate(names):
+            equal = {names[j]: values[j] for j in range(i)}
+            seek |= Q(**equal, **{f'{name}__{lookups[i]}': values[i]})
+
+        leading_bound = {f'{names[0]}__{lookups[0]}e': values[0]}
+        return Q(**leading_bound) & seek
@@ -0,0 +1,152 @@
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from django.core.cache import cache
+
+from .models import Currency, ExchangeRate
+
+RATE_SCALE = 6  # decimales de ExchangeRate.rate
+
+
+class ExchangeRateIndex:
+    """
+    Índice en memoria del histórico de tasas de cambio.
+
+    Cada par (base, destino) guarda dos arreglos compactos y ordenados: fechas como
+    ordinales y tasas como enteros escalados (exactos, 6 decimales). "Tasa en la fecha D"
+    es una búsqueda binaria sobre las fechas. Si el par no cotiza directamente se usa la
+    inversa del par contrario y, si tampoco existe, una tasa cruzada a través de una
+    moneda pivote (primero las de PIVOTS).
+
+    Lo usan las conversiones que se hacen en Python (el estado de los presupuestos). Las
+    analíticas convierten dentro de su consulta agregada (ver CurrencyConversion), donde
+    el índice no llega, y la carga masiva no convierte: los montos quedan en la moneda
+    de su cuenta.
+
+    El índice se carga completo con una sola consulta la primera vez que se usa.
+    ExchangeRateService lo invalida al escribir; los demás procesos lo notan por la
+    versión guardada en la caché, que se revisa como mucho cada CHECK_INTERVAL segundos.
+    """
+    PIVOTS = ('USD', 'EUR')
+    VERSION_KEY = 'exchange_rates:version'
+    CHECK_INTERVAL = 5.0
+
+    _lock = threading.Lock()
+    _pairs: Optional[Dict[Tuple[int, int], Tuple[array, array]]] = None
+    _neighbors: Dict[int, Set[int]] = {}
+    _pivot_ids: Tuple[int, ...] = ()
+    _version = None
+    _checked_at = 0.0
+
+    @classmethod
+    def load(cls) -> Dict[Tuple[int, int], Tuple[array, array]]:
+        """
+        Construye el índice con una sola consulta ordenada por par y fecha
+        """
+        pairs: Dict[Tuple[int, int], Tuple[array, array]] = {}
+        neighbors: Dict[int, Set[int]] = {}
+        rows = ExchangeRate.objects.order_by('base_currency_id', 'target_currency_id', 'date').values_list(
+            'base_currency_id', 'target_currency_id', 'date', 'rate'
+        )
+        for base_id, target_id, day, rate in rows.iterator(chunk_size=5000):
+            dates, rates = pairs.setdefault((base_id, target_id), (array('l'), array('q')))
+            dates.append(day.toordinal())
+            rates.append(int(rate.scaleb(RATE_SCALE)))
+            neighbors.setdefault(base_id, set()).add(target_id)
+            neighbors.setdefault(target_id, set()).add(base_id)
+
+        pivot_ids = dict(Currency.objects.filter(code__in=cls.PIVOTS).values_list('code', 'id'))
+        with cls._lock:
+            cls._pairs = pairs
+            cls._neighbors = neighbors
+            cls._pivot_ids = tuple(pivot_ids[code] for code in cls.PIVOTS if code in pivot_ids)
+            cls._version = cache.get(cls.VERSION_KEY)
+            cls._checked_at = time.monotonic()
+        return pairs
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """
+        Descarta el índice de este proceso y avisa a los demás cambiando la versión
+        """
+        with cls._lock:
+            cls._pairs = None
+        try:
+            cache.incr(cls.VERSION_KEY)
+        except ValueError:
+            cache.set(cls.VERSION_KEY, 1, timeout=None)
+
+    @classmethod
+    def _snapshot(cls) -> Dict[Tuple[int, int], Tuple[array, array]]:
+        """
+        El índice vigente, cargándolo si hace falta
+        """
+        pairs = cls._pairs
+        if pairs is not None:
+            now = time.monotonic()
+            if now - cls._checked_at < cls.CHECK_INTERVAL:
+                return pairs
+            cls._checked_at = now
+            if cache.get(cls.VERSION_KEY) == cls._version:
+                return pairs
+        return cls.load()
+
+    @staticmethod
+    def _direct(pairs, base_id: int, target_id: int, ordinal: int) -> Optional[Decimal]:
+        series = pairs.get((base_id, target_id))
+        if series is not None:
+            dates, rates = series
+            position = bisect_right(dates, ordinal)
+            if position:
+                return Decimal(rates[position - 1]).scaleb(-RATE_SCALE)
+        series = pairs.get((target_id, base_id))
+        if series is not None:
+            dates, rates = series
+            position = bisect_right(dates, ordinal)
+            if position:
+                return Decimal(10 ** RATE_SCALE) / Decimal(rates[position - 1])
+        return None
+
+    @classmethod
+    def _pivots(cls, base_id: int, target_id: int) -> Iterable[int]:
+        shared = cls._neighbors.get(base_id, set()) & cls._neighbors.get(target_id, set())
+        yield from (pivot for pivot in cls._pivot_ids if pivot in shared)
+        yield from sorted(shared.difference(cls._pivot_ids))
+
+    @classmethod
+    def rate(cls, base: Currency | int, target: Currency | int, on: date) -> Optional[Decimal]:
+        """
+        Tasa base -> destino vigente en `on` (la última con fecha menor o igual),
+        directa, inversa o cruzada por un pivote. None si no hay cómo calcularla.
+        """
+        base_id = getattr(base, 'pk', base)
+        target_id = getattr(target, 'pk', target)
+        if base_id == target_id:
+            return Decimal('1')
+
+        pairs = cls._snapshot()
+        ordinal = on.toordinal()
+        rate = cls._direct(pairs, base_id, target_id, ordinal)
+        if rate is not None:
+            return rate
+        for pivot in cls._pivots(base_id, target_id):
+            first = cls._direct(pairs, base_id, pivot, ordinal)
+            second = cls._direct(pairs, pivot, target_id, ordinal) if first is not None else None
+            if second is not None:
+                return first * second
+        return None
+
+    @classmethod
+    def convert(cls, amount: Decimal, base: Currency | int, target: Currency | int, on: date) -> Optional[Decimal]:
+        """
+        Monto convertido y redondeado a centavos, o None si falta la tasa
+        """
+        rate = cls.rate(base, target, on)
+        if rate is None:
+            return None
+        return (amount * rate).quantize(Decimal('0.01'))
@@ -1,11 +1,13 @@
 from datetime import date
 from decimal import Decimal
-from typing import Any, Optional, Dict
+from typing import Any, Optional, Dict, List
 
 from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
 from django.utils import timezone
 from rest_framework import serializers
 
+from .filters import TransactionFilterBackend
 from .models import (
     Account,
     Category,
@@ -81,11 +83,13 @@ class AccountSerializer(serializers.ModelSerializer):
     """
     Serializer para Account.
     """
+    balance = serializers.DecimalField(source='balance.balance', max_digits=14, decimal_places=2, read_only=True)
+    last_tx_at = serializers.DateTimeField(source='balance.last_tx_at', read_only=True)
 
     class Meta:
         model = Account
-        fields = ['id', 'name', 'description', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        fields = ['id', 'name', 'description', 'currency', 'balance', 'last_tx_at', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'balance', 'last_tx_at', 'created_at', 'updated_at']
 
     def create(self, validated_data: Dict[str, Any]) -> Optional[Account]:
         user = self.context['request'].user
@@ -150,6 +154,119 @@ class TransactionSerializer(serializers.ModelSerializer):
         return TransactionService.update_transaction(instance, validated_data)
 
 
+class TransactionBulkListSerializer(serializers.ListSerializer):
+    """
+    Valida un lote de transacciones como conjunto: la pertenencia de cuentas,
+    categorías y etiquetas se resuelve con una consulta por modelo para todo el lote.
+    """
+
+    def validate(self, attrs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        user = self.context['request'].user
+        account_ids = {row['account'] for row in attrs}
+        category_ids = {row['category'] for row in attrs}
+        tag_ids = {tag for row in attrs for tag in row['tags']}
+
+        accounts = set(Account.objects.filter(user=user, id__in=account_ids).values_list('id', flat=True))
+        categories = set(Category.objects.filter(user=user, id__in=category_ids).values_list('id', flat=True))
+        tags = set(Tag.objects.filter(user=user, id__in=tag_ids).values_list('id', flat=True)) if tag_ids else set()
+
+        errors = {}
+        for index, row in enumerate(attrs):
+            row_errors = {}
+            if row['account'] not in accounts:
+                row_errors['account'] = ['La cuenta debe pertenecer al usuario.']
+            if row['category'] not in categories:
+                row_errors['category'] = ['La categoría debe pertenecer al usuario.']
+            if any(tag not in tags for tag in row['tags']):
+                row_errors['tags'] = ['Las etiquetas deben pertenecer al usuario.']
+            if row_errors:
+                errors[index] = row_errors
+
+        if errors:
+            raise serializers.ValidationError({'rows': errors})
+        return attrs
+
+    def create(self, validated_data: List[Dict[str, Any]]) -> List[Transaction]:
+        user = self.context['request'].user
+        return TransactionService.bulk_create_transactions(user, validated_data)
+
+
+class TransactionBulkSerializer(serializers.Serializer):
+    """
+    Fila de la carga masiva de transacciones. Las relaciones llegan como ids y se
+    validan en conjunto en TransactionBulkListSerializer, no fila por fila.
+    """
+    MAX_ROWS = 50000
+
+    account = serializers.UUIDField()
+    category = serializers.UUIDField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    date = serializers.DateTimeField()
+    description = serializers.CharField(required=False, allow_blank=True, default='', trim_whitespace=False)
+    tags = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+    class Meta:
+        list_serializer_class = TransactionBulkListSerializer
+
+    @staticmethod
+    def validate_date(value: date) -> Optional[date]:
+        if value > timezone.now():
+            raise serializers.ValidationError('La fecha no puede ser futura')
+        return value
+
+
+class TransactionSelectionSerializer(serializers.Serializer):
+    """
+    Selección de transacciones para operaciones masivas: una lista de ids o los
+    mismos filtros del listado (ver TransactionFilterBackend), nunca ambos.
+    """
+    ids = serializers.ListField(child=serializers.UUIDField(), required=False, allow_empty=False)
+    filter = serializers.DictField(child=serializers.CharField(), required=False, allow_empty=False)
+
+    def validate(self, attrs: Dict[str, Any]) -> Dict[str, Any]:
+        if ('ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError('Se debe indicar `ids` o `filter`, pero no ambos.')
+        return attrs
+
+    def select(self, queryset: QuerySet[Transaction]) -> QuerySet[Transaction]:
+        if 'ids' in self.validated_data:
+            return queryset.filter(id__in=self.validated_data['ids'])
+        return TransactionFilterBackend.apply(queryset, self.validated_data['filter'], self.context['request'].user)
+
+
+class TransactionBulkUpdateSerializer(TransactionSelectionSerializer):
+    """
+    Cambios a aplicar sobre la selección: nueva categoría, nueva cuenta y etiquetas a
+    agregar o quitar. Las relaciones se resuelven una vez, filtradas por usuario.
+    """
+    category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), required=False)
+    account = serializers.PrimaryKeyRelatedField(queryset=Account.objects.all(), required=False)
+    add_tags = serializers.PrimaryKeyRelatedField(many=True, queryset=Tag.objects.all(), required=False)
+    remove_tags = serializers.PrimaryKeyRelatedField(many=True, queryset=Tag.objects.all(), required=False)
+
+    CHANGES = ('category', 'account', 'add_tags', 'remove_tags')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if hasattr(self, 'context') and 'request' in self.context:
+            user = self.context['request'].user
+            if user.is_authenticated:
+                self.fields['category'].queryset = Category.objects.filter(user=user)
+                self.fields['account'].queryset = Account.objects.filter(user=user)
+                self.fields['add_tags'].child_relation.queryset = Tag.objects.filter(user=user)
+                self.fields['remove_tags'].child_relation.queryset = Tag.objects.filter(user=user)
+
+    def validate(self, attrs: Dict[str, Any]) -> Dict[str, Any]:
+        attrs = super().validate(attrs)
+        if not any(attrs.get(change) for change in self.CHANGES):
+            raise serializers.ValidationError(f'Se debe indicar al menos un cambio: {", ".join(self.CHANGES)}.')
+        return attrs
+
+    @property
+    def changes(self) -> Dict[str, Any]:
+        return {change: self.validated_data[change] for change in self.CHANGES if change in self.validated_data}
+
+
 class BudgetSerializer(serializers.ModelSerializer):
     """
     Serializer para Budget.
@@ -185,3 +302,19 @@ class BudgetSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data: Dict[str, Any]) -> Optional[Budget]:
         return BudgetService.update_budget(instance, validated_data)
+
+
+class BudgetStatusSerializer(serializers.Serializer):
+    """
+    Presupuesto del mes comparado con lo gastado
+    """
+    id = serializers.IntegerField()
+    month = serializers.DateField()
+    currency = serializers.CharField()
+    tag = serializers.IntegerField(allow_null=True)
+    tag_name = serializers.CharField(allow_null=True)
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    spent = serializers.DecimalField(max_digits=14, decimal_places=2)
+    remaining = serializers.DecimalField(max_digits=14, decimal_places=2)
+    percentage = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    missing_rates = serializers.BooleanField(help_text='Algún gasto no pudo convertirse a la moneda del presupuesto')
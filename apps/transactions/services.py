@@ -1,11 +1,20 @@
-from typing import Any, Optional, Dict, TypeVar
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Optional, Dict, List, Tuple, TypeVar
+from uuid import UUID
 
 from django.contrib.auth import get_user_model
-from django.db import IntegrityError, transaction
-from django.db.models import Model
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Model, QuerySet, Case, When, F, Value, Sum, Max, Subquery, OuterRef, DecimalField
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
 from rest_framework import serializers
 
-from .models import Account, Category, Transaction, Tag, Budget, ExchangeRate
+from apps.analytics.cache import DataVersion
+from apps.analytics.services.rollups import RollupService
+from .filters import day_bounds
+from .models import Account, AccountBalance, Category, Currency, Transaction, Tag, Budget, ExchangeRate
+from .rates import ExchangeRateIndex
 
 User = get_user_model()
 
@@ -18,12 +27,17 @@ class BaseService:
         """
         Asigna atributos, valida y guarda
         uniqueness_error puede ser un diccionario para field-errors o str para non_field
+        La unicidad y la existencia de las relaciones (ya resueltas por el serializer)
+        las verifica una sola vez la base de datos al guardar.
         """
         for field, value in data.items():
             setattr(instance, field, value)
+        relations = [field.name for field in instance._meta.concrete_fields if field.is_relation]
+        instance.full_clean(exclude=relations, validate_unique=False, validate_constraints=False)
         try:
-            instance.full_clean()
-            instance.save()
+            # savepoint para que un IntegrityError no invalide una transacción externa
+            with transaction.atomic():
+                instance.save()
             return instance
         except IntegrityError:
             raise serializers.ValidationError(uniqueness_error)
@@ -33,94 +47,477 @@ class AccountService(BaseService):
     @staticmethod
     def create_account(user: User, validated_data: Dict[str, Any]) -> Optional[Account]:
         try:
-            return Account.objects.create(user=user, **validated_data)
+            with transaction.atomic():
+                account = Account.objects.create(user=user, **validated_data)
+                AccountBalance.objects.create(account=account, currency_id=account.currency_id)
+                DataVersion.bump(user.pk)
+            return account
         except IntegrityError:
             raise serializers.ValidationError({'non_field_errors': 'Ya existe una cuenta con ese nombre.'})
 
     @staticmethod
     def update_account(instance: Account, validated_data: Dict[str, Any]) -> Optional[Account]:
-        return BaseService._save_instance(instance, validated_data,
-                                          {'non_field_errors': "Ya existe una cuenta con ese nombre"})
+        with transaction.atomic():
+            account = BaseService._save_instance(instance, validated_data,
+                                                 {'non_field_errors': "Ya existe una cuenta con ese nombre"})
+            if 'currency' in validated_data:
+                AccountBalance.objects.filter(account=account).update(currency_id=account.currency_id)
+            DataVersion.bump(account.user_id)
+        return account
 
 
 class CategoryService(BaseService):
     @staticmethod
     def create_category(user: User, validated_data: Dict[str, Any]) -> Optional[Category]:
         try:
-            return Category.objects.create(user=user, **validated_data)
+            category = Category.objects.create(user=user, **validated_data)
         except IntegrityError:
             raise serializers.ValidationError({'non_field_errors': 'Ya existe una categoría con ese nombre y tipo.'})
+        DataVersion.bump(user.pk)
+        return category
 
     @staticmethod
     def update_category(instance: Category, validated_data: Dict[str, Any]) -> Optional[Category]:
-        return BaseService._save_instance(instance, validated_data,
-                                          {'non_field_errors': "Ya existe una categoria con ese nombre y tipo"})
+        type_changed = validated_data.get('category_type', instance.category_type) != instance.category_type
+        with transaction.atomic():
+            category = BaseService._save_instance(instance, validated_data,
+                                                  {'non_field_errors': "Ya existe una categoria con ese nombre y tipo"})
+            if type_changed:
+                # Los montos de la categoría cambian de signo en saldos y resúmenes
+                RollupService.swap_category_type(category)
+                AccountBalanceService.rebuild(Account.objects.filter(transactions__category=category).distinct())
+            DataVersion.bump(category.user_id)
+        return category
 
 
 class TagService(BaseService):
     @staticmethod
     def create_tag(user: User, validated_data: Dict[str, Any]) -> Optional[Tag]:
         try:
-            return Tag.objects.create(user=user, **validated_data)
+            tag = Tag.objects.create(user=user, **validated_data)
         except IntegrityError:
             raise serializers.ValidationError({'non_field_errors': 'Ya existe una etiqueta con ese nombre.'})
+        DataVersion.bump(user.pk)
+        return tag
 
     @staticmethod
     def update_tag(instance, validated_data):
-        return BaseService._save_instance(instance, validated_data,
-                                          {'non_field_errors': "Ya existe una etiqueta con ese nombre"})
+        tag = BaseService._save_instance(instance, validated_data,
+                                         {'non_field_errors': "Ya existe una etiqueta con ese nombre"})
+        DataVersion.bump(tag.user_id)
+        return tag
 
 
 class ExchangeRateService(BaseService):
     @staticmethod
     def create_exchange_rate(validated_data: Dict[str, Any]) -> Optional[ExchangeRate]:
         try:
-            return ExchangeRate.objects.create(**validated_data)
+            rate = ExchangeRate.objects.create(**validated_data)
         except IntegrityError:
             raise serializers.ValidationError('Ya existe una tasa para estas monedas en esa fecha.')
+        transaction.on_commit(ExchangeRateIndex.invalidate)
+        return rate
 
     @staticmethod
     def update_exchange_rate(instance, validated_data):
-        return BaseService._save_instance(instance, validated_data,
+        rate = BaseService._save_instance(instance, validated_data,
                                           {'non_field_errors': "Ya existe una tasa para estas monedas en esa fecha"})
+        transaction.on_commit(ExchangeRateIndex.invalidate)
+        return rate
+
+    @staticmethod
+    def delete_exchange_rate(instance: ExchangeRate) -> None:
+        instance.delete()
+        transaction.on_commit(ExchangeRateIndex.invalidate)
+
+
+class AccountBalanceService(BaseService):
+    @staticmethod
+    def signed_amount(amount: Decimal, category_type: str) -> Decimal:
+        """
+        Monto con signo según el tipo de categoría: positivo para ingresos, negativo para egresos
+        """
+        return amount if category_type == Category.TYPE_CHOICES[0][0] else -amount
+
+    @staticmethod
+    def signed_amount_expression(prefix: str = '') -> Case:
+        """
+        Expresión SQL equivalente a signed_amount; `prefix` es la ruta hasta la transacción
+        (por ejemplo 'transactions__' desde Account)
+        """
+        return Case(
+            When(**{f'{prefix}category__category_type': Category.TYPE_CHOICES[0][0]}, then=F(f'{prefix}amount')),
+            default=F(f'{prefix}amount') * Value(-1),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        )
+
+    @staticmethod
+    def totals_by_account(queryset: QuerySet[Transaction]) -> Dict[UUID, Tuple[Decimal, datetime]]:
+        """
+        Suma con signo y fecha más reciente de las transacciones del queryset, por cuenta
+        """
+        rows = queryset.order_by().values('account_id').annotate(
+            total=Sum(AccountBalanceService.signed_amount_expression()),
+            latest=Max('date'),
+        ).values_list('account_id', 'total', 'latest')
+        return {account_id: (total, latest) for account_id, total, latest in rows}
+
+    @staticmethod
+    def apply_totals_change(before: Dict[UUID, Tuple[Decimal, datetime]],
+                            after: Dict[UUID, Tuple[Decimal, datetime]]) -> None:
+        """
+        Aplica a los saldos la diferencia entre los totales por cuenta de un conjunto
+        de transacciones antes y después de una operación masiva
+        """
+        for account_id in before.keys() | after.keys():
+            old_total, old_latest = before.get(account_id, (Decimal('0'), None))
+            new_total, new_latest = after.get(account_id, (Decimal('0'), None))
+            AccountBalanceService.apply_delta(account_id, new_total - old_total,
+                                              added_at=new_latest, removed_at=old_latest)
+
+    @staticmethod
+    def apply_delta(account_id: UUID, delta: Decimal, added_at: Optional[datetime] = None,
+                    removed_at: Optional[datetime] = None) -> None:
+        """
+        Aplica un cambio incremental al saldo de una cuenta con un UPDATE atómico.
+        - added_at: fecha de una transacción que ahora cuenta para la cuenta.
+        - removed_at: fecha de una transacción que dejó de contar; si era la más reciente
+          se recalcula last_tx_at.
+        Debe llamarse después de escribir las transacciones y dentro de la misma transacción.
+        """
+        values: Dict[str, Any] = {'balance': F('balance') + delta}
+        if added_at is not None:
+            values['last_tx_at'] = Greatest(Coalesce('last_tx_at', Value(added_at)), Value(added_at))
+
+        balances = AccountBalance.objects.filter(account_id=account_id)
+        if not balances.update(**values):
+            # Cuenta sin saldo materializado: se construye desde cero e incluye ya el cambio
+            AccountBalanceService.rebuild(Account.objects.filter(id=account_id))
+            return
+
+        if removed_at is not None:
+            latest = Transaction.objects.filter(account_id=OuterRef('account_id')).order_by('-date').values('date')[:1]
+            balances.filter(last_tx_at__lte=removed_at).update(last_tx_at=Subquery(latest))
+
+    @staticmethod
+    def apply_deltas(deltas: Dict[UUID, Decimal], added_at: Optional[Dict[UUID, datetime]] = None) -> None:
+        """
+        Aplica los cambios agrupados por cuenta de un lote de transacciones
+        """
+        added_at = added_at or {}
+        for account_id, delta in deltas.items():
+            AccountBalanceService.apply_delta(account_id, delta, added_at=added_at.get(account_id))
+
+    @staticmethod
+    def rebuild(accounts: Optional[QuerySet[Account]] = None) -> int:
+        """
+        Recalcula desde cero los saldos de las cuentas indicadas (todas por defecto)
+        con una sola consulta agrupada y un upsert por lotes.
+        """
+        if accounts is None:
+            accounts = Account.objects.all()
+        totals = accounts.annotate(
+            total=Coalesce(
+                Sum(AccountBalanceService.signed_amount_expression('transactions__')),
+                Value(Decimal('0')),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+            last_tx=Max('transactions__date'),
+        ).values_list('id', 'currency_id', 'total', 'last_tx')
+
+        balances = [
+            AccountBalance(account_id=account_id, currency_id=currency_id, balance=total, last_tx_at=last_tx)
+            for account_id, currency_id, total, last_tx in totals
+        ]
+        AccountBalance.objects.bulk_create(
+            balances,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['account'],
+            update_fields=['currency', 'balance', 'last_tx_at', 'updated_at'],
+        )
+        return len(balances)
 
 
 class TransactionService(BaseService):
+    BULK_BATCH_SIZE = 1000
+    ROLLUP_FIELDS = {'account', 'category', 'amount', 'date'}
+
     @staticmethod
     def create_transaction(user: User, validated_data: Dict[str, Any]) -> Optional[Transaction]:
+        """
+        Los datos llegan validados por el serializer, que ya resolvió cuenta, categoría y
+        etiquetas filtrando por usuario; no se repite full_clean.
+        """
         tags_data = validated_data.pop('tags', [])
-        with transaction.atomic():
-            tx = Transaction.objects.create(user=user, **validated_data)
-            if tags_data:
-                tx.tags.add(*tags_data)
+        try:
+            with transaction.atomic():
+                tx = Transaction(user=user, **validated_data)
+                tx.save(clean=False)
+                if tags_data:
+                    tx.tags.add(*tags_data)
+                AccountBalanceService.apply_delta(
+                    tx.account_id,
+                    AccountBalanceService.signed_amount(tx.amount, tx.category.category_type),
+                    added_at=tx.date,
+                )
+                RollupService.add(Transaction.objects.filter(id=tx.id))
+                DataVersion.bump(user.pk)
+        except IntegrityError:
+            raise serializers.ValidationError('La cuenta y la categoría deben pertenecer al usuario.')
         return tx
 
     @staticmethod
     def update_transaction(instance, validated_data: Dict[str, Any]) -> Optional[Transaction]:
         tags_data = validated_data.pop('tags', None)
+        old_account_id = instance.account_id
+        old_amount = AccountBalanceService.signed_amount(instance.amount, instance.category.category_type)
+        old_date = instance.date
+        # Solo estos campos cambian el resumen de analíticas
+        affects_rollup = bool(TransactionService.ROLLUP_FIELDS.intersection(validated_data))
+        try:
+            with transaction.atomic():
+                if affects_rollup:
+                    RollupService.subtract(Transaction.objects.filter(id=instance.id))
+                for field, value in validated_data.items():
+                    setattr(instance, field, value)
+                instance.save(clean=False)
+                if tags_data is not None:
+                    instance.tags.set(tags_data)
+                TransactionService._apply_update_to_balances(instance, old_account_id, old_amount, old_date)
+                if affects_rollup:
+                    RollupService.add(Transaction.objects.filter(id=instance.id))
+                DataVersion.bump(instance.user_id)
+        except IntegrityError:
+            raise serializers.ValidationError('Error al actualizar la transacción.')
+        return instance
+
+    @staticmethod
+    def _apply_update_to_balances(tx: Transaction, old_account_id: UUID, old_amount: Decimal,
+                                  old_date: datetime) -> None:
+        new_amount = AccountBalanceService.signed_amount(tx.amount, tx.category.category_type)
+        if tx.account_id == old_account_id:
+            AccountBalanceService.apply_delta(
+                tx.account_id, new_amount - old_amount,
+                added_at=tx.date,
+                removed_at=old_date if old_date != tx.date else None,
+            )
+        else:
+            AccountBalanceService.apply_delta(old_account_id, -old_amount, removed_at=old_date)
+            AccountBalanceService.apply_delta(tx.account_id, new_amount, added_at=tx.date)
+
+    @staticmethod
+    def delete_transaction(instance: Transaction) -> None:
+        amount = AccountBalanceService.signed_amount(instance.amount, instance.category.category_type)
         with transaction.atomic():
-            # usa el helper genérico para campos simples
-            tx = BaseService._save_instance(
-                instance, validated_data,
-                'Error al actualizar la transacción.'
+            RollupService.subtract(Transaction.objects.filter(id=instance.id))
+            instance.delete()
+            AccountBalanceService.apply_delta(instance.account_id, -amount, removed_at=instance.date)
+            DataVersion.bump(instance.user_id)
+
+    @staticmethod
+    def bulk_update_transactions(queryset: QuerySet[Transaction], changes: Dict[str, Any]) -> int:
+        """
+        Aplica los mismos cambios a todas las transacciones seleccionadas con sentencias
+        por conjunto: un UPDATE para cuenta y categoría, un DELETE y un INSERT por lotes
+        en la tabla intermedia para las etiquetas. La pertenencia de la cuenta, la categoría
+        y las etiquetas ya la verificó el serializer una vez para todo el lote.
+        """
+        TagLink = Transaction.tags.through
+        with transaction.atomic():
+            rows = list(queryset.select_for_update().values_list('id', 'user_id'))
+            if not rows:
+                return 0
+            ids = [tx_id for tx_id, _ in rows]
+            DataVersion.bump(*{user_id for _, user_id in rows})
+            selected = Transaction.objects.filter(id__in=ids)
+
+            values: Dict[str, Any] = {
+                field: changes[field] for field in ('account', 'category') if field in changes
+            }
+            before = AccountBalanceService.totals_by_account(selected) if values else {}
+            if values:
+                RollupService.subtract(selected)
+            selected.update(updated_at=timezone.now(), **values)
+            if values:
+                AccountBalanceService.apply_totals_change(before, AccountBalanceService.totals_by_account(selected))
+                RollupService.add(selected)
+
+            if changes.get('remove_tags'):
+                TagLink.objects.filter(transaction_id__in=ids, tag__in=changes['remove_tags']).delete()
+            if changes.get('add_tags'):
+                TagLink.objects.bulk_create(
+                    [TagLink(transaction_id=tx_id, tag_id=tag.id) for tx_id in ids for tag in changes['add_tags']],
+                    batch_size=TransactionService.BULK_BATCH_SIZE,
+                    ignore_conflicts=True,
+                )
+        return len(ids)
+
+    @staticmethod
+    def bulk_delete_transactions(queryset: QuerySet[Transaction]) -> int:
+        """
+        Elimina las transacciones seleccionadas y sus enlaces a etiquetas con DELETE por
+        conjunto, descontando de una vez su efecto en los saldos de cada cuenta
+        """
+        with transaction.atomic():
+            rows = list(queryset.select_for_update().values_list('id', 'user_id'))
+            if not rows:
+                return 0
+            ids = [tx_id for tx_id, _ in rows]
+            DataVersion.bump(*{user_id for _, user_id in rows})
+            selected = Transaction.objects.filter(id__in=ids)
+            before = AccountBalanceService.totals_by_account(selected)
+            RollupService.subtract(selected)
+            Transaction.tags.through.objects.filter(transaction_id__in=ids).delete()
+            selected.only('id').delete()
+            AccountBalanceService.apply_totals_change(before, {})
+        return len(ids)
+
+    @staticmethod
+    def bulk_create_transactions(user: User, rows: List[Dict[str, Any]]) -> List[Transaction]:
+        """
+        Inserta un lote ya validado con bulk_create y enlaza todas las etiquetas
+        con una sola inserción por lotes en la tabla intermedia.
+        Las filas traen ids de cuenta, categoría y etiquetas ya verificados.
+        """
+        transactions = []
+        links = []
+        TagLink = Transaction.tags.through
+        for row in rows:
+            tx = Transaction(
+                user=user,
+                account_id=row['account'],
+                category_id=row['category'],
+                amount=row['amount'],
+                date=row['date'],
+                description=row.get('description', ''),
             )
-            if tags_data is not None:
-                tx.tags.set(tags_data)
-        return tx
+            transactions.append(tx)
+            links.extend(TagLink(transaction_id=tx.id, tag_id=tag_id) for tag_id in set(row.get('tags', [])))
+
+        category_types = dict(
+            Category.objects.filter(id__in={tx.category_id for tx in transactions}).values_list('id', 'category_type')
+        )
+        deltas: Dict[UUID, Decimal] = {}
+        latest: Dict[UUID, datetime] = {}
+        for tx in transactions:
+            amount = AccountBalanceService.signed_amount(tx.amount, category_types[tx.category_id])
+            deltas[tx.account_id] = deltas.get(tx.account_id, Decimal('0')) + amount
+            latest[tx.account_id] = max(latest.get(tx.account_id, tx.date), tx.date)
+
+        with transaction.atomic():
+            Transaction.objects.bulk_create(transactions, batch_size=TransactionService.BULK_BATCH_SIZE)
+            if links:
+                TagLink.objects.bulk_create(links, batch_size=TransactionService.BULK_BATCH_SIZE)
+            AccountBalanceService.apply_deltas(deltas, added_at=latest)
+            RollupService.add(Transaction.objects.filter(id__in=[tx.id for tx in transactions]))
+            DataVersion.bump(user.pk)
+        return transactions
 
 
 class BudgetService(BaseService):
     @staticmethod
     def create_budget(user: User, validated_data: Dict[str, Any]) -> Optional[Budget]:
         try:
-            return Budget.objects.create(user=user, **validated_data)
+            budget = Budget.objects.create(user=user, **validated_data)
         except IntegrityError:
             raise serializers.ValidationError('Ya existe un presupuesto para esta combinación.')
+        DataVersion.bump(user.pk)
+        return budget
 
     @staticmethod
     def update_budget(instance: Budget, validated_data: Dict[str, Any]) -> Optional[Budget]:
-        return BaseService._save_instance(
+        budget = BaseService._save_instance(
             instance,
             validated_data,
             {"non_field_errors": "Ya existe un presupuesto con esa combinación"}
         )
+        DataVersion.bump(budget.user_id)
+        return budget
+
+    STATUS_SQL = """
+        WITH expenses AS (
+            SELECT t.id, t.amount, a.currency_id, (t.date AT TIME ZONE %s)::date AS day
+            FROM {transaction} t
+            JOIN {category} c ON c.id = t.category_id AND c.category_type = %s
+            JOIN {account} a ON a.id = t.account_id
+            WHERE t.user_id = %s AND t.date >= %s AND t.date < %s
+        ),
+        matched AS (
+            -- tag_key 0: todos los egresos, para presupuestos sin etiqueta
+            SELECT e.amount, e.currency_id, e.day, 0 AS tag_key FROM expenses e
+            UNION ALL
+            SELECT e.amount, e.currency_id, e.day, link.tag_id FROM expenses e
+            JOIN {link} link ON link.transaction_id = e.id
+        )
+        SELECT b.id, b.amount, b.currency_id, cur.code, b.tags_id, tag.name,
+               m.currency_id, m.day, SUM(m.amount)
+        FROM {budget} b
+        JOIN {currency} cur ON cur.id = b.currency_id
+        LEFT JOIN {tag} tag ON tag.id = b.tags_id
+        LEFT JOIN matched m ON m.tag_key = COALESCE(b.tags_id, 0)
+        WHERE b.user_id = %s AND b.month = %s
+        GROUP BY b.id, cur.code, tag.name, m.currency_id, m.day
+        ORDER BY cur.code, tag.name NULLS FIRST, b.id
+    """
+
+    @staticmethod
+    def budget_status(user: User, month: date) -> List[Dict[str, Any]]:
+        """
+        Cada presupuesto del mes con lo gastado, lo que resta y el porcentaje usado.
+        Una sola consulta agrupada trae los presupuestos y sus egresos del mes (filtrados
+        por etiqueta a través de la tabla intermedia) sumados por moneda de la cuenta y día;
+        la conversión a la moneda del presupuesto se hace en memoria con ExchangeRateIndex.
+        Las cuentas sin moneda no se pueden convertir, como en las analíticas: sus egresos
+        no se suman y el presupuesto queda con `missing_rates`.
+        """
+        sql = BudgetService.STATUS_SQL.format(
+            transaction=Transaction._meta.db_table,
+            category=Category._meta.db_table,
+            account=Account._meta.db_table,
+            link=Transaction.tags.through._meta.db_table,
+            budget=Budget._meta.db_table,
+            currency=Currency._meta.db_table,
+            tag=Tag._meta.db_table,
+        )
+        lower, upper = day_bounds(month, BudgetService._month_end(month))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [
+                timezone.get_current_timezone_name(), Category.TYPE_CHOICES[1][0], user.pk, lower, upper,
+                user.pk, month,
+            ])
+            rows = cursor.fetchall()
+
+        budgets: Dict[int, Dict[str, Any]] = {}
+        for budget_id, amount, currency_id, code, tag_id, tag_name, spent_currency, day, total in rows:
+            budget = budgets.setdefault(budget_id, {
+                'id': budget_id,
+                'month': month,
+                'currency': code,
+                'tag': tag_id,
+                'tag_name': tag_name,
+                'amount': amount,
+                'spent': Decimal('0.00'),
+                'missing_rates': False,
+            })
+            if total is None:
+                continue
+            converted = None if spent_currency is None else ExchangeRateIndex.convert(
+                total, spent_currency, currency_id, day
+            )
+            if converted is None:
+                budget['missing_rates'] = True
+            else:
+                budget['spent'] += converted
+
+        for budget in budgets.values():
+            budget['remaining'] = budget['amount'] - budget['spent']
+            budget['percentage'] = (
+                (budget['spent'] * 100 / budget['amount']).quantize(Decimal('0.01')) if budget['amount'] else None
+            )
+        return list(budgets.values())
+
+    @staticmethod
+    def _month_end(month: date) -> date:
+        next_month = month.replace(day=28) + timedelta(days=4)
+        return next_month - timedelta(days=next_month.day)
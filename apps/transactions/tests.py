@@ -1,3 +1,702 @@
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.accounts.models import User
+from apps.analytics.cache import DataVersion
+from .exports import TransactionExporter
+from .filters import TransactionFilterBackend
+from .models import AccountBalance, Budget, Category, Currency, ExchangeRate, Tag, Transaction
+from .pagination import TransactionCursorPagination
+from .rates import ExchangeRateIndex
+from .serializers import TransactionBulkSerializer
+from .services import (
+    AccountBalanceService, AccountService, BudgetService, ExchangeRateService, TransactionService
+)
+
+
+class TransactionWritePathQueryCountTests(TestCase):
+    """
+    Costo en consultas de crear una transacción.
+    Antes, Transaction.save() siempre llamaba a full_clean(): existencia de usuario, cuenta
+    y categoría, carga de los usuarios dueños de la cuenta y de la categoría y unicidad de
+    la pk. Un POST a /api/transactions/ costaba 15 consultas; ahora la pertenencia se
+    resuelve una vez en el serializer y la garantizan las FK compuestas.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='owner@example.com', password='secret')
+        cls.account = AccountService.create_account(cls.user, {'name': 'Banco'})
+        cls.category = Category.objects.create(user=cls.user, name='Sueldo')
+        cls.tag = Tag.objects.create(user=cls.user, name='fijo')
+
+    def _data(self):
+        return {
+            'account': self.account,
+            'category': self.category,
+            'amount': Decimal('10.00'),
+            'date': timezone.now(),
+        }
+
+    def test_validated_save_query_count(self):
+        # save() sin argumentos mantiene full_clean(): cuatro SELECT antes del INSERT
+        with self.assertNumQueries(5):
+            tx = Transaction(user=self.user, **self._data())
+            tx.save()
+
+    def test_service_create_query_count(self):
+        # SAVEPOINT, INSERT, INSERT de etiquetas, UPDATE del saldo, upsert del resumen, RELEASE
+        with self.assertNumQueries(6):
+            TransactionService.create_transaction(self.user, {**self._data(), 'tags': [self.tag]})
+
+    def test_api_create_query_count(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        payload = {
+            'account': str(self.account.id),
+            'category': str(self.category.id),
+            'amount': '10.00',
+            'date': timezone.now().isoformat(),
+            'tags': [self.tag.id],
+        }
+        # cuenta, categoría y etiquetas resueltas una vez por el serializer,
+        # la escritura y la lectura de etiquetas para la respuesta
+        with self.assertNumQueries(10):
+            response = client.post('/api/transactions/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_database_rejects_foreign_account(self):
+        other = User.objects.create_user(email='other@example.com', password='secret')
+        tx = Transaction(user=other, **self._data())
+        with self.assertRaises(IntegrityError):
+            tx.save(clean=False)
+
+
+class TransactionFilterIndexTests(TestCase):
+    """
+    Verifica con EXPLAIN que cada combinación habitual de filtros del listado
+    se resuelve con su índice compuesto sobre un volumen grande de datos.
+    """
+    ROWS = 50000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='filters@example.com', password='secret')
+        cls.accounts = [AccountService.create_account(cls.user, {'name': f'Cuenta {i}'}) for i in range(5)]
+        cls.categories = [
+            Category.objects.create(user=cls.user, name=f'Categoria {i}', category_type=category_type)
+            for i, category_type in enumerate(['INGRESO', 'EGRESO'] * 4)
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO transactions_transaction
+                    (id, user_id, account_id, category_id, amount, date, description, created_at, updated_at)
+                SELECT gen_random_uuid(), %s,
+                       (%s::uuid[])[1 + i %% %s],
+                       (%s::uuid[])[1 + (i / 7) %% %s],
+                       round((random() * 1000 + 1)::numeric, 2),
+                       now() - random() * interval '1095 days',
+                       '', now(), now()
+                FROM generate_series(1, %s) AS i
+                """,
+                [
+                    str(cls.user.id),
+                    [str(account.id) for account in cls.accounts], len(cls.accounts),
+                    [str(category.id) for category in cls.categories], len(cls.categories),
+                    cls.ROWS,
+                ]
+            )
+            cursor.execute('ANALYZE transactions_transaction')
+
+    def _plan(self, **params) -> str:
+        queryset = TransactionFilterBackend.apply(self.user.transactions.all(), params, self.user)
+        return queryset.order_by(*TransactionCursorPagination.ordering)[:51].explain()
+
+    def _month(self):
+        start = timezone.localdate() - timedelta(days=400)
+        return {'start': start.isoformat(), 'end': (start + timedelta(days=30)).isoformat()}
+
+    def assertUsesIndex(self, plan: str, index: str):
+        self.assertIn(index, plan)
+        self.assertNotIn('Seq Scan on transactions_transaction ', plan)
+
+    def test_date_range(self):
+        self.assertUsesIndex(self._plan(**self._month()), 'transaction_user_date_idx')
+
+    def test_account_and_date_range(self):
+        plan = self._plan(account=str(self.accounts[1].id), **self._month())
+        self.assertUsesIndex(plan, 'transaction_user_account_idx')
+
+    def test_category_and_date_range(self):
+        plan = self._plan(category=str(self.categories[3].id), **self._month())
+        self.assertUsesIndex(plan, 'transaction_user_category_idx')
+
+    def test_category_type_and_date_range(self):
+        plan = self._plan(category_type='INGRESO', **self._month())
+        self.assertNotIn('Seq Scan on transactions_transaction ', plan)
+
+    def test_amount_range(self):
+        plan = self._plan(amount_min='500.00', amount_max='501.00')
+        self.assertUsesIndex(plan, 'transaction_user_amount_idx')
+
+    def test_date_filter_is_a_half_open_timestamp_range(self):
+        plan = self._plan(**self._month())
+        self.assertNotIn('date_trunc', plan)
+        self.assertNotIn('AT TIME ZONE', plan)
+
+
+class OwnerListQueryCountTests(TestCase):
+    """
+    Los listados ejecutan el mismo número de consultas sin importar el tamaño de la página.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='lists@example.com', password='secret')
+        cls.account = AccountService.create_account(cls.user, {'name': 'Banco'})
+        cls.category = Category.objects.create(user=cls.user, name='Sueldo')
+        cls.tags = [Tag.objects.create(user=cls.user, name=f'etiqueta {i}') for i in range(3)]
+        for i in range(30):
+            AccountService.create_account(cls.user, {'name': f'Cuenta {i}'})
+            TransactionService.create_transaction(cls.user, {
+                'account': cls.account,
+                'category': cls.category,
+                'amount': Decimal('1.00'),
+                'date': timezone.now() - timedelta(hours=i),
+                'tags': cls.tags,
+            })
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_transaction_list_queries_do_not_grow_with_page_size(self):
+        # transacciones y etiquetas de la página
+        for page_size in (5, 30):
+            with self.assertNumQueries(2):
+                response = self.client.get('/api/transactions/', {'page_size': page_size})
+            self.assertEqual(len(response.data['results']), page_size)
+            self.assertEqual(len(response.data['results'][0]['tags']), 3)
+
+    def test_account_list_reads_balances_in_the_same_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/accounts/')
+        self.assertEqual(len(response.data), 31)
+        self.assertEqual(response.data[0]['balance'], '30.00')
+
+
+class ExchangeRateIndexTests(TestCase):
+    """
+    Tasas en una fecha desde el índice en memoria: directas, inversas y cruzadas
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usd = Currency.objects.create(code='USD', name='Dolar', symbol='$')
+        cls.eur = Currency.objects.create(code='EUR', name='Euro', symbol='E')
+        cls.pyg = Currency.objects.create(code='PYG', name='Guarani', symbol='G')
+        ExchangeRate.objects.create(base_currency=cls.eur, target_currency=cls.usd, rate=2, date=date(2025, 1, 1))
+        ExchangeRate.objects.create(base_currency=cls.eur, target_currency=cls.usd, rate=4, date=date(2025, 3, 1))
+        ExchangeRate.objects.create(base_currency=cls.usd, target_currency=cls.pyg, rate=7000, date=date(2025, 1, 1))
+
+    def setUp(self):
+        ExchangeRateIndex.invalidate()
+
+    def test_as_of_direct_inverse_and_cross_rates(self):
+        self.assertEqual(ExchangeRateIndex.rate(self.eur, self.usd, date(2025, 2, 28)), Decimal('2'))
+        self.assertEqual(ExchangeRateIndex.rate(self.eur, self.usd, date(2025, 3, 1)), Decimal('4'))
+        self.assertEqual(ExchangeRateIndex.rate(self.usd, self.eur, date(2025, 3, 5)), Decimal('0.25'))
+        self.assertEqual(ExchangeRateIndex.rate(self.eur, self.pyg, date(2025, 2, 1)), Decimal('14000'))
+        self.assertIsNone(ExchangeRateIndex.rate(self.eur, self.usd, date(2024, 12, 31)))
+        self.assertEqual(ExchangeRateIndex.convert(Decimal('3.50'), self.eur, self.pyg, date(2025, 2, 1)),
+                         Decimal('49000.00'))
+
+    def test_warm_lookups_do_not_query(self):
+        ExchangeRateIndex.rate(self.eur, self.usd, date(2025, 2, 1))
+        with self.assertNumQueries(0):
+            for _ in range(100):
+                ExchangeRateIndex.rate(self.eur, self.pyg, date(2025, 2, 1))
+
+    def test_service_writes_invalidate_the_index(self):
+        self.assertEqual(ExchangeRateIndex.rate(self.eur, self.usd, date(2025, 2, 10)), Decimal('2'))
+        with self.captureOnCommitCallbacks(execute=True):
+            ExchangeRateService.create_exchange_rate({
+                'base_currency': self.eur, 'target_currency': self.usd, 'rate': Decimal('3'), 'date': date(2025, 2, 10),
+            })
+        self.assertEqual(ExchangeRateIndex.rate(self.eur, self.usd, date(2025, 2, 10)), Decimal('3'))
+
+    def test_database_rejects_non_positive_rates(self):
+        for rate in ('0', '-1'):
+            with self.subTest(rate=rate), self.assertRaises(IntegrityError), transaction.atomic():
+                ExchangeRate.objects.create(base_currency=self.usd, target_currency=self.eur, rate=Decimal(rate),
+                                            date=date(2025, 4, 1))
+
+
+class BudgetStatusTests(TestCase):
+    """
+    Presupuestos contra gasto real en una sola consulta, sin importar cuántos haya
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='budgets@example.com', password='secret')
+        cls.usd = Currency.objects.create(code='USD', name='Dolar', symbol='$')
+        cls.eur = Currency.objects.create(code='EUR', name='Euro', symbol='E')
+        ExchangeRate.objects.create(base_currency=cls.eur, target_currency=cls.usd, rate=2, date=date(2025, 1, 1))
+        cls.dollars = AccountService.create_account(cls.user, {'name': 'Dolares', 'currency': cls.usd})
+        cls.euros = AccountService.create_account(cls.user, {'name': 'Euros', 'currency': cls.eur})
+        cls.expense = Category.objects.create(user=cls.user, name='Comida', category_type='EGRESO')
+        cls.income = Category.objects.create(user=cls.user, name='Sueldo', category_type='INGRESO')
+        cls.tags = [Tag.objects.create(user=cls.user, name=f'etiqueta {i}') for i in range(30)]
+        month = date(2025, 3, 1)
+        Budget.objects.create(user=cls.user, currency=cls.usd, month=month, amount=Decimal('500.00'))
+        for tag in cls.tags:
+            Budget.objects.create(user=cls.user, currency=cls.usd, tags=tag, month=month, amount=Decimal('100.00'))
+
+        def create(account, amount, tags, category=None):
+            TransactionService.create_transaction(cls.user, {
+                'account': account, 'category': category or cls.expense, 'amount': Decimal(amount),
+                'date': timezone.make_aware(datetime(2025, 3, 10, 12)), 'tags': tags,
+            })
+
+        create(cls.dollars, '10.00', cls.tags[:2])
+        create(cls.euros, '10.00', cls.tags[:1])
+        create(cls.dollars, '7.00', [])
+        create(cls.dollars, '1000.00', cls.tags[:1], cls.income)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        ExchangeRateIndex.invalidate()
+        ExchangeRateIndex.load()
+
+    def test_status_is_one_query(self):
+        with self.assertNumQueries(1):
+            statuses = BudgetService.budget_status(self.user, date(2025, 3, 1))
+        self.assertEqual(len(statuses), 31)
+        by_tag = {status['tag']: status for status in statuses}
+        # 10 USD + 10 EUR a 2, el ingreso no cuenta
+        self.assertEqual(by_tag[self.tags[0].id]['spent'], Decimal('30.00'))
+        self.assertEqual(by_tag[self.tags[0].id]['percentage'], Decimal('30.00'))
+        self.assertEqual(by_tag[self.tags[1].id]['spent'], Decimal('10.00'))
+        self.assertEqual(by_tag[self.tags[2].id]['spent'], Decimal('0.00'))
+        # el presupuesto sin etiqueta cuenta todos los egresos una sola vez
+        self.assertEqual(by_tag[None]['spent'], Decimal('37.00'))
+        self.assertEqual(by_tag[None]['remaining'], Decimal('463.00'))
+
+    def test_accounts_without_currency_are_missing_rates(self):
+        cash = AccountService.create_account(self.user, {'name': 'Efectivo'})
+        TransactionService.create_transaction(self.user, {
+            'account': cash, 'category': self.expense, 'amount': Decimal('5.00'),
+            'date': timezone.make_aware(datetime(2025, 3, 11, 12)), 'tags': [self.tags[2]],
+        })
+        by_tag = {status['tag']: status for status in BudgetService.budget_status(self.user, date(2025, 3, 1))}
+        # el monto no se toma como si estuviera en dólares
+        self.assertEqual(by_tag[self.tags[2].id]['spent'], Decimal('0.00'))
+        self.assertTrue(by_tag[self.tags[2].id]['missing_rates'])
+        self.assertEqual(by_tag[None]['spent'], Decimal('37.00'))
+        self.assertTrue(by_tag[None]['missing_rates'])
+        self.assertFalse(by_tag[self.tags[0].id]['missing_rates'])
+
+    def test_status_endpoint(self):
+        response = self.client.get('/api/budgets/status/', {'month': '2025-03'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 31)
+        self.assertEqual(self.client.get('/api/budgets/status/', {'month': 'marzo'}).status_code, 400)
+
+
+class BulkCreateApiTests(TestCase):
+    """
+    Carga masiva: el lote se valida completo, con la pertenencia resuelta en una
+    consulta por modelo, y se inserta con un número de consultas que no depende del
+    tamaño del lote
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='bulk@example.com', password='secret')
+        cls.account = AccountService.create_account(cls.user, {'name': 'Banco'})
+        cls.income = Category.objects.create(user=cls.user, name='Sueldo', category_type='INGRESO')
+        cls.expense = Category.objects.create(user=cls.user, name='Comida', category_type='EGRESO')
+        cls.tag = Tag.objects.create(user=cls.user, name='fijo')
+        cls.other = User.objects.create_user(email='bulk-other@example.com', password='secret')
+        cls.other_account = AccountService.create_account(cls.other, {'name': 'Ajena'})
+        cls.other_category = Category.objects.create(user=cls.other, name='Ajena')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _row(self, **values):
+        return {
+            'account': str(self.account.id),
+            'category': str(self.expense.id),
+            'amount': '10.00',
+            'date': '2025-03-01T12:00:00Z',
+            **values,
+        }
+
+    def _post(self, rows):
+        return self.client.post('/api/transactions/bulk/', rows, format='json')
+
+    def test_creates_rows_and_updates_balance(self):
+        rows = [self._row(tags=[self.tag.id]), self._row(category=str(self.income.id), amount='100.00')]
+        response = self._post(rows)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Tag.objects.get(id=self.tag.id).transactions.count(), 1)
+        self.assertEqual(AccountBalance.objects.get(account=self.account).balance, Decimal('90.00'))
+
+    def test_accepts_ndjson(self):
+        body = ''.join(json.dumps(row) + '\n' for row in (self._row(), self._row(amount='5.00')))
+        response = self.client.post('/api/transactions/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+
+    def test_rejects_accounts_and_categories_of_other_users(self):
+        response = self._post([
+            self._row(),
+            self._row(account=str(self.other_account.id)),
+            self._row(category=str(self.other_category.id)),
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data['rows']), {1, 2})
+        self.assertIn('account', response.data['rows'][1])
+        self.assertIn('category', response.data['rows'][2])
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_reports_errors_per_row(self):
+        response = self._post([self._row(), self._row(amount='0'), self._row(date='2999-01-01T00:00:00Z')])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('amount', response.data[1])
+        self.assertIn('date', response.data[2])
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_rejects_empty_and_oversized_batches(self):
+        self.assertEqual(self._post([]).status_code, 400)
+        with mock.patch.object(TransactionBulkSerializer, 'MAX_ROWS', 2):
+            self.assertEqual(self._post([self._row()] * 3).status_code, 400)
+            self.assertEqual(self._post([self._row()] * 2).status_code, 201)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        for size in (2, 50):
+            rows = [self._row(tags=[self.tag.id], amount=f'{index + 1}.00') for index in range(size)]
+            # pertenencia de cuentas, categorías y etiquetas, tipos de categoría, SAVEPOINT,
+            # INSERT de transacciones y de etiquetas, UPDATE del saldo, upsert del resumen, RELEASE
+            with self.assertNumQueries(10):
+                response = self._post(rows)
+            self.assertEqual(response.data['created'], size)
+
+
+class BulkUpdateDeleteApiTests(TestCase):
+    """
+    Cambios y borrados masivos sobre una selección por ids o por filtros: solo alcanzan
+    transacciones del usuario y ajustan saldos y versión de datos como las escrituras
+    individuales
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='bulk-edit@example.com', password='secret')
+        cls.bank = AccountService.create_account(cls.user, {'name': 'Banco'})
+        cls.cash = AccountService.create_account(cls.user, {'name': 'Efectivo'})
+        cls.income = Category.objects.create(user=cls.user, name='Sueldo', category_type='INGRESO')
+        cls.expense = Category.objects.create(user=cls.user, name='Comida', category_type='EGRESO')
+        cls.tag = Tag.objects.create(user=cls.user, name='fijo')
+        cls.transactions = [
+            TransactionService.create_transaction(cls.user, {
+                'account': cls.bank, 'category': cls.expense, 'amount': Decimal(amount),
+                'date': timezone.make_aware(datetime(2025, 3, day, 12)),
+            })
+            for amount, day in (('10.00', 1), ('20.00', 2), ('30.00', 3))
+        ]
+        cls.other = User.objects.create_user(email='bulk-edit-other@example.com', password='secret')
+        other_account = AccountService.create_account(cls.other, {'name': 'Ajena'})
+        cls.other_category = Category.objects.create(user=cls.other, name='Ajena', category_type='EGRESO')
+        cls.foreign = TransactionService.create_transaction(cls.other, {
+            'account': other_account, 'category': cls.other_category, 'amount': Decimal('5.00'),
+            'date': timezone.make_aware(datetime(2025, 3, 1, 12)),
+        })
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _ids(self, *transactions):
+        return [str(tx.id) for tx in transactions]
+
+    def _balance(self, account):
+        return AccountBalance.objects.get(account=account).balance
+
+    def test_validation_errors(self):
+        first = self.transactions[0]
+        for payload in (
+            {'category': str(self.income.id)},
+            {'ids': self._ids(first), 'filter': {'start': '2025-03-01'}, 'category': str(self.income.id)},
+            {'ids': self._ids(first)},
+            {'filter': {'start': 'marzo'}, 'category': str(self.income.id)},
+            {'ids': self._ids(first), 'category': str(self.other_category.id)},
+        ):
+            self.assertEqual(self.client.post('/api/transactions/bulk-update/', payload, format='json').status_code,
+                             400, payload)
+        self.assertEqual(self.client.post('/api/transactions/bulk-delete/', {}, format='json').status_code, 400)
+        self.assertEqual(Transaction.objects.get(id=first.id).category_id, self.expense.id)
+
+    def test_selection_only_reaches_own_transactions(self):
+        response = self.client.post('/api/transactions/bulk-update/', {
+            'ids': self._ids(self.transactions[0], self.foreign), 'add_tags': [self.tag.id],
+        }, format='json')
+        self.assertEqual(response.data, {'updated': 1})
+        response = self.client.post('/api/transactions/bulk-delete/', {'ids': self._ids(self.foreign)}, format='json')
+        self.assertEqual(response.data, {'deleted': 0})
+        self.assertTrue(Transaction.objects.filter(id=self.foreign.id).exists())
+        self.assertFalse(self.foreign.tags.exists())
+
+    def test_update_moves_balances_and_bumps_data_version(self):
+        version = DataVersion.get(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/transactions/bulk-update/', {
+                'filter': {'start': '2025-03-02'}, 'account': str(self.cash.id), 'category': str(self.income.id),
+                'add_tags': [self.tag.id],
+            }, format='json')
+        self.assertEqual(response.data, {'updated': 2})
+        self.assertEqual(self._balance(self.bank), Decimal('-10.00'))
+        self.assertEqual(self._balance(self.cash), Decimal('50.00'))
+        self.assertEqual(self.tag.transactions.count(), 2)
+        self.assertGreater(DataVersion.get(self.user.pk), version)
+
+        response = self.client.post('/api/transactions/bulk-update/', {
+            'ids': self._ids(*self.transactions), 'remove_tags': [self.tag.id],
+        }, format='json')
+        self.assertEqual(response.data, {'updated': 3})
+        self.assertFalse(self.tag.transactions.exists())
+
+    def test_delete_restores_balances_and_bumps_data_version(self):
+        version = DataVersion.get(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/transactions/bulk-delete/', {
+                'ids': self._ids(*self.transactions[1:]),
+            }, format='json')
+        self.assertEqual(response.data, {'deleted': 2})
+        self.assertEqual(self._balance(self.bank), Decimal('-10.00'))
+        self.assertEqual(AccountBalance.objects.get(account=self.bank).last_tx_at, self.transactions[0].date)
+        self.assertGreater(DataVersion.get(self.user.pk), version)
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1)
+
+
+class TransactionExportTests(TestCase):
+    """
+    Exportación en streaming: mismo contenido que el listado filtrado, leído con un
+    cursor del lado del servidor en una sola consulta
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='export@example.com', password='secret')
+        cls.bank = AccountService.create_account(cls.user, {'name': 'Banco'})
+        cls.cash = AccountService.create_account(cls.user, {'name': 'Efectivo'})
+        cls.expense = Category.objects.create(user=cls.user, name='Comida', category_type='EGRESO')
+        tags = [Tag.objects.create(user=cls.user, name=name) for name in ('super', 'casa')]
+        cls.transactions = [
+            TransactionService.create_transaction(cls.user, {
+                'account': account, 'category': cls.expense, 'amount': Decimal(f'{day}.50'),
+                'date': timezone.make_aware(datetime(2025, 3, day, 12)), 'description': f'Compra, {day}',
+                'tags': tags if day == 1 else [],
+            })
+            for day, account in zip(range(1, 6), (cls.bank, cls.cash) * 3)
+        ]
+        other = User.objects.create_user(email='export-other@example.com', password='secret')
+        TransactionService.create_transaction(other, {
+            'account': AccountService.create_account(other, {'name': 'Ajena'}),
+            'category': Category.objects.create(user=other, name='Ajena'),
+            'amount': Decimal('1.00'), 'date': timezone.now(),
+        })
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _export(self, **params):
+        response = self.client.get('/api/transactions/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_header_and_rows(self):
+        response, content = self._export()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('transacciones.csv', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(tuple(rows[0]), TransactionExporter.COLUMNS)
+        # las más recientes primero y nada de otros usuarios
+        self.assertEqual([row[0] for row in rows[1:]], [str(tx.id) for tx in reversed(self.transactions)])
+        first = self.transactions[0]
+        self.assertEqual(rows[-1], [
+            str(first.id), first.date.isoformat(), '1.50', 'EGRESO', 'Comida', 'Banco', 'casa|super', 'Compra, 1',
+        ])
+
+    def test_filters_pass_through(self):
+        _, content = self._export(account=str(self.cash.id), start='2025-03-03')
+        rows = list(csv.reader(io.StringIO(content)))[1:]
+        self.assertEqual([row[2] for row in rows], ['4.50'])
+        # los errores se serializan como JSON aunque el formato negociado sea CSV
+        response = self.client.get('/api/transactions/export/', {'start': 'marzo'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('start', json.loads(response.content))
+
+    def test_ndjson(self):
+        response, content = self._export(format='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(records), 5)
+        self.assertEqual((records[-1]['amount'], records[-1]['tags']), ('1.50', ['casa', 'super']))
+
+    def test_streaming_reads_in_one_query(self):
+        with mock.patch.object(TransactionExporter, 'CHUNK_SIZE', 2):
+            response = self.client.get('/api/transactions/export/')
+            # el cursor se recorre de a CHUNK_SIZE filas sin volver a consultar
+            with self.assertNumQueries(1):
+                lines = list(response.streaming_content)
+        self.assertEqual(len(lines), 6)
+
+
+class TransactionCursorPaginationTests(TestCase):
+    """
+    El cursor desempata por created_at e id: recorrer hacia adelante y hacia atrás
+    entrega cada fila una sola vez aunque compartan fecha y hora de creación
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='cursor@example.com', password='secret')
+        account = AccountService.create_account(cls.user, {'name': 'Banco'})
+        category = Category.objects.create(user=cls.user, name='Sueldo')
+        for index in range(8):
+            TransactionService.create_transaction(cls.user, {
+                'account': account, 'category': category, 'amount': Decimal(index + 1), 'date': timezone.now(),
+            })
+        moment = timezone.make_aware(datetime(2025, 3, 1, 12))
+        # dos grupos con la misma fecha y el mismo created_at
+        ids = list(Transaction.objects.order_by('id').values_list('id', flat=True))
+        Transaction.objects.filter(id__in=ids[:5]).update(date=moment, created_at=moment)
+        Transaction.objects.filter(id__in=ids[5:]).update(date=moment - timedelta(days=1), created_at=moment)
+        cls.expected = [str(pk) for pk in sorted(ids[:5], reverse=True) + sorted(ids[5:], reverse=True)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _page(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_next_and_previous_traversal(self):
+        pages = [self._page('/api/transactions/', page_size=3)]
+        while pages[-1]['next']:
+            pages.append(self._page(pages[-1]['next']))
+        self.assertEqual([len(page['results']) for page in pages], [3, 3, 2])
+        self.assertEqual([row['id'] for page in pages for row in page['results']], self.expected)
+        self.assertIsNone(pages[0]['previous'])
+
+        backwards = [pages[-1]]
+        while backwards[-1]['previous']:
+            backwards.append(self._page(backwards[-1]['previous']))
+        self.assertEqual([[row['id'] for row in page['results']] for page in reversed(backwards)],
+                         [[row['id'] for row in page['results']] for page in pages])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/transactions/', {'cursor': 'basura'}).status_code, 404)
+
+
+class AccountBalanceTests(TestCase):
+    """
+    El saldo materializado sigue cada alta, edición y baja, y reconcile_balances lo
+    reconstruye desde las transacciones
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='balances@example.com', password='secret')
+        cls.bank = AccountService.create_account(cls.user, {'name': 'Banco'})
+        cls.cash = AccountService.create_account(cls.user, {'name': 'Efectivo'})
+        cls.income = Category.objects.create(user=cls.user, name='Sueldo', category_type='INGRESO')
+        cls.expense = Category.objects.create(user=cls.user, name='Comida', category_type='EGRESO')
+
+    def _create(self, amount, day, category=None, account=None):
+        return TransactionService.create_transaction(self.user, {
+            'account': account or self.bank, 'category': category or self.income, 'amount': Decimal(amount),
+            'date': timezone.make_aware(datetime(2025, 3, day, 12)),
+        })
+
+    def _balance(self, account=None):
+        balance = AccountBalance.objects.get(account=account or self.bank)
+        return balance.balance, balance.last_tx_at
+
+    def test_create_adds_signed_amount_and_latest_date(self):
+        first = self._create('100.00', 5)
+        self._create('30.00', 2, self.expense)
+        self.assertEqual(self._balance(), (Decimal('70.00'), first.date))
+
+    def test_update_applies_the_difference(self):
+        first = self._create('100.00', 1)
+        latest = self._create('30.00', 9, self.expense)
+
+        TransactionService.update_transaction(latest, {'amount': Decimal('50.00')})
+        self.assertEqual(self._balance(), (Decimal('50.00'), latest.date))
+
+        # la más reciente pasa a otra fecha anterior: last_tx_at se recalcula
+        TransactionService.update_transaction(latest, {'date': timezone.make_aware(datetime(2025, 3, 3, 12))})
+        self.assertEqual(self._balance(), (Decimal('50.00'), latest.date))
+
+        TransactionService.update_transaction(first, {'category': self.expense})
+        self.assertEqual(self._balance()[0], Decimal('-150.00'))
+
+        TransactionService.update_transaction(latest, {'account': self.cash})
+        self.assertEqual(self._balance(), (Decimal('-100.00'), first.date))
+        self.assertEqual(self._balance(self.cash), (Decimal('-50.00'), latest.date))
+
+    def test_delete_removes_amount_and_recomputes_latest_date(self):
+        first = self._create('100.00', 1)
+        latest = self._create('30.00', 9, self.expense)
+        TransactionService.delete_transaction(latest)
+        self.assertEqual(self._balance(), (Decimal('100.00'), first.date))
+        TransactionService.delete_transaction(first)
+        self.assertEqual(self._balance(), (Decimal('0.00'), None))
+
+    def test_apply_delta_rebuilds_a_missing_balance(self):
+        self._create('100.00', 1)
+        AccountBalance.objects.filter(account=self.bank).delete()
+        AccountBalanceService.apply_delta(self.bank.id, Decimal('100.00'))
+        self.assertEqual(self._balance()[0], Decimal('100.00'))
+
+    def test_reconcile_balances(self):
+        latest = self._create('100.00', 4)
+        self._create('40.00', 2, self.expense, self.cash)
+        other = User.objects.create_user(email='balances-other@example.com', password='secret')
+        other_account = AccountService.create_account(other, {'name': 'Ajena'})
+        AccountBalance.objects.update(balance=Decimal('999.00'), last_tx_at=None)
+
+        output = io.StringIO()
+        call_command('reconcile_balances', user=self.user.email, stdout=output)
+        self.assertIn('2 saldos reconciliados', output.getvalue())
+        self.assertEqual(self._balance(), (Decimal('100.00'), latest.date))
+        self.assertEqual(self._balance(self.cash)[0], Decimal('-40.00'))
+        self.assertEqual(self._balance(other_account)[0], Decimal('999.00'))
 
-# Create your tests here.
+        call_command('reconcile_balances', stdout=io.StringIO())
+        self.assertEqual(self._balance(other_account), (Decimal('0.00'), None))
@@ -1,26 +1,65 @@
-from rest_framework import viewsets, permissions
+from datetime import date
+from typing import Sequence
 
+from django.db.models import Prefetch
+from django.utils import timezone
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+
+from apps.analytics.cache import DataVersion
 from .models import (
     Account, Category, Tag,
     Transaction, Budget,
     Currency, ExchangeRate
 )
+from .exports import TransactionExporter, stream_response
+from .filters import TransactionFilterBackend
+from .pagination import TransactionCursorPagination
+from .parsers import NDJSONParser
+from .renderers import CSVRenderer, NDJSONRenderer
 from .serializers import (
     AccountSerializer, CategorySerializer, TagSerializer,
-    TransactionSerializer, BudgetSerializer,
+    TransactionSerializer, TransactionBulkSerializer, TransactionBulkUpdateSerializer,
+    TransactionSelectionSerializer, BudgetSerializer, BudgetStatusSerializer,
     CurrencySerializer, ExchangeRateSerializer
 )
+from .services import BudgetService, ExchangeRateService, TransactionService
 
 
 class IsOwnerMixin:
     """
     Mixin para filtrar el queryset por el usuario autenticado.
     Solo para aquellos modelos que tengan FK user.
+    Cada viewset declara la forma de su queryset para que las lecturas ejecuten
+    un número constante de consultas sin importar el tamaño de la página:
+        - queryset_select_related: FK que el serializer lee, en el mismo JOIN
+        - queryset_prefetch_related: M2M que el serializer lee, en una consulta por relación
+        - queryset_defer: columnas que el serializer no usa
     """
+    queryset_select_related: Sequence[str] = ()
+    queryset_prefetch_related: Sequence[str | Prefetch] = ()
+    queryset_defer: Sequence[str] = ('user',)
 
     def get_queryset(self):
-        # espera que el modelo tenga related_name 'accounts', 'categories', etc.
-        return self.request.user.__getattribute__(self.basename + 's').all()
+        # se filtra por el modelo del viewset y no con el related manager del usuario, que
+        # asignaría el usuario a cada fila y necesitaría la columna user_id diferida
+        queryset = self.queryset.model.objects.filter(user=self.request.user)
+        if self.queryset_select_related:
+            queryset = queryset.select_related(*self.queryset_select_related)
+        # las escrituras recargan las relaciones para la respuesta y pueden necesitar todas las columnas
+        if self.request.method in permissions.SAFE_METHODS:
+            if self.queryset_prefetch_related:
+                queryset = queryset.prefetch_related(*self.queryset_prefetch_related)
+            if self.queryset_defer:
+                queryset = queryset.defer(*self.queryset_defer)
+        return queryset
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        # las analíticas cacheadas del usuario dejan de ser válidas
+        DataVersion.bump(instance.user_id)
 
 
 class AccountViewSet(IsOwnerMixin, viewsets.ModelViewSet):
@@ -30,6 +69,8 @@ class AccountViewSet(IsOwnerMixin, viewsets.ModelViewSet):
     queryset = Account.objects.none()  # se ignora en favor de get_queryset()
     serializer_class = AccountSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # el saldo materializado viaja en la misma consulta
+    queryset_select_related = ('balance',)
 
 
 class CategoryViewSet(IsOwnerMixin, viewsets.ModelViewSet):
@@ -57,6 +98,76 @@ class TransactionViewSet(IsOwnerMixin, viewsets.ModelViewSet):
     queryset = Transaction.objects.none()
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TransactionCursorPagination
+    filter_backends = [TransactionFilterBackend]
+    # el serializer solo necesita los ids de las etiquetas
+    queryset_prefetch_related = (Prefetch('tags', queryset=Tag.objects.only('id')),)
+
+    def perform_destroy(self, instance):
+        TransactionService.delete_transaction(instance)
+
+    action_serializer_classes = {
+        'bulk_create': TransactionBulkSerializer,
+        'bulk_update': TransactionBulkUpdateSerializer,
+        'bulk_delete': TransactionSelectionSerializer,
+    }
+
+    def get_serializer_class(self):
+        return self.action_serializer_classes.get(self.action, super().get_serializer_class())
+
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, NDJSONParser])
+    def bulk_create(self, request):
+        """
+        Carga masiva de transacciones desde un arreglo JSON o un cuerpo NDJSON.
+        El lote se valida completo y se inserta en una sola transacción.
+        """
+        serializer = self.get_serializer(data=request.data, many=True, allow_empty=False,
+                                         max_length=TransactionBulkSerializer.MAX_ROWS)
+        serializer.is_valid(raise_exception=True)
+        transactions = serializer.save()
+        return Response(
+            {
+                'created': len(transactions),
+                'ids': [tx.id for tx in transactions],
+            },
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(detail=False, methods=['post'], url_path='bulk-update')
+    def bulk_update(self, request):
+        """
+        Cambia categoría, cuenta o etiquetas de muchas transacciones a la vez,
+        seleccionadas por `ids` o por `filter` (mismos parámetros que el listado).
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        queryset = serializer.select(Transaction.objects.filter(user=request.user))
+        updated = TransactionService.bulk_update_transactions(queryset, serializer.changes)
+        return Response({'updated': updated})
+
+    @action(detail=False, methods=['post'], url_path='bulk-delete')
+    def bulk_delete(self, request):
+        """
+        Elimina muchas transacciones a la vez, seleccionadas por `ids` o por `filter`.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        queryset = serializer.select(Transaction.objects.filter(user=request.user))
+        deleted = TransactionService.bulk_delete_transactions(queryset)
+        return Response({'deleted': deleted})
+
+    @action(detail=False, methods=['get'], url_path='export', renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        """
+        Exporta todo el historial (o el subconjunto filtrado) en streaming.
+        `?format=csv` (por defecto) o `?format=ndjson`; acepta los mismos filtros que el listado.
+        """
+        queryset = self.filter_queryset(Transaction.objects.filter(user=request.user))
+        exporter = TransactionExporter(queryset)
+        if request.accepted_renderer.format == NDJSONRenderer.format:
+            return stream_response(request, exporter.ndjson_lines(), NDJSONRenderer.media_type,
+                                   'transacciones.ndjson')
+        return stream_response(request, exporter.csv_lines(), CSVRenderer.media_type, 'transacciones.csv')
 
 
 class BudgetViewSet(IsOwnerMixin, viewsets.ModelViewSet):
@@ -67,6 +178,22 @@ class BudgetViewSet(IsOwnerMixin, viewsets.ModelViewSet):
     serializer_class = BudgetSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @action(detail=False, methods=['get'], url_path='status')
+    def budget_status(self, request):
+        """
+        Presupuestos del mes (?month=YYYY-MM, por defecto el actual) con lo gastado,
+        lo restante y el porcentaje usado
+        """
+        raw = request.query_params.get('month')
+        try:
+            month = date.fromisoformat(f'{raw}-01' if raw and len(raw) == 7 else raw) if raw \
+                else timezone.localdate()
+        except ValueError:
+            return Response({'month': ['Formato esperado: YYYY-MM']}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = BudgetService.budget_status(request.user, month.replace(day=1))
+        return Response(BudgetStatusSerializer(data, many=True).data)
+
 
 class CurrencyViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -84,3 +211,6 @@ class ExchangeRateViewSet(viewsets.ModelViewSet):
     queryset = ExchangeRate.objects.all()
     serializer_class = ExchangeRateSerializer
     permission_classes = [permissions.IsAuthenticated]
+
+    def perform_destroy(self, instance: ExchangeRate) -> None:
+        ExchangeRateService.delete_exchange_rate(instance)
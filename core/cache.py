@@ -0,0 +1,326 @@
+import logging
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import msgpack
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django_redis.cache import RedisCache
+from django_redis.compressors.zlib import ZlibCompressor
+from django_redis.serializers.base import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+
+class MsgPackSerializer(BaseSerializer):
+    """
+    Serializador binario compacto para django-redis.
+
+    Decimal, date y datetime (frecuentes en las analíticas) viajan como tipos extendidos
+    de msgpack; cualquier otro tipo que msgpack no conozca se guarda con pickle.
+    Las secuencias vuelven como tuplas.
+    """
+    EXT_DECIMAL = 1
+    EXT_DATE = 2
+    EXT_DATETIME = 3
+    EXT_PICKLE = 127
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, default=self._default, use_bin_type=True)
+
+    def loads(self, value: bytes) -> Any:
+        return msgpack.unpackb(value, ext_hook=self._ext_hook, raw=False, use_list=False, strict_map_key=False)
+
+    @classmethod
+    def _default(cls, obj: Any) -> msgpack.ExtType:
+        if isinstance(obj, Decimal):
+            return msgpack.ExtType(cls.EXT_DECIMAL, str(obj).encode())
+        # datetime es subclase de date: se revisa primero
+        if isinstance(obj, datetime):
+            return msgpack.ExtType(cls.EXT_DATETIME, obj.isoformat().encode())
+        if isinstance(obj, date):
+            return msgpack.ExtType(cls.EXT_DATE, obj.isoformat().encode())
+        return msgpack.ExtType(cls.EXT_PICKLE, pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+
+    @classmethod
+    def _ext_hook(cls, code: int, data: bytes) -> Any:
+        if code == cls.EXT_DECIMAL:
+            return Decimal(data.decode())
+        if code == cls.EXT_DATETIME:
+            return datetime.fromisoformat(data.decode())
+        if code == cls.EXT_DATE:
+            return date.fromisoformat(data.decode())
+        if code == cls.EXT_PICKLE:
+            return pickle.loads(data)
+        return msgpack.ExtType(code, data)
+
+
+class ThresholdZlibCompressor(ZlibCompressor):
+    """
+    Comprime con zlib solo los valores grandes (respuestas de analíticas); en los
+    chicos el costo de comprimir no compensa
+    """
+    min_length = 1024
+    preset = 6
+
+
+class LocalLRU:
+    """
+    Caché en memoria del proceso, acotada en cantidad de entradas (descarta la menos
+    usada) y en tiempo de vida de cada una.
+
+    `generation` cuenta los borrados: quien lee un valor de afuera anota la generación
+    antes de leer y lo guarda con `set(..., generation=...)`, que no lo guarda si hubo
+    un borrado en el medio (el valor leído pudo quedar viejo).
+    """
+
+    def __init__(self, max_entries: int, timeout: float):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.generation = 0
+        self._data: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key: str, value: Any, timeout: Optional[float] = None, generation: Optional[int] = None) -> None:
+        ttl = self.timeout if timeout is None else min(timeout, self.timeout)
+        if ttl <= 0:
+            self.delete(key)
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+            self.generation += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.generation += 1
+
+
+class TwoTierRedisCache(RedisCache):
+    """
+    Caché de dos niveles: una LRU acotada en cada proceso (L1) delante de Redis (L2),
+    compartido por todos los workers a través del pool de conexiones de django-redis.
+
+    Las lecturas que aciertan en L1 no salen del proceso. Cada escritura o borrado
+    actualiza L1 y Redis y publica la clave en un canal de Redis; un hilo por proceso
+    escucha ese canal y descarta la clave de su L1, así que los demás workers dejan de
+    verla en milisegundos. Si la suscripción se corta se vacía L1 (pudieron perderse
+    avisos) y L1_TIMEOUT acota cuánto puede vivir una entrada sin aviso.
+
+    L1 guarda el valor codificado (como en Redis) y lo decodifica en cada acierto, para
+    que nadie modifique por accidente el objeto que comparten los hilos.
+
+    Opciones adicionales en OPTIONS: L1_MAX_ENTRIES, L1_TIMEOUT (segundos) e
+    INVALIDATION_CHANNEL.
+    """
+    CLEAR_ALL = '*'
+
+    def __init__(self, server: str, params: Dict[str, Any]) -> None:
+        super().__init__(server, params)
+        options = params.get('OPTIONS', {})
+        self.local = LocalLRU(options.get('L1_MAX_ENTRIES', 2048), options.get('L1_TIMEOUT', 60))
+        self.channel = options.get('INVALIDATION_CHANNEL', 'cache:invalidate')
+        self._origin = uuid.uuid4().hex
+        self._listener: Optional[threading.Thread] = None
+        self._listener_lock = threading.Lock()
+
+    # Invalidación entre procesos
+
+    def _ensure_listener(self) -> None:
+        """
+        Arranca el hilo suscriptor la primera vez que se usa la caché en el proceso,
+        de modo que cada worker (también los creados con fork) tenga el suyo
+        """
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._listener_lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._origin = uuid.uuid4().hex
+            self._listener = threading.Thread(target=self._listen, name='cache-invalidation', daemon=True)
+            self._listener.start()
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self.client.get_client(write=False).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # lo escrito antes de suscribirse pudo no avisarse
+                self.local.clear()
+                for message in pubsub.listen():
+                    origin, _, key = message['data'].decode().partition(':')
+                    if origin == self._origin:
+                        continue
+                    if key == self.CLEAR_ALL:
+                        self.local.clear()
+                    else:
+                        self.local.delete(key)
+            except Exception:
+                logger.warning('Suscripción de invalidación de caché interrumpida; se reintenta', exc_info=True)
+                self.local.clear()
+                time.sleep(1)
+
+    def _publish(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if not keys:
+            return
+        client = self.client.get_client(write=True)
+        if len(keys) == 1:
+            client.publish(self.channel, f'{self._origin}:{keys[0]}')
+            return
+        pipeline = client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.publish(self.channel, f'{self._origin}:{key}')
+        pipeline.execute()
+
+    def _evict(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        for key in keys:
+            self.local.delete(key)
+        self._publish(keys)
+
+    # Lecturas
+
+    def get(self, key, default=None, version=None, client=None):
+        self._ensure_listener()
+        full_key = self.make_and_validate_key(key, version=version)
+        hit, encoded = self.local.get(full_key)
+        if not hit:
+            hit, encoded = self._fetch([full_key], client).get(full_key, (False, None))
+        return self.client.decode(encoded) if hit else default
+
+    def get_many(self, keys, version=None, client=None):
+        self._ensure_listener()
+        full_keys = {self.make_and_validate_key(key, version=version): key for key in keys}
+        found = {}
+        pending = []
+        for full_key, key in full_keys.items():
+            hit, encoded = self.local.get(full_key)
+            if hit:
+                found[key] = self.client.decode(encoded)
+            else:
+                pending.append(full_key)
+        for full_key, (hit, encoded) in self._fetch(pending, client).items():
+            if hit:
+                found[full_keys[full_key]] = self.client.decode(encoded)
+        return found
+
+    def _fetch(self, full_keys: List[str], client=None) -> Dict[str, Tuple[bool, Any]]:
+        """
+        Lee de Redis el valor codificado y el tiempo restante de cada clave en un solo
+        viaje, guardando en L1 lo encontrado; el vencimiento en Redis acota el de L1.
+        Si mientras tanto llegó una invalidación (de cualquier clave) lo leído no se
+        guarda en L1: la próxima lectura vuelve a Redis.
+        """
+        if not full_keys:
+            return {}
+        generation = self.local.generation
+        pipeline = (client or self.client.get_client(write=False)).pipeline(transaction=False)
+        for full_key in full_keys:
+            pipeline.get(full_key)
+            pipeline.pttl(full_key)
+        replies = pipeline.execute()
+
+        result = {}
+        for index, full_key in enumerate(full_keys):
+            encoded, remaining = replies[2 * index], replies[2 * index + 1]
+            if encoded is None:
+                result[full_key] = (False, None)
+                continue
+            # PTTL: -1 sin vencimiento
+            self.local.set(full_key, encoded, None if remaining < 0 else remaining / 1000, generation)
+            result[full_key] = (True, encoded)
+        return result
+
+    def _relative_timeout(self, timeout) -> Optional[float]:
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    # Escrituras
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None, nx=False, xx=False):
+        self._ensure_listener()
+        result = super().set(key, value, timeout=timeout, version=version, client=client, nx=nx, xx=xx)
+        full_key = self.make_and_validate_key(key, version=version)
+        self._evict([full_key])
+        if result and not nx and not xx:
+            self.local.set(full_key, self.client.encode(value), self._relative_timeout(timeout))
+        return result
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        self._ensure_listener()
+        result = super().add(key, value, timeout=timeout, version=version, client=client)
+        # si no se agregó, otro proceso la escribió: L1 la tomará en la próxima lectura
+        full_key = self.make_and_validate_key(key, version=version)
+        self.local.delete(full_key)
+        if result:
+            self.local.set(full_key, self.client.encode(value), self._relative_timeout(timeout))
+        return result
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        self._ensure_listener()
+        result = super().set_many(data, timeout=timeout, version=version, client=client)
+        self._evict(self.make_and_validate_key(key, version=version) for key in data)
+        return result
+
+    def delete(self, key, version=None, prefix=None, client=None):
+        result = super().delete(key, version=version, prefix=prefix, client=client)
+        self._evict([self.make_and_validate_key(key, version=version)])
+        return result
+
+    def delete_many(self, keys, version=None):
+        result = super().delete_many(keys, version=version)
+        self._evict(self.make_and_validate_key(key, version=version) for key in keys)
+        return result
+
+    def delete_pattern(self, *args, **kwargs):
+        result = super().delete_pattern(*args, **kwargs)
+        self.local.clear()
+        self._publish([self.CLEAR_ALL])
+        return result
+
+    def clear(self):
+        result = super().clear()
+        self.local.clear()
+        self._publish([self.CLEAR_ALL])
+        return result
+
+    def incr(self, key, delta=1, version=None, client=None, ignore_key_check=False):
+        result = super().incr(key, delta=delta, version=version, client=client, ignore_key_check=ignore_key_check)
+        self._evict([self.make_and_validate_key(key, version=version)])
+        return result
+
+    def decr(self, key, delta=1, version=None, client=None):
+        result = super().decr(key, delta=delta, version=version, client=client)
+        self._evict([self.make_and_validate_key(key, version=version)])
+        return result
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        result = super().touch(key, timeout=timeout, version=version, client=client)
+        self.local.delete(self.make_and_validate_key(key, version=version))
+        return result
@@ -0,0 +1,34 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, List, Sequence
+
+import django
+from django.db import connections
+
+
+def _init_worker():
+    # Cada proceso abre sus propias conexiones; con `spawn` además hay que cargar Django
+    django.setup()
+    connections.close_all()
+
+
+def run_in_process_pool(func: Callable[[List], int], user_ids: Sequence, workers: int, chunk_size: int = 1) -> int:
+    """
+    Reparte `user_ids` en tareas de `chunk_size` usuarios, llama a `func` con cada una
+    en un pool de `workers` procesos y devuelve la suma de lo que devuelven.
+
+    `func` debe poder importarse desde el proceso hijo (una función o un método estático
+    de nivel de módulo). Con un solo proceso o una sola tarea corre en el proceso actual.
+    """
+    size = max(chunk_size, 1)
+    chunks = [list(user_ids[offset:offset + size]) for offset in range(0, len(user_ids), size)]
+    if workers <= 1 or len(chunks) <= 1:
+        return sum(func(chunk) for chunk in chunks)
+
+    # Los procesos hijos no deben heredar la conexión abierta del padre
+    connections.close_all()
+    total = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = [executor.submit(func, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            total += future.result()
+    return total
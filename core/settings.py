@@ -175,3 +175,49 @@ MEDIA_ROOT: str = os.path.join(BASE_DIR / 'media')
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD: str = 'django.db.models.BigAutoField'
+
+# Analíticas
+# Las respuestas cacheadas se invalidan con la versión de datos del usuario
+# (apps.analytics.cache.DataVersion); el tiempo solo acota el espacio en caché.
+
+ANALYTICS_CACHE_TIMEOUT: int = decouple.config('ANALYTICS_CACHE_TIMEOUT', default=60 * 60 * 24, cast=int)
+
+# 'orm' (consultas agregadas en la base) o 'numpy' (apps.analytics.services.vectorized)
+ANALYTICS_BACKEND: str = decouple.config('ANALYTICS_BACKEND', default='orm')
+
+# Código de la moneda que la migración transactions.0013 asigna a las cuentas sin
+# moneda; vacío para dejarlas sin moneda (sus montos no se convierten)
+DEFAULT_CURRENCY: str = decouple.config('DEFAULT_CURRENCY', default='')
+
+# Caché
+# Con REDIS_URL: LRU por proceso delante de Redis, compartido por los workers
+# (core.cache.TwoTierRedisCache). Sin REDIS_URL, caché en memoria de cada proceso.
+
+REDIS_URL: str = decouple.config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES: dict[str, Any] = {
+        'default': {
+            'BACKEND': 'core.cache.TwoTierRedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                'SERIALIZER': 'core.cache.MsgPackSerializer',
+                'COMPRESSOR': 'core.cache.ThresholdZlibCompressor',
+                'CONNECTION_POOL_KWARGS': {
+                    'max_connections': decouple.config('REDIS_MAX_CONNECTIONS', default=50, cast=int),
+                    'health_check_interval': 30,
+                },
+                'SOCKET_CONNECT_TIMEOUT': 2,
+                'SOCKET_TIMEOUT': 2,
+                'L1_MAX_ENTRIES': decouple.config('CACHE_L1_MAX_ENTRIES', default=2048, cast=int),
+                'L1_TIMEOUT': decouple.config('CACHE_L1_TIMEOUT', default=60, cast=int),
+            },
+        }
+    }
+else:
+    CACHES: dict[str, Any] = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
@@ -0,0 +1,181 @@
+import time
+import uuid
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+import fakeredis
+import redis
+from django.test import SimpleTestCase
+
+from .cache import LocalLRU, MsgPackSerializer, ThresholdZlibCompressor, TwoTierRedisCache
+
+
+class MsgPackSerializerTests(SimpleTestCase):
+    """
+    Los tipos frecuentes en las analíticas vuelven iguales; el resto pasa por pickle
+    """
+
+    def setUp(self):
+        self.serializer = MsgPackSerializer({})
+
+    def test_round_trips_extension_types(self):
+        value = {
+            'amount': Decimal('1234.50'),
+            'day': date(2025, 3, 1),
+            'at': datetime(2025, 3, 1, 12, 30, tzinfo=dt_timezone.utc),
+            'naive': datetime(2025, 3, 1, 12, 30),
+            'count': 3,
+            'name': 'Comida',
+        }
+        self.assertEqual(self.serializer.loads(self.serializer.dumps(value)), value)
+
+    def test_unknown_types_fall_back_to_pickle(self):
+        value = {'ids': {uuid.UUID(int=1), uuid.UUID(int=2)}}
+        self.assertEqual(self.serializer.loads(self.serializer.dumps(value)), value)
+
+    def test_sequences_come_back_as_tuples(self):
+        self.assertEqual(self.serializer.loads(self.serializer.dumps({'rows': [1, [2, 3]]})), {'rows': (1, (2, 3))})
+
+
+class ThresholdZlibCompressorTests(SimpleTestCase):
+    def test_only_compresses_above_threshold(self):
+        compressor = ThresholdZlibCompressor({})
+        small = b'x' * compressor.min_length
+        self.assertEqual(compressor.compress(small), small)
+
+        large = b'x' * (compressor.min_length + 1)
+        compressed = compressor.compress(large)
+        self.assertLess(len(compressed), len(large))
+        self.assertEqual(compressor.decompress(compressed), large)
+
+
+class LocalLRUTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        lru = LocalLRU(max_entries=2, timeout=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual(lru.get('a'), (True, 1))
+        self.assertEqual(lru.get('b'), (False, None))
+        self.assertEqual(lru.get('c'), (True, 3))
+
+    def test_entries_expire(self):
+        lru = LocalLRU(max_entries=10, timeout=60)
+        with mock.patch('core.cache.time.monotonic', return_value=1000.0):
+            lru.set('default', 1)
+            # el tiempo pedido no supera el de la caché
+            lru.set('short', 2, timeout=5)
+            lru.set('long', 3, timeout=600)
+            lru.set('gone', 4, timeout=0)
+        with mock.patch('core.cache.time.monotonic', return_value=1006.0):
+            self.assertEqual(lru.get('default'), (True, 1))
+            self.assertEqual(lru.get('short'), (False, None))
+            self.assertEqual(lru.get('gone'), (False, None))
+        with mock.patch('core.cache.time.monotonic', return_value=1061.0):
+            self.assertEqual(lru.get('default'), (False, None))
+            self.assertEqual(lru.get('long'), (False, None))
+
+
+class TwoTierRedisCacheTests(SimpleTestCase):
+    """
+    Dos instancias sobre el mismo Redis (fakeredis) hacen de dos workers: cada una con
+    su L1 y su hilo suscriptor al canal de invalidación
+    """
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        self.channel = f'cache:invalidate:{uuid.uuid4().hex}'
+        self.first = self._cache()
+        self.second = self._cache()
+        # arranca los suscriptores y espera a que ambos escuchen el canal
+        self.first.get('warmup')
+        self.second.get('warmup')
+        self._eventually(lambda: self._redis().pubsub_numsub(self.channel)[0][1] == 2)
+
+    def _cache(self) -> TwoTierRedisCache:
+        return TwoTierRedisCache('redis://localhost:6379/0', {'OPTIONS': {
+            'SERIALIZER': 'core.cache.MsgPackSerializer',
+            'COMPRESSOR': 'core.cache.ThresholdZlibCompressor',
+            'CONNECTION_POOL_KWARGS': {'connection_class': fakeredis.FakeConnection, 'server': self.server},
+            'L1_MAX_ENTRIES': 100,
+            'L1_TIMEOUT': 60,
+            'INVALIDATION_CHANNEL': self.channel,
+        }})
+
+    def _redis(self):
+        return self.first.client.get_client(write=True)
+
+    def _seed(self, **values):
+        """
+        Escribe directo en Redis, sin el aviso que una escritura por la caché enviaría a
+        las demás instancias y que podría llegar después de la lectura que se prueba
+        """
+        for key, value in values.items():
+            self._redis().set(self.first.make_and_validate_key(key), self.first.client.encode(value))
+
+    def _eventually(self, condition, timeout: float = 2.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail('La condición no se cumplió a tiempo')
+            time.sleep(0.01)
+
+    def test_reads_hit_l1_after_first_fetch(self):
+        self.first.set('key', {'amount': Decimal('10.00')})
+        self._seed(other={'amount': Decimal('10.00')})
+        self.assertEqual(self.second.get('other'), {'amount': Decimal('10.00')})
+
+        # sin Redis de por medio, ambas siguen respondiendo desde su L1
+        self._redis().delete(*(self.first.make_and_validate_key(key) for key in ('key', 'other')))
+        self.assertEqual(self.first.get('key'), {'amount': Decimal('10.00')})
+        self.assertEqual(self.second.get('other'), {'amount': Decimal('10.00')})
+        self.assertIsNone(self._cache().get('other'))
+
+    def test_misses_read_redis_and_honour_its_ttl(self):
+        self._seed(key='value')
+        self._redis().expire(self.first.make_and_validate_key('key'), 30)
+        self.assertEqual(self.second.get_many(['key', 'missing']), {'key': 'value'})
+        expires_at, _ = self.second.local._data[self.second.make_and_validate_key('key')]
+        self.assertLessEqual(expires_at - time.monotonic(), 30)
+
+    def test_invalidation_during_fetch_is_not_stored(self):
+        self._seed(key=1)
+        execute = redis.client.Pipeline.execute
+
+        def execute_then_invalidate(pipeline, *args, **kwargs):
+            replies = execute(pipeline, *args, **kwargs)
+            # el aviso de la otra instancia llega con la respuesta ya leída y antes de guardarla en L1
+            generation = self.second.local.generation
+            self.first.set('key', 2)
+            self._eventually(lambda: self.second.local.generation != generation)
+            return replies
+
+        with mock.patch.object(redis.client.Pipeline, 'execute', execute_then_invalidate):
+            self.assertEqual(self.second.get('key'), 1)
+        self.assertEqual(self.second.get('key'), 2)
+
+    def test_set_invalidates_other_instances(self):
+        self._seed(key=1)
+        self.assertEqual(self.second.get('key'), 1)
+        self.first.set('key', 2)
+        self._eventually(lambda: self.second.get('key') == 2)
+
+    def test_delete_invalidates_other_instances(self):
+        self._seed(key=1)
+        self.assertEqual(self.second.get('key'), 1)
+        self.first.delete('key')
+        self._eventually(lambda: self.second.get('key') is None)
+
+    def test_incr_invalidates_other_instances(self):
+        self._seed(version=1)
+        self.assertEqual(self.second.get('version'), 1)
+        self.assertEqual(self.first.incr('version'), 2)
+        self._eventually(lambda: self.second.get('version') == 2)
+
+    def test_clear_invalidates_other_instances(self):
+        self._seed(a=1, b=2)
+        self.assertEqual(self.second.get_many(['a', 'b']), {'a': 1, 'b': 2})
+        self.first.clear()
+        self._eventually(lambda: self.second.get_many(['a', 'b']) == {})